@@ -0,0 +1,88 @@
+"""
+agente_factory.py — Caché de agentes ReAct precompilados
+========================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+create_agent / create_react_agent compilan un StateGraph completo en cada
+llamada. Antes se hacía en cada request (y en cada especialista). Ahora:
+
+  - El import con fallback se resuelve UNA vez al cargar el módulo:
+      langchain >= 1.0 → langchain.agents.create_agent
+      versiones viejas → langgraph.prebuilt.create_react_agent
+  - Los agentes compilados se guardan por
+      (proveedor, modelo, temperatura, hash del prompt, conjunto de tools)
+    en un LRU. Un agente compilado es reutilizable entre requests e hilos.
+
+Uso:
+    agente = agente_factory.obtener_agente(llm, agent_tools.TOOLS_TRM, system_prompt)
+    resultado = agente.invoke({"messages": [("user", pregunta)]})
+"""
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import prompt_cache
+
+try:
+    from langchain.agents import create_agent as _create_agent
+
+    def _compilar(llm, tools, sistema):
+        return _create_agent(model=llm, tools=tools, system_prompt=sistema)
+except ImportError:
+    from langgraph.prebuilt import create_react_agent as _create_react_agent
+
+    def _compilar(llm, tools, sistema):
+        return _create_react_agent(model=llm, tools=tools, state_modifier=sistema)
+
+
+MAX_AGENTES = 64
+
+_agentes: "OrderedDict[tuple, tuple]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"aciertos": 0, "compilaciones": 0}
+
+
+def _clave(llm, tools: list, system_prompt: str) -> tuple:
+    modelo = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+    return (
+        type(llm).__name__,
+        modelo,
+        getattr(llm, "temperature", None),
+        id(llm),
+        hashlib.sha256(system_prompt.encode("utf-8")).hexdigest(),
+        # La descripción distingue tools generadas con el mismo nombre y otro esquema
+        tuple((t.name, t.description) for t in tools),
+    )
+
+
+def obtener_agente(llm, tools: list, system_prompt: str):
+    """Agente ReAct compilado para este LLM, tools y prompt (desde caché si existe)."""
+    clave = _clave(llm, tools, system_prompt)
+    with _lock:
+        if clave in _agentes:
+            _agentes.move_to_end(clave)
+            _stats["aciertos"] += 1
+            return _agentes[clave][1]
+
+    # El system prompt va con el formato de caché de prefijo del proveedor
+    agente = _compilar(llm, tools, prompt_cache.mensaje_sistema(system_prompt, llm))
+
+    with _lock:
+        # Se guarda también el llm: mantiene vivo su id() mientras viva la entrada
+        _agentes[clave] = (llm, agente)
+        _agentes.move_to_end(clave)
+        _stats["compilaciones"] += 1
+        while len(_agentes) > MAX_AGENTES:
+            _agentes.popitem(last=False)
+    return agente
+
+
+def estado() -> dict:
+    """Aciertos y compilaciones de la caché de agentes."""
+    with _lock:
+        return {"agentes_en_cache": len(_agentes), **_stats}
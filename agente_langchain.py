@@ -26,6 +26,10 @@ if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
 
 import config
+import agente_factory
+import memo
+import presupuesto
+import resiliencia
 import tools as agent_tools
 
 
@@ -38,10 +42,17 @@ SYSTEM_PROMPT = """Eres un analista económico de Colombia con acceso a tres dom
 1. TIPO DE CAMBIO (TRM)
    - obtener_trm_actual()          → TRM vigente en diciembre 2024 y variación mensual
    - analizar_historico_trm(meses) → tendencia del dólar en los últimos N meses
+     analizar_historico_trm(desde, hasta) → mismo análisis para un rango de fechas
+                                            (volatilidad, máxima caída, variación anual)
 
 2. COMERCIO EXTERIOR
    - consultar_balanza_comercial()       → exportaciones vs importaciones mensuales 2024
    - analizar_sectores_exportacion()     → sectores exportadores y su participación
+   - consultar_datos_sql(sql)            → SELECT de solo lectura sobre los datasets (promedios,
+                                           rankings, filtros que las otras tools no traen)
+   - analizar_trm_vs_comercio(rezago_max) → correlaciones y elasticidades TRM ↔ comercio
+   - consultar_cubo_comercio(...)        → comercio por sector / país / capítulo (si hay detalle)
+   - describir_* / filtrar_* / agregar_* → una por cada CSV subido a datos/
 
 3. DOCUMENTOS DANE (requiere índice vectorial — ejecutar preparar_base.py)
    - listar_reportes_dane()              → catálogo de reportes disponibles
@@ -54,7 +65,9 @@ INSTRUCCIONES:
 - Llama primero a las herramientas de catálogo (listar_*) cuando no estés seguro.
 - Cita siempre los números exactos de las herramientas (no inventes cifras).
 - Responde SIEMPRE en español con una conclusión clara al final.
-- Para preguntas cruzadas (ej: TRM + inflación), explica la relación entre ambas."""
+- Para preguntas cruzadas (ej: TRM + inflación), explica la relación entre ambas.
+- Para TRM vs exportaciones/importaciones usa analizar_trm_vs_comercio: no calcules
+  correlaciones ni elasticidades de cabeza."""
 
 
 # ---------------------------------------------------------------------------
@@ -82,9 +95,7 @@ def ejecutar_agente(pregunta: str, silencioso: bool = False,
         except Exception:
             system_prompt = SYSTEM_PROMPT
 
-    # LLM dinámico: lee proveedor/modelo de SQLite si el usuario lo cambió en la UI
-    llm   = config.crear_llm_dinamico()
-    tools = agent_tools.TOOLS_TODOS
+    tools = agent_tools.tools_todos()   # + tools generadas para CSV subidos
 
     if not silencioso:
         print(f"\n{'='*65}")
@@ -93,27 +104,29 @@ def ejecutar_agente(pregunta: str, silencioso: bool = False,
         print(f"  Pregunta : {pregunta}")
         print(f"  LLM      : {config.LLM_PROVIDER} / {config.LLM_MODEL}")
         print(f"  Tools    : TRM({len(agent_tools.TOOLS_TRM)}) + "
-              f"Datos({len(agent_tools.TOOLS_DATOS)}) + "
+              f"Datos({len(agent_tools.tools_datos())}) + "
               f"RAG({len(agent_tools.TOOLS_RAG)})")
         print(f"{'='*65}\n")
 
-    try:
-        from langchain.agents import create_agent
-        agente    = create_agent(model=llm, tools=tools, system_prompt=system_prompt)
-        resultado = agente.invoke({"messages": [("user", pregunta)]})
-        respuesta = resultado["messages"][-1].content
-    except (ImportError, AttributeError):
-        from langgraph.prebuilt import create_react_agent
-        agente    = create_react_agent(model=llm, tools=tools,
-                                       state_modifier=system_prompt)
-        resultado = agente.invoke({"messages": [("user", pregunta)]})
-        respuesta = resultado["messages"][-1].content
+    # LLM dinámico (SQLite > .env) con reintentos y failover — ver resiliencia.py
+    # El agente compilado sale de la caché de agente_factory.py
+    # El loop ReAct se acota con el presupuesto de la request — ver presupuesto.py
+    def _ejecutar(llm):
+        agente = agente_factory.obtener_agente(llm, tools, system_prompt)
+        return presupuesto.ejecutar_react(agente, {"messages": [("user", pregunta)]},
+                                          nodo="agente_langchain")
+
+    # Llamadas repetidas a la misma tool dentro del loop ReAct se sirven de la memo
+    with memo.solicitud() as memo_tools, presupuesto.solicitud() as pres:
+        respuesta = resiliencia.invocar_nodo("agente_langchain", _ejecutar, temperature=0.2)
 
     if not silencioso:
         print(f"\n{'='*65}")
         print("  RESPUESTA FINAL")
         print(f"{'='*65}")
         print(respuesta)
+        print(f"  Memo tools: {memo_tools.resumen()}")
+        print(f"  Presupuesto: {pres.resumen()}")
         print(f"{'='*65}\n")
 
     return respuesta
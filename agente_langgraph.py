@@ -11,16 +11,20 @@ FLUJO DEL GRAFO:
 
   START
     ↓
-  [supervisor]     → clasifica la pregunta: ruta = "trm"|"datos"|"rag"|"multiple"
-    ↓ (según ruta)
-  [agente_trm]     → ReAct con TOOLS_TRM    (si ruta es "trm" o "multiple")
-  [agente_datos]   → ReAct con TOOLS_DATOS  (si ruta es "datos")
-  [agente_rag]     → ReAct con TOOLS_RAG    (si ruta es "rag" o "multiple")
-    ↓
+  [supervisor]     → clasifica la pregunta: rutas ⊆ {"trm", "datos", "rag"}
+                     (enrutador local primero; LLM solo si la confianza es baja)
+    ↓ (fan-out EN PARALELO a todas las rutas elegidas)
+  [agente_trm]     → ReAct con TOOLS_TRM    (si "trm"   ∈ rutas)
+  [agente_datos]   → ReAct con TOOLS_DATOS  (si "datos" ∈ rutas)
+  [agente_rag]     → ReAct con TOOLS_RAG    (si "rag"   ∈ rutas)
+    ↓ (join: espera a todos los especialistas lanzados)
   [sintetizar]     → combina todas las respuestas disponibles
     ↓
   END
 
+Los especialistas elegidos corren en el mismo superstep de LangGraph, así que la
+latencia de una pregunta cruzada es max(especialistas) y no su suma.
+
 Uso desde línea de comandos:
   python agente_langgraph.py
   python agente_langgraph.py --pregunta "¿Cuánto está el dólar?"
@@ -31,12 +35,24 @@ Uso desde línea de comandos:
 import sys
 import json
 import argparse
+import time
+import uuid
 from typing import TypedDict
 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
 
 import config
+import agente_factory
+import checkpoints
+import compactar
+import enrutador
+import especulacion
+import hedging
+import memo
+import presupuesto
+import resiliencia
+import trazas
 import tools as agent_tools
 
 
@@ -45,13 +61,14 @@ import tools as agent_tools
 # ---------------------------------------------------------------------------
 
 PROMPT_SUPERVISOR = (
-    "Eres un enrutador de consultas económicas. Clasifica la pregunta en UNA de estas rutas:\n\n"
-    "  'trm'      → solo sobre tipo de cambio: dólar, TRM, devaluación, variación del peso\n"
-    "  'datos'    → solo sobre comercio exterior: exportaciones, importaciones, balanza, sectores\n"
-    "  'rag'      → solo sobre estadísticas DANE: desempleo, inflación, PIB, población, censo\n"
-    "  'multiple' → combina TRM+DANE, o TRM+exportaciones con contexto macro\n\n"
+    "Eres un enrutador de consultas económicas. Clasifica la pregunta en UNA O VARIAS de estas rutas:\n\n"
+    "  'trm'   → tipo de cambio: dólar, TRM, devaluación, variación del peso\n"
+    "  'datos' → comercio exterior: exportaciones, importaciones, balanza, sectores\n"
+    "  'rag'   → estadísticas DANE: desempleo, inflación, PIB, población, censo\n\n"
+    "Incluye varias rutas solo si la pregunta realmente cruza dominios "
+    "(ej: TRM + exportaciones → [\"trm\", \"datos\"]).\n"
     "Responde EXACTAMENTE con este JSON (sin markdown):\n"
-    "{\"ruta\": \"<ruta>\", \"justificacion\": \"<una oración breve>\"}"
+    "{\"rutas\": [\"<ruta>\", ...], \"justificacion\": \"<una oración breve>\"}"
 )
 
 PROMPT_TRM = (
@@ -65,7 +82,16 @@ PROMPT_DATOS = (
     "Eres un analista de comercio exterior de Colombia. "
     "Responde preguntas sobre exportaciones, importaciones y balanza comercial del 2024. "
     "Destaca los sectores mas importantes, el deficit/superavit y tendencias clave. "
-    "Usa datos exactos de las herramientas. Responde en español."
+    "Usa datos exactos de las herramientas. "
+    "Para cálculos que esas herramientas no traen (promedios por período, rankings, "
+    "el mes con mayor déficit) usa consultar_datos_sql con una sola consulta SELECT. "
+    "Si la pregunta relaciona el dólar con el comercio, usa analizar_trm_vs_comercio "
+    "y cita sus correlaciones y elasticidades en vez de calcularlas. "
+    "Para comercio por país socio o capítulo arancelario usa consultar_cubo_comercio "
+    "si está disponible. "
+    "Los CSV subidos por el usuario tienen tools describir_*, filtrar_* y agregar_*: "
+    "empieza por describir_* para conocer sus columnas. "
+    "Responde en español."
 )
 
 PROMPT_RAG = (
@@ -96,17 +122,25 @@ class EstadoMultiagente(TypedDict):
     Cada nodo lee los campos que necesita y retorna solo los que modifica.
     LangGraph hace el merge automático después de cada nodo.
 
-    ruta: decide qué agente(s) consultar:
-        "trm"      → solo el agente de tipo de cambio
-        "datos"    → solo el agente de comercio exterior
-        "rag"      → solo el agente de documentos DANE
-        "multiple" → agente TRM + agente RAG (pregunta cruzada)
+    rutas: especialistas a consultar EN PARALELO, subconjunto de
+        "trm"   → agente de tipo de cambio
+        "datos" → agente de comercio exterior
+        "rag"   → agente de documentos DANE
+    ruta: etiqueta legible de rutas para logs, p. ej. "trm+rag"
+
+    id_memo: id de la memo de tools de esta request (memo.py). Los especialistas
+        la activan para compartir resultados de tools idénticas entre ellos.
+    id_especulacion: ramas especulativas lanzadas por el supervisor
+        (especulacion.py); "" si no hubo especulación.
+    id_presupuesto: límites de tools / turnos / tokens / tiempo de los loops
+        ReAct de esta request (presupuesto.py), compartidos por los especialistas.
 
     prompts: dict con prompts personalizados para esta ejecución.
         Claves: supervisor, trm, datos, rag, sintetizador
         Si una clave no existe, el nodo usa su constante de módulo.
     """
     pregunta:        str
+    rutas:           list[str]
     ruta:            str
     justificacion:   str
     resp_trm:        str
@@ -114,6 +148,9 @@ class EstadoMultiagente(TypedDict):
     resp_rag:        str
     respuesta_final: str
     prompts:         dict
+    id_memo:         str
+    id_especulacion: str
+    id_presupuesto:  str
 
 
 # ---------------------------------------------------------------------------
@@ -124,11 +161,28 @@ def nodo_supervisor(estado: EstadoMultiagente) -> dict:
     """
     Analiza la pregunta y determina qué agente(s) son los más adecuados.
     El supervisor NO responde la pregunta — solo enruta.
+
+    Primero intenta el enrutador local (microsegundos); solo si su confianza
+    es menor que ROUTER_UMBRAL hace la llamada LLM. En modo especulativo, los
+    especialistas que predice el enrutador arrancan mientras el LLM decide.
     """
     print("[SUPERVISOR] Analizando pregunta y eligiendo ruta...")
 
+    decision = None
+    if config.ROUTER_LOCAL_ENABLED or config.ESPECULACION_ENABLED:
+        decision = enrutador.clasificar(estado["pregunta"])
+
+    if config.ROUTER_LOCAL_ENABLED:
+        if decision.confianza >= config.ROUTER_UMBRAL:
+            enrutador.registrar(estado["pregunta"], decision.rutas, "local", decision.confianza)
+            ruta = "+".join(decision.rutas)
+            just = f"enrutador local ({decision.metodo}, confianza {decision.confianza:.2f})"
+            print(f"  Rutas elegidas: {ruta}  [local]")
+            return {"rutas": decision.rutas, "ruta": ruta, "justificacion": just}
+        print(f"  Enrutador local inseguro ({decision.metodo}, "
+              f"confianza {decision.confianza:.2f}) → supervisor LLM")
+
     from langchain_core.messages import HumanMessage, SystemMessage
-    llm = config.crear_llm_dinamico(temperature=0)
 
     prompt_sv = estado.get("prompts", {}).get("supervisor") or PROMPT_SUPERVISOR
     messages = [
@@ -136,33 +190,114 @@ def nodo_supervisor(estado: EstadoMultiagente) -> dict:
         HumanMessage(content=f"Pregunta: {estado['pregunta']}"),
     ]
 
-    respuesta = llm.invoke(messages)
-    texto     = respuesta.content.strip()
+    id_esp = ""
+    if config.ESPECULACION_ENABLED and decision.rutas:
+        id_esp = especulacion.iniciar(
+            decision.rutas,
+            lambda r, id_pres: _trabajo_especialista(r, {**estado, "id_presupuesto": id_pres}),
+            estado.get("id_presupuesto", ""),
+        )
+
+    inicio = time.perf_counter()
+    try:
+        respuesta = hedging.invocar("supervisor", messages, temperature=0)
+    except Exception:
+        especulacion.cerrar(id_esp)
+        raise
+    ms_supervisor = (time.perf_counter() - inicio) * 1000
+    texto         = respuesta.content.strip()
 
     # Eliminar bloques de código markdown si el LLM los agregó
     if "```" in texto:
         lineas = texto.split("\n")
         texto  = "\n".join(ln for ln in lineas if not ln.strip().startswith("```")).strip()
 
+    rutas, just = parsear_rutas(texto)
+    ruta = "+".join(rutas)
+
+    print(f"  Rutas elegidas: {ruta}")
+    print(f"  Justificacion : {just}")
+
+    if config.ROUTER_LOCAL_ENABLED:
+        enrutador.registrar(estado["pregunta"], rutas, "llm", 1.0)
+    if id_esp:
+        especulacion.resolver(id_esp, rutas, ms_supervisor)
+
+    return {"rutas": rutas, "ruta": ruta, "justificacion": just, "id_especulacion": id_esp}
+
+
+RUTAS_VALIDAS = ("trm", "datos", "rag")
+
+
+def parsear_rutas(texto: str) -> tuple[list[str], str]:
+    """
+    Extrae (rutas, justificación) de la respuesta del supervisor.
+
+    Acepta el formato actual {"rutas": [...]} y el anterior {"ruta": "..."}
+    (prompts viejos guardados en SQLite), donde "multiple" equivale a TRM + RAG.
+    Si no hay JSON válido busca los nombres de ruta en el texto; default "rag".
+    """
     try:
         datos = json.loads(texto)
-        ruta  = datos.get("ruta", "rag").lower()
-        just  = datos.get("justificacion", "")
+        crudas = datos.get("rutas") or datos.get("ruta") or []
+        just   = datos.get("justificacion", "")
     except (json.JSONDecodeError, AttributeError):
-        ruta = "rag"
-        for r in ("trm", "datos", "multiple"):
-            if r in texto.lower():
-                ruta = r
-                break
-        just = texto[:100]
+        crudas = [r for r in RUTAS_VALIDAS + ("multiple",) if r in texto.lower()]
+        just   = texto[:100]
 
-    if ruta not in ("trm", "datos", "rag", "multiple"):
-        ruta = "rag"
+    if isinstance(crudas, str):
+        crudas = [crudas]
+    rutas = []
+    for r in (str(x).lower().strip() for x in crudas):
+        for expandida in (("trm", "rag") if r == "multiple" else (r,)):
+            if expandida in RUTAS_VALIDAS and expandida not in rutas:
+                rutas.append(expandida)
 
-    print(f"  Ruta elegida : '{ruta}'")
-    print(f"  Justificacion: {just}")
+    # Orden canónico trm → datos → rag (estable para logs y para el sintetizador)
+    rutas = [r for r in RUTAS_VALIDAS if r in rutas] or ["rag"]
+    return rutas, just
 
-    return {"ruta": ruta, "justificacion": just}
+
+# ---------------------------------------------------------------------------
+# Ejecución de un especialista (compartida por los nodos y la especulación)
+# ---------------------------------------------------------------------------
+
+def _trabajo_especialista(ruta: str, estado: EstadoMultiagente):
+    """
+    Retorna trabajo(callbacks=None) -> str, que ejecuta el agente ReAct de la
+    ruta con sus tools exclusivas. Los callbacks los usa especulacion.py para
+    cancelar la rama y contar sus tokens.
+    """
+    tools = {"trm":   agent_tools.TOOLS_TRM,
+             "datos": agent_tools.tools_datos(),   # + tools de CSV subidos
+             "rag":   agent_tools.TOOLS_RAG}[ruta]
+    system = estado.get("prompts", {}).get(ruta) or {"trm":   PROMPT_TRM,
+                                                      "datos": PROMPT_DATOS,
+                                                      "rag":   PROMPT_RAG}[ruta]
+
+    def trabajo(callbacks: list | None = None) -> str:
+        def _ejecutar(llm):
+            sub_agente = agente_factory.obtener_agente(llm, tools, system)
+            # Acotado por el presupuesto de la request: al agotarse, respuesta parcial
+            return presupuesto.ejecutar_react(
+                sub_agente, {"messages": [("user", estado["pregunta"])]},
+                callbacks=callbacks, nodo=f"agente_{ruta}",
+            )
+
+        with memo.usar(estado.get("id_memo", "")), \
+                presupuesto.usar(estado.get("id_presupuesto", "")):
+            return resiliencia.invocar_nodo(f"agente_{ruta}", _ejecutar, temperature=0.1)
+
+    return trabajo
+
+
+def _respuesta_especialista(ruta: str, estado: EstadoMultiagente) -> str:
+    """Reutiliza la rama especulativa de la ruta si existe; si no, ejecuta el especialista."""
+    if estado.get("id_especulacion"):
+        especulativa = especulacion.tomar(estado["id_especulacion"], ruta)
+        if especulativa is not None:
+            return especulativa
+    return _trabajo_especialista(ruta, estado)()
 
 
 # ---------------------------------------------------------------------------
@@ -172,21 +307,7 @@ def nodo_supervisor(estado: EstadoMultiagente) -> dict:
 def nodo_agente_trm(estado: EstadoMultiagente) -> dict:
     """Especialista en TRM. Tiene acceso exclusivo a TOOLS_TRM."""
     print("[AGENTE TRM] Consultando tipo de cambio...")
-
-    llm = config.crear_llm_dinamico(temperature=0.1)
-    system_trm = estado.get("prompts", {}).get("trm") or PROMPT_TRM
-
-    try:
-        from langchain.agents import create_agent
-        sub_agente = create_agent(model=llm, tools=agent_tools.TOOLS_TRM, system_prompt=system_trm)
-        resultado  = sub_agente.invoke({"messages": [("user", estado["pregunta"])]})
-    except (ImportError, AttributeError):
-        from langgraph.prebuilt import create_react_agent
-        sub_agente = create_react_agent(model=llm, tools=agent_tools.TOOLS_TRM,
-                                        state_modifier=system_trm)
-        resultado  = sub_agente.invoke({"messages": [("user", estado["pregunta"])]})
-
-    respuesta = resultado["messages"][-1].content
+    respuesta = _respuesta_especialista("trm", estado)
     print(f"  TRM respondido ({len(respuesta)} chars)")
     return {"resp_trm": respuesta}
 
@@ -198,21 +319,7 @@ def nodo_agente_trm(estado: EstadoMultiagente) -> dict:
 def nodo_agente_datos(estado: EstadoMultiagente) -> dict:
     """Especialista en comercio exterior. Tiene acceso exclusivo a TOOLS_DATOS."""
     print("[AGENTE DATOS] Analizando comercio exterior...")
-
-    llm = config.crear_llm_dinamico(temperature=0.1)
-    system_datos = estado.get("prompts", {}).get("datos") or PROMPT_DATOS
-
-    try:
-        from langchain.agents import create_agent
-        sub_agente = create_agent(model=llm, tools=agent_tools.TOOLS_DATOS, system_prompt=system_datos)
-        resultado  = sub_agente.invoke({"messages": [("user", estado["pregunta"])]})
-    except (ImportError, AttributeError):
-        from langgraph.prebuilt import create_react_agent
-        sub_agente = create_react_agent(model=llm, tools=agent_tools.TOOLS_DATOS,
-                                        state_modifier=system_datos)
-        resultado  = sub_agente.invoke({"messages": [("user", estado["pregunta"])]})
-
-    respuesta = resultado["messages"][-1].content
+    respuesta = _respuesta_especialista("datos", estado)
     print(f"  Datos respondidos ({len(respuesta)} chars)")
     return {"resp_datos": respuesta}
 
@@ -224,21 +331,7 @@ def nodo_agente_datos(estado: EstadoMultiagente) -> dict:
 def nodo_agente_rag(estado: EstadoMultiagente) -> dict:
     """Especialista en reportes DANE. Tiene acceso exclusivo a TOOLS_RAG."""
     print("[AGENTE RAG] Buscando en documentos DANE...")
-
-    llm = config.crear_llm_dinamico(temperature=0.1)
-    system_rag = estado.get("prompts", {}).get("rag") or PROMPT_RAG
-
-    try:
-        from langchain.agents import create_agent
-        sub_agente = create_agent(model=llm, tools=agent_tools.TOOLS_RAG, system_prompt=system_rag)
-        resultado  = sub_agente.invoke({"messages": [("user", estado["pregunta"])]})
-    except (ImportError, AttributeError):
-        from langgraph.prebuilt import create_react_agent
-        sub_agente = create_react_agent(model=llm, tools=agent_tools.TOOLS_RAG,
-                                        state_modifier=system_rag)
-        resultado  = sub_agente.invoke({"messages": [("user", estado["pregunta"])]})
-
-    respuesta = resultado["messages"][-1].content
+    respuesta = _respuesta_especialista("rag", estado)
     print(f"  RAG respondido ({len(respuesta)} chars)")
     return {"resp_rag": respuesta}
 
@@ -250,26 +343,30 @@ def nodo_agente_rag(estado: EstadoMultiagente) -> dict:
 def nodo_sintetizar(estado: EstadoMultiagente) -> dict:
     """Recibe las respuestas de los agentes y elabora una respuesta final coherente."""
     print("[SINTETIZADOR] Integrando respuestas...")
+    especulacion.cerrar(estado.get("id_especulacion", ""))   # no debería quedar ninguna rama
 
     from langchain_core.messages import HumanMessage, SystemMessage
 
-    partes = []
-    if estado.get("resp_trm"):
-        partes.append(f"=== AGENTE TRM ===\n{estado['resp_trm']}")
-    if estado.get("resp_datos"):
-        partes.append(f"=== AGENTE DATOS ===\n{estado['resp_datos']}")
-    if estado.get("resp_rag"):
-        partes.append(f"=== AGENTE RAG ===\n{estado['resp_rag']}")
+    # Recortadas para no pasar de SINTESIS_MAX_TOKENS entre todas
+    respuestas = compactar.presupuesto_sintesis({
+        "TRM":   estado.get("resp_trm", ""),
+        "Datos": estado.get("resp_datos", ""),
+        "RAG":   estado.get("resp_rag", ""),
+    })
+    partes = [f"=== AGENTE {agente.upper()} ===\n{texto}" for agente, texto in respuestas.items()]
 
     contexto    = "\n\n".join(partes)
-    agentes_str = ", ".join(
-        a for a, r in [("TRM",   estado.get("resp_trm")),
-                       ("Datos", estado.get("resp_datos")),
-                       ("RAG",   estado.get("resp_rag"))]
-        if r
-    )
+    agentes_str = ", ".join(respuestas)
+
+    with presupuesto.usar(estado.get("id_presupuesto", "")) as pres:
+        if pres is not None and pres.deadline_vencido():
+            # Sin tiempo para otra llamada al LLM: se entregan las respuestas tal cual
+            print("  [PRESUPUESTO] deadline vencido: síntesis sin LLM")
+            presupuesto.contar_sintesis_sin_llm()
+            return {"respuesta_final": (
+                "[Respuesta parcial: se agotó el tiempo antes de sintetizar]\n\n" + contexto
+            )}
 
-    llm = config.crear_llm_dinamico(temperature=0.3)
     prompt_sint = estado.get("prompts", {}).get("sintetizador") or PROMPT_SINTETIZADOR
     messages = [
         SystemMessage(content=prompt_sint),
@@ -281,7 +378,7 @@ def nodo_sintetizar(estado: EstadoMultiagente) -> dict:
         )),
     ]
 
-    respuesta = llm.invoke(messages)
+    respuesta = hedging.invocar("sintetizar", messages, temperature=0.3)
     print("  Síntesis completada")
     return {"respuesta_final": respuesta.content}
 
@@ -290,37 +387,26 @@ def nodo_sintetizar(estado: EstadoMultiagente) -> dict:
 # Edges condicionales — lógica de ruteo
 # ---------------------------------------------------------------------------
 
-def enrutar_desde_supervisor(estado: EstadoMultiagente) -> str:
-    ruta = estado.get("ruta", "rag")
-    if ruta in ("trm", "multiple"):
-        return "agente_trm"
-    elif ruta == "datos":
-        return "agente_datos"
-    else:
-        return "agente_rag"
-
-
-def enrutar_desde_trm(estado: EstadoMultiagente) -> str:
-    if estado.get("ruta") == "multiple":
-        return "agente_rag"
-    return "sintetizar"
+def enrutar_desde_supervisor(estado: EstadoMultiagente) -> list[str]:
+    """Fan-out: un nodo por ruta elegida; LangGraph los ejecuta en paralelo."""
+    return [f"agente_{r}" for r in (estado.get("rutas") or ["rag"])]
 
 
 # ---------------------------------------------------------------------------
 # Construir el grafo
 # ---------------------------------------------------------------------------
 
-def construir_grafo():
+def construir_grafo(checkpointer=None):
     """Ensambla y compila el StateGraph multi-agente."""
     from langgraph.graph import StateGraph, START, END
 
     grafo = StateGraph(EstadoMultiagente)
 
-    grafo.add_node("supervisor",   nodo_supervisor)
-    grafo.add_node("agente_trm",   nodo_agente_trm)
-    grafo.add_node("agente_datos", nodo_agente_datos)
-    grafo.add_node("agente_rag",   nodo_agente_rag)
-    grafo.add_node("sintetizar",   nodo_sintetizar)
+    grafo.add_node("supervisor",   trazas.nodo("supervisor",   nodo_supervisor))
+    grafo.add_node("agente_trm",   trazas.nodo("agente_trm",   nodo_agente_trm))
+    grafo.add_node("agente_datos", trazas.nodo("agente_datos", nodo_agente_datos))
+    grafo.add_node("agente_rag",   trazas.nodo("agente_rag",   nodo_agente_rag))
+    grafo.add_node("sintetizar",   trazas.nodo("sintetizar",   nodo_sintetizar))
 
     grafo.add_edge(START, "supervisor")
 
@@ -334,20 +420,25 @@ def construir_grafo():
         },
     )
 
-    grafo.add_conditional_edges(
-        "agente_trm",
-        enrutar_desde_trm,
-        {
-            "agente_rag": "agente_rag",
-            "sintetizar": "sintetizar",
-        },
-    )
-
+    # Join: sintetizar se ejecuta una sola vez, en el superstep siguiente
+    # a que terminen todos los especialistas lanzados
+    grafo.add_edge("agente_trm",   "sintetizar")
     grafo.add_edge("agente_datos", "sintetizar")
     grafo.add_edge("agente_rag",   "sintetizar")
     grafo.add_edge("sintetizar",   END)
 
-    return grafo.compile()
+    return grafo.compile(checkpointer=checkpointer)
+
+
+_grafo_app = None
+
+
+def obtener_grafo():
+    """Grafo compilado una sola vez por proceso (los prompts viajan en el estado)."""
+    global _grafo_app
+    if _grafo_app is None:
+        _grafo_app = construir_grafo(checkpointer=checkpoints.obtener_saver())
+    return _grafo_app
 
 
 # ---------------------------------------------------------------------------
@@ -355,7 +446,8 @@ def construir_grafo():
 # ---------------------------------------------------------------------------
 
 def ejecutar_agente(pregunta: str, silencioso: bool = False,
-                    prompts: dict | None = None) -> str:
+                    prompts: dict | None = None,
+                    id_solicitud: str | None = None) -> str:
     """
     Ejecuta el sistema multi-agente con la pregunta dada.
 
@@ -364,6 +456,8 @@ def ejecutar_agente(pregunta: str, silencioso: bool = False,
         silencioso: si True, suprime el encabezado
         prompts:    dict con prompts personalizados (claves: supervisor, trm, datos, rag, sintetizador)
                     Si None, carga desde SQLite o usa los defaults del módulo.
+        id_solicitud: clave del checkpoint. Repetir el mismo id tras un fallo
+                    reanuda desde el último nodo completado (ver checkpoints.py).
 
     Retorna:
         str con la respuesta final sintetizada
@@ -378,7 +472,7 @@ def ejecutar_agente(pregunta: str, silencioso: bool = False,
         except Exception:
             prompts = {}
 
-    app = construir_grafo()
+    app = obtener_grafo()
 
     if not silencioso:
         print(f"\n{'='*65}")
@@ -392,6 +486,7 @@ def ejecutar_agente(pregunta: str, silencioso: bool = False,
 
     estado_inicial: EstadoMultiagente = {
         "pregunta":        pregunta,
+        "rutas":           [],
         "ruta":            "",
         "justificacion":   "",
         "resp_trm":        "",
@@ -399,9 +494,18 @@ def ejecutar_agente(pregunta: str, silencioso: bool = False,
         "resp_rag":        "",
         "respuesta_final": "",
         "prompts":         prompts or {},
+        "id_memo":         "",
+        "id_especulacion": "",
+        "id_presupuesto":  "",
     }
 
-    estado_final = app.invoke(estado_inicial)
+    with memo.solicitud() as memo_tools, presupuesto.solicitud() as pres:
+        estado_inicial["id_memo"]        = memo_tools.id
+        estado_inicial["id_presupuesto"] = pres.id
+        estado_final = checkpoints.ejecutar(
+            app, "multiagente", id_solicitud or uuid.uuid4().hex, estado_inicial,
+            contexto=("id_memo", "id_presupuesto", "id_especulacion"),
+        )
 
     if not silencioso:
         print(f"\n{'='*65}")
@@ -409,6 +513,8 @@ def ejecutar_agente(pregunta: str, silencioso: bool = False,
         print(f"{'='*65}")
         print(estado_final["respuesta_final"])
         print(f"\n  Ruta: {estado_final['ruta']} — {estado_final['justificacion']}")
+        print(f"  Memo tools: {memo_tools.resumen()}")
+        print(f"  Presupuesto: {pres.resumen()}")
         print(f"{'='*65}\n")
 
     return estado_final["respuesta_final"]
@@ -0,0 +1,183 @@
+"""
+analisis_cruzado.py — TRM vs comercio exterior (correlaciones y elasticidades)
+==============================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Para "¿cómo afectó el dólar a las exportaciones?" el LLM recibía dos JSON
+separados (analizar_historico_trm y consultar_balanza_comercial) y hacía las
+cuentas de cabeza: correlaciones inventadas o mal calculadas.
+
+Este módulo une la TRM mensual (promedio del mes, serie_trm.py) con
+datos/comercio_exterior_*.csv por (año, mes) y calcula con NumPy:
+
+  correlaciones            Pearson TRM vs exportaciones / importaciones / balanza,
+                           en niveles y en variaciones mensuales
+  correlaciones rezagadas  variación de la TRM en t vs variación del comercio en
+                           t + k, k = 0..rezago_max (¿el efecto llega con retraso?)
+  elasticidades            pendiente de la regresión de Δlog(comercio) sobre
+                           Δlog(TRM): % que cambia el comercio por 1 % de TRM
+  variación anual          mismo mes del año anterior, si hay datos
+
+La balanza puede ser negativa: para ella se usan diferencias absolutas (USD
+millones) en vez de variaciones porcentuales y no se calcula elasticidad.
+
+Uso:
+    analisis_cruzado.trm_vs_comercio(rezago_max=3)
+"""
+
+import sys
+
+import numpy as np
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import datasets
+import serie_trm
+
+VARIABLES = ("exportaciones", "importaciones", "balanza")
+_COLUMNAS = {"exportaciones": "exportaciones_usd_mill",
+             "importaciones": "importaciones_usd_mill",
+             "balanza":       "balanza_comercial"}
+
+
+# ---------------------------------------------------------------------------
+# Datos alineados por mes
+# ---------------------------------------------------------------------------
+
+def _comercio() -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """Claves de mes (meses desde 1970) y columnas de comercio, ordenadas y sin repetidos."""
+    archivos = [n for n in datasets.nombres() if n.startswith("comercio_exterior_")]
+    if not archivos:
+        raise FileNotFoundError("no hay archivos datos/comercio_exterior_*.csv")
+    claves, valores = [], {v: [] for v in VARIABLES}
+    for nombre in archivos:
+        df = datasets.obtener(nombre, columnas=["año", "mes", *_COLUMNAS.values()])
+        claves.append((df["año"].to_numpy(dtype=np.int64) - 1970) * 12
+                      + df["mes"].to_numpy(dtype=np.int64) - 1)
+        for v, col in _COLUMNAS.items():
+            valores[v].append(df[col].to_numpy(dtype=np.float64))
+
+    clave = np.concatenate(claves)
+    orden = np.argsort(clave, kind="stable")
+    clave = clave[orden]
+    ultimo = np.append(clave[1:] != clave[:-1], True)   # ante meses repetidos, el último archivo
+    return clave[ultimo], {v: np.concatenate(x)[orden][ultimo] for v, x in valores.items()}
+
+
+def alinear() -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """(claves de mes, TRM promedio del mes, columnas de comercio) de los meses comunes."""
+    s = serie_trm.serie()
+    clave_trm = s.meses.astype(np.int64)
+    clave_com, comercio = _comercio()
+    clave, i_trm, i_com = np.intersect1d(clave_trm, clave_com, assume_unique=True,
+                                         return_indices=True)
+    return clave, s.promedio_mes[i_trm], {v: x[i_com] for v, x in comercio.items()}
+
+
+# ---------------------------------------------------------------------------
+# Estadísticos vectorizados
+# ---------------------------------------------------------------------------
+
+def _correlacion(x: np.ndarray, y: np.ndarray) -> float | None:
+    """Pearson; None con menos de 3 pares o una serie constante."""
+    if len(x) < 3:
+        return None
+    dx, dy = x - x.mean(), y - y.mean()
+    den = np.sqrt((dx * dx).sum() * (dy * dy).sum())
+    return round(float((dx * dy).sum() / den), 3) if den > 0 else None
+
+
+def _variacion(v: str, x: np.ndarray) -> np.ndarray:
+    """Variación mensual: % para flujos, diferencia absoluta para la balanza."""
+    return np.diff(x) if v == "balanza" else np.diff(x) / x[:-1] * 100
+
+
+def _elasticidad(trm: np.ndarray, y: np.ndarray) -> dict | None:
+    """Pendiente y R² de Δlog(y) = a + β·Δlog(TRM)."""
+    dx, dy = np.diff(np.log(trm)), np.diff(np.log(y))
+    if len(dx) < 3 or dx.var() == 0:
+        return None
+    beta = float(np.cov(dx, dy, bias=True)[0, 1] / dx.var())
+    r = np.corrcoef(dx, dy)[0, 1]
+    return {"elasticidad": round(beta, 3), "r2": round(float(r * r), 3)}
+
+
+def _etiqueta(clave: int) -> str:
+    return f"{1970 + clave // 12}-{clave % 12 + 1:02d}"
+
+
+# ---------------------------------------------------------------------------
+# Análisis
+# ---------------------------------------------------------------------------
+
+def trm_vs_comercio(rezago_max: int = 3) -> dict:
+    """Relación TRM ↔ comercio exterior en los meses con ambos datos."""
+    clave, trm, comercio = alinear()
+    n = len(clave)
+    if n < 3:
+        raise ValueError(f"solo hay {n} meses con TRM y comercio exterior; se necesitan 3")
+    rezago_max = max(0, min(int(rezago_max), n - 4))
+
+    d_trm = np.diff(trm) / trm[:-1] * 100
+    d_com = {v: _variacion(v, x) for v, x in comercio.items()}
+
+    correlaciones = [
+        {"variable": v,
+         "nivel": _correlacion(trm, comercio[v]),
+         "variacion_mensual": _correlacion(d_trm, d_com[v])}
+        for v in VARIABLES
+    ]
+
+    # Δtrm en t contra Δcomercio en t + k
+    rezagadas = [
+        {"rezago_meses": k,
+         **{v: _correlacion(d_trm[:len(d_trm) - k], d_com[v][k:]) for v in VARIABLES}}
+        for k in range(rezago_max + 1)
+    ]
+
+    elasticidades = []
+    for v in ("exportaciones", "importaciones"):
+        e = _elasticidad(trm, comercio[v]) if (comercio[v] > 0).all() else None
+        if e is not None:
+            elasticidades.append({"variable": v, **e})
+
+    # Mismo mes del año anterior: posiciones de clave - 12 dentro de clave
+    pos = np.searchsorted(clave, clave - 12)
+    hay = (pos < n) & (clave[np.minimum(pos, n - 1)] == clave - 12)
+    anual = [
+        {"mes": _etiqueta(int(clave[t])),
+         "trm_pct": round(float((trm[t] / trm[p] - 1) * 100), 2),
+         **{f"{v}_pct": round(float((comercio[v][t] / comercio[v][p] - 1) * 100), 2)
+            for v in ("exportaciones", "importaciones")}}
+        for t, p in zip(np.flatnonzero(hay), pos[hay])
+    ]
+
+    return {
+        "periodo":                 f"{_etiqueta(int(clave[0]))} a {_etiqueta(int(clave[-1]))}",
+        "n_meses":                 n,
+        "correlaciones":           correlaciones,
+        "correlaciones_rezagadas": rezagadas,
+        "elasticidades":           elasticidades,
+        "variacion_anual":         anual,
+        "interpretacion":          _interpretar(rezagadas, elasticidades, n),
+    }
+
+
+def _interpretar(rezagadas: list, elasticidades: list, n: int) -> str:
+    """Frase corta con la relación más fuerte (para que el LLM no la deduzca)."""
+    partes = []
+    for e in elasticidades:
+        sentido = "suben" if e["elasticidad"] > 0 else "bajan"
+        partes.append(f"por cada 1% que sube la TRM, {e['variable']} {sentido} "
+                      f"{abs(e['elasticidad']):.2f}% (R² {e['r2']:.2f})")
+    candidatos = [(abs(f[v]), f["rezago_meses"], v, f[v])
+                  for f in rezagadas for v in VARIABLES if f[v] is not None]
+    if candidatos:
+        _, k, v, r = max(candidatos)
+        partes.append(f"la correlación más fuerte de las variaciones es con {v} "
+                      f"{'en el mismo mes' if k == 0 else f'{k} mes(es) después'} (r = {r:.2f})")
+    if n < 24:
+        partes.append(f"muestra de solo {n} meses: tomar como indicativo")
+    texto = "; ".join(partes)
+    return texto[:1].upper() + texto[1:] + "."
@@ -0,0 +1,227 @@
+"""
+checkpoints.py — Checkpointing de los grafos LangGraph con reanudación
+======================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Si el sintetizador falla después de que los especialistas TRM y RAG ya
+terminaron, antes un reintento del cliente volvía a ejecutar TODO el grafo.
+Ahora el pipeline y el grafo multi-agente guardan un checkpoint por superstep
+en SQLite (checkpoints.db), con clave = id de la solicitud:
+
+  thread_id = "<grafo>:<id_solicitud>"      p. ej. "multiagente:3f2a..."
+
+Un reintento con el mismo id_solicitud:
+  - ejecución incompleta → se reanuda desde el último nodo completado
+                           (los nodos que terminaron no se repiten)
+  - ejecución terminada  → se devuelve el estado final guardado (idempotente)
+  - id nuevo             → ejecución normal desde START
+  - otra entrada         → SolicitudEnConflicto (la API responde 409): el hilo
+                           guarda un hash de la entrada con que se creó
+                           (pregunta, backend, temperatura, prompts,
+                           presupuesto: todo menos las claves de contexto)
+
+Al reanudar, las claves de `contexto` (ids de la memo de tools, del
+presupuesto... que solo viven en el proceso y la request que los creó) se
+reescriben en el estado con los valores de la request actual, vía
+Command(update=...): así la parte reanudada sí tiene memo y presupuesto.
+
+Los checkpoints se borran pasados CHECKPOINT_TTL_S desde su última
+actualización (recolección perezosa, como mucho cada CHECKPOINT_GC_CADA_S).
+
+Requiere langgraph-checkpoint-sqlite; si no está instalado los grafos se
+compilan sin checkpointer y funcionan como antes.
+"""
+
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:
+    SqliteSaver = None
+
+
+class SolicitudEnConflicto(ValueError):
+    """El id_solicitud ya se usó con otra pregunta o configuración."""
+
+
+_saver     = None
+_conn: sqlite3.Connection | None = None
+_lock      = threading.Lock()
+_ultimo_gc = 0.0
+_stats     = {"ejecuciones": 0, "reanudadas": 0, "repetidas": 0, "conflictos": 0,
+              "borrados_gc": 0}
+
+
+def obtener_saver():
+    """SqliteSaver compartido por el proceso, o None si no hay checkpointing."""
+    global _saver, _conn
+    if not config.CHECKPOINTS_ENABLED or SqliteSaver is None:
+        return None
+    with _lock:
+        if _saver is None:
+            _conn  = sqlite3.connect(config.CHECKPOINTS_PATH, check_same_thread=False)
+            _saver = SqliteSaver(_conn)
+            _saver.setup()
+            _conn.execute("""
+                CREATE TABLE IF NOT EXISTS hilos_checkpoint (
+                    thread_id   TEXT PRIMARY KEY,
+                    actualizado REAL NOT NULL,
+                    huella      TEXT
+                )
+            """)
+            columnas = {c[1] for c in _conn.execute("PRAGMA table_info(hilos_checkpoint)")}
+            if "huella" not in columnas:   # bases creadas antes de guardar la huella
+                _conn.execute("ALTER TABLE hilos_checkpoint ADD COLUMN huella TEXT")
+            _conn.commit()
+        return _saver
+
+
+def _tocar(thread_id: str, huella: str) -> None:
+    """Marca actividad del hilo; la huella solo se fija la primera vez."""
+    with _lock:
+        _conn.execute(
+            "INSERT INTO hilos_checkpoint (thread_id, actualizado, huella) VALUES (?, ?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET actualizado = excluded.actualizado, "
+            "huella = COALESCE(huella, excluded.huella)",
+            (thread_id, time.time(), huella),
+        )
+        _conn.commit()
+
+
+def _huella(thread_id: str) -> str | None:
+    with _lock:
+        fila = _conn.execute("SELECT huella FROM hilos_checkpoint WHERE thread_id = ?",
+                             (thread_id,)).fetchone()
+    return fila[0] if fila else None
+
+
+# ---------------------------------------------------------------------------
+# Ejecución con reanudación
+# ---------------------------------------------------------------------------
+
+def _huella_entrada(estado_inicial: dict, contexto: tuple[str, ...]) -> str:
+    """
+    Hash de todo lo que define la solicitud (pregunta, backend, temperatura,
+    prompts, presupuesto...): todas las claves menos las de contexto, que
+    cambian en cada request aunque sea un reintento.
+    """
+    entrada = {k: v for k, v in estado_inicial.items() if k not in contexto}
+    texto   = json.dumps(entrada, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def ejecutar(app, grafo: str, id_solicitud: str, estado_inicial: dict,
+             contexto: tuple[str, ...] = ()) -> dict:
+    """
+    Ejecuta (o reanuda) el grafo compilado app para esta solicitud.
+    Retorna el estado final. Sin checkpointer equivale a app.invoke(estado_inicial).
+
+    contexto: claves de estado_inicial con ids de la request actual que
+    reemplazan a las guardadas al reanudar (p. ej. id_memo, id_presupuesto).
+    Lanza SolicitudEnConflicto si el id ya se usó con otra pregunta o con
+    otra configuración (cualquier clave de estado_inicial fuera de contexto).
+    """
+    if getattr(app, "checkpointer", None) is None:
+        return app.invoke(estado_inicial)
+
+    from langgraph.types import Command
+
+    recolectar_expirados()
+    thread_id = f"{grafo}:{id_solicitud}"
+    cfg       = {"configurable": {"thread_id": thread_id}}
+    huella    = _huella_entrada(estado_inicial, contexto)
+    previa    = _huella(thread_id)
+    if previa is not None and previa != huella:
+        with _lock:
+            _stats["conflictos"] += 1
+        raise SolicitudEnConflicto(
+            f"id_solicitud {id_solicitud} ya se usó con otra pregunta o configuración "
+            f"(backend, prompts, presupuesto...); usa un id nuevo")
+    _tocar(thread_id, huella)
+
+    previo = app.get_state(cfg)
+    with _lock:
+        _stats["ejecuciones"] += 1
+        if previo.next:
+            _stats["reanudadas"] += 1
+        elif previo.values:
+            _stats["repetidas"] += 1
+
+    if previo.next:
+        print(f"  [CHECKPOINT] {thread_id}: reanudando en {list(previo.next)}")
+        # Command(update=...) aplica los ids nuevos sin descartar las escrituras
+        # de los nodos que ya terminaron en el superstep interrumpido
+        # (app.update_state crearía un superstep nuevo y los repetiría)
+        frescos = {k: estado_inicial[k] for k in contexto if k in estado_inicial}
+        resultado = app.invoke(Command(update=frescos) if frescos else None, cfg)
+    elif previo.values:
+        print(f"  [CHECKPOINT] {thread_id}: ya terminada, se devuelve el estado guardado")
+        return previo.values
+    else:
+        resultado = app.invoke(estado_inicial, cfg)
+
+    _tocar(thread_id, huella)
+    return resultado
+
+
+# ---------------------------------------------------------------------------
+# Recolección de checkpoints expirados
+# ---------------------------------------------------------------------------
+
+def recolectar_expirados(forzar: bool = False) -> int:
+    """Borra los hilos sin actividad en CHECKPOINT_TTL_S. Retorna cuántos borró."""
+    global _ultimo_gc
+    saver = obtener_saver()
+    if saver is None:
+        return 0
+    ahora = time.time()
+    with _lock:
+        if not forzar and ahora - _ultimo_gc < config.CHECKPOINT_GC_CADA_S:
+            return 0
+        _ultimo_gc = ahora
+        filas = _conn.execute(
+            "SELECT thread_id FROM hilos_checkpoint WHERE actualizado < ?",
+            (ahora - config.CHECKPOINT_TTL_S,),
+        ).fetchall()
+
+    for (thread_id,) in filas:
+        saver.delete_thread(thread_id)
+        with _lock:
+            _conn.execute("DELETE FROM hilos_checkpoint WHERE thread_id = ?", (thread_id,))
+            _conn.commit()
+
+    if filas:
+        with _lock:
+            _stats["borrados_gc"] += len(filas)
+        print(f"  [CHECKPOINT] GC: {len(filas)} hilos expirados borrados")
+    return len(filas)
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Ejecuciones, reanudaciones e hilos guardados."""
+    hilos = 0
+    if obtener_saver() is not None:
+        with _lock:
+            hilos = _conn.execute("SELECT COUNT(*) FROM hilos_checkpoint").fetchone()[0]
+    with _lock:
+        st = dict(_stats)
+    return {
+        "habilitado":    obtener_saver() is not None,
+        "ttl_s":         config.CHECKPOINT_TTL_S,
+        "hilos_activos": hilos,
+        **st,
+    }
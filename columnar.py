@@ -0,0 +1,261 @@
+"""
+columnar.py — Almacén columnar (Arrow IPC) de los datasets de datos/
+====================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Los CSV de 12 filas de 2024 se van a reemplazar por series completas (TRM
+diaria desde 1991, comercio mensual por sector y país). A ese tamaño parsear
+CSV en cada carga es el cuello de botella.
+
+Ingesta (al subir un CSV a /api/upload/datos, o perezosa en la primera lectura):
+  1. pandas lee el CSV e infiere tipos
+  2. se valida el esquema: genérico (columnas con nombre, únicas, no vacías)
+     y, para los datasets conocidos (ESQUEMAS), columnas y tipos requeridos
+  3. se escribe en formato Arrow IPC sin compresión en datos/.columnar/
+       <stem>.<version>.arrow   datos
+       <stem>.json              esquema + huella del CSV de origen + versión
+
+Lectura: el archivo .arrow se abre con memory-map (pyarrow.memory_map). Las
+columnas no se copian a memoria: leer(..., columnas, ultimas) proyecta las
+columnas y el rango de filas pedidos y solo eso se convierte a pandas.
+
+Se usa Arrow IPC y no Parquet porque Arrow IPC sin comprimir se puede mapear
+sin decodificar (cero copias); Parquet obliga a descomprimir cada lectura.
+
+Requiere pyarrow (opcional). Sin pyarrow, datasets.py sigue leyendo los CSV.
+
+Uso:
+    python columnar.py              # ingiere todos los datos/*.csv
+"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+
+class EsquemaInvalido(ValueError):
+    """El CSV no cumple el esquema esperado; no se ingiere."""
+
+
+# Datasets conocidos por prefijo del nombre: columnas requeridas y tipo
+#   "int" | "float" | "str" | "fecha"   (columnas extra se aceptan con el tipo inferido)
+#   El primer prefijo que coincide gana: los más específicos van primero.
+#   trm_*.csv puede ser mensual o diario (igual que en serie_trm.py): si trae
+#   fecha y no año/mes se valida con ESQUEMA_TRM_DIARIA.
+ESQUEMAS: dict[str, dict[str, str]] = {
+    "trm_": {
+        "año": "int", "mes": "int", "nombre_mes": "str",
+        "trm": "float", "variacion_pct": "float",
+    },
+    "comercio_exterior_": {
+        "año": "int", "mes": "int", "nombre_mes": "str",
+        "exportaciones_usd_mill": "float", "importaciones_usd_mill": "float",
+        "balanza_comercial": "float",
+    },
+    "comercio_detalle_": {
+        "año": "int", "mes": "int", "sector": "str", "pais": "str",
+        "exportaciones_usd_mill": "float", "importaciones_usd_mill": "float",
+    },
+    "exportaciones_sectores_": {
+        "sector": "str", "valor_usd_mill": "float",
+        "participacion_pct": "float", "variacion_anual_pct": "float",
+    },
+}
+
+
+ESQUEMA_TRM_DIARIA: dict[str, str] = {"fecha": "fecha", "trm": "float"}
+
+
+def disponible() -> bool:
+    return pa is not None and config.DATASETS_COLUMNAR
+
+
+def _dir() -> Path:
+    return config.DATOS_DIR / ".columnar"
+
+
+def _esquema_requerido(nombre: str, columnas) -> dict[str, str]:
+    if nombre.startswith("trm_") and "fecha" in columnas and not {"año", "mes"} <= set(columnas):
+        return ESQUEMA_TRM_DIARIA
+    return next((e for prefijo, e in ESQUEMAS.items() if nombre.startswith(prefijo)), {})
+
+
+# ---------------------------------------------------------------------------
+# Validación de esquema
+# ---------------------------------------------------------------------------
+
+def validar(df, nombre: str):
+    """Valida y normaliza tipos. Retorna el DataFrame listo para Arrow o lanza EsquemaInvalido."""
+    import pandas as pd
+
+    if df.empty:
+        raise EsquemaInvalido(f"{nombre}: el archivo no tiene filas")
+    columnas = [str(c).strip() for c in df.columns]
+    if any(not c or c.startswith("Unnamed:") for c in columnas):
+        raise EsquemaInvalido(f"{nombre}: hay columnas sin nombre")
+    if len(set(columnas)) != len(columnas):
+        raise EsquemaInvalido(f"{nombre}: nombres de columna repetidos")
+    df.columns = columnas
+    vacias = [c for c in columnas if df[c].isna().all()]
+    if vacias:
+        raise EsquemaInvalido(f"{nombre}: columnas sin ningún valor: {vacias}")
+
+    requerido = _esquema_requerido(nombre, columnas)
+    faltantes = [c for c in requerido if c not in df.columns]
+    if faltantes:
+        raise EsquemaInvalido(f"{nombre}: faltan columnas requeridas {faltantes}")
+    for col, tipo in requerido.items():
+        if tipo == "str":
+            df[col] = df[col].astype(str)
+            continue
+        if tipo == "fecha":
+            fechas = pd.to_datetime(df[col], errors="coerce")
+            if fechas.isna().any():
+                raise EsquemaInvalido(f"{nombre}: la columna '{col}' debe tener fechas válidas")
+            df[col] = fechas
+            continue
+        convertida = pd.to_numeric(df[col], errors="coerce")
+        if convertida.isna().sum() > df[col].isna().sum():
+            raise EsquemaInvalido(f"{nombre}: la columna '{col}' debe ser numérica")
+        if tipo == "int":
+            if convertida.isna().any() or (convertida % 1 != 0).any():
+                raise EsquemaInvalido(f"{nombre}: la columna '{col}' debe ser entera")
+            convertida = convertida.astype("int64")
+        else:
+            convertida = convertida.astype("float64")
+        df[col] = convertida
+
+    # Columnas de fecha (por nombre) como timestamp: rangos por fecha sin parsear texto
+    for col in df.columns:
+        if "fecha" in col.lower() and pd.api.types.is_string_dtype(df[col]):
+            fechas = pd.to_datetime(df[col], errors="coerce")
+            if fechas.notna().all():
+                df[col] = fechas
+    return df
+
+
+def validar_archivo(ruta: Path, nombre: str) -> None:
+    """
+    Valida el CSV en ruta con el esquema de nombre sin ingerirlo (una subida
+    se valida en un archivo temporal antes de reemplazar datos/<nombre>).
+    """
+    import pandas as pd
+
+    try:
+        df = pd.read_csv(ruta)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        raise EsquemaInvalido(f"{nombre}: no se pudo leer como CSV ({type(e).__name__})") from e
+    validar(df, nombre)
+
+
+# ---------------------------------------------------------------------------
+# Ingesta y lectura
+# ---------------------------------------------------------------------------
+
+def _meta(stem: str) -> dict | None:
+    ruta = _dir() / f"{stem}.json"
+    try:
+        return json.loads(ruta.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def ingerir(nombre: str) -> dict:
+    """
+    Convierte datos/<nombre> (CSV) a Arrow IPC. Retorna los metadatos
+    (version, filas, esquema...). Lanza EsquemaInvalido si no valida.
+    """
+    import pandas as pd
+
+    origen    = config.DATOS_DIR / Path(nombre).name
+    contenido = origen.read_bytes()
+    st        = origen.stat()
+    version   = hashlib.sha1(contenido).hexdigest()[:12]
+
+    df    = validar(pd.read_csv(origen), origen.name)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+
+    _dir().mkdir(parents=True, exist_ok=True)
+    stem    = origen.stem
+    destino = _dir() / f"{stem}.{version}.arrow"
+    if not destino.exists():
+        temporal = destino.with_suffix(".tmp")
+        with pa.OSFile(str(temporal), "wb") as f, pa.ipc.new_file(f, tabla.schema) as w:
+            w.write_table(tabla)
+        temporal.replace(destino)
+
+    meta = {
+        "origen":   origen.name,
+        "archivo":  destino.name,
+        "version":  version,
+        "mtime_ns": st.st_mtime_ns,
+        "tamano":   st.st_size,
+        "filas":    tabla.num_rows,
+        "esquema":  {c.name: str(c.type) for c in tabla.schema},
+    }
+    (_dir() / f"{stem}.json").write_text(json.dumps(meta, ensure_ascii=False, indent=2),
+                                          encoding="utf-8")
+    _limpiar_versiones(stem, destino.name)
+    print(f"  [COLUMNAR] {origen.name} → {destino.name} ({tabla.num_rows} filas)")
+    return meta
+
+
+def _limpiar_versiones(stem: str, vigente: str) -> None:
+    for viejo in _dir().glob(f"{stem}.*.arrow"):
+        if viejo.name != vigente:
+            try:
+                viejo.unlink()
+            except OSError:
+                pass   # en Windows sigue mapeado por otra lectura: se borra en la próxima
+
+
+def abrir(nombre: str):
+    """
+    Tabla Arrow memory-mapped de datos/<nombre>, ingiriendo el CSV si no hay
+    versión columnar o si el CSV cambió desde la última ingesta.
+    Retorna (tabla, meta).
+    """
+    origen = config.DATOS_DIR / Path(nombre).name
+    st     = origen.stat()
+    meta   = _meta(origen.stem)
+    if (meta is None or (meta["mtime_ns"], meta["tamano"]) != (st.st_mtime_ns, st.st_size)
+            or not (_dir() / meta["archivo"]).exists()):
+        meta = ingerir(origen.name)
+    fuente = pa.memory_map(str(_dir() / meta["archivo"]), "r")
+    return pa.ipc.open_file(fuente).read_all(), meta
+
+
+def eliminar(nombre: str) -> None:
+    """Borra la versión columnar de datos/<nombre> (al eliminar el CSV)."""
+    stem = Path(nombre).stem
+    for ruta in [*_dir().glob(f"{stem}.*.arrow"), _dir() / f"{stem}.json"]:
+        try:
+            ruta.unlink()
+        except OSError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Punto de entrada
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    if pa is None:
+        sys.exit("pyarrow no está instalado: pip install pyarrow")
+    for csv in sorted(config.DATOS_DIR.glob("*.csv")):
+        try:
+            ingerir(csv.name)
+        except EsquemaInvalido as e:
+            print(f"  [COLUMNAR] {e}")
@@ -0,0 +1,170 @@
+"""
+compactar.py — Salidas compactas de tools y presupuesto de contexto
+===================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Cada salida de tool vuelve al LLM como ToolMessage y se re-envía en todos los
+turnos siguientes del loop ReAct; las respuestas de los especialistas se
+re-envían otra vez al sintetizador. El JSON con indent=2, claves repetidas en
+cada fila, notas y series mensuales completas multiplica los tokens de entrada.
+
+Modo compacto (TOOLS_SALIDA_COMPACTA, por defecto activo):
+  - JSON minificado (sin indentación ni espacios tras ':' y ',')
+  - listas de registros como tabla: {"cols": [...], "filas": [[...], ...]}
+    (las claves aparecen una vez, no en cada fila)
+  - campos opcionales fuera (fuentes, instrucciones, resúmenes derivables)
+  - series largas resumidas a las últimas TOOLS_MAX_FILAS_SERIE filas salvo
+    que la tool se llame con detalle=True
+
+Sintetizador: las respuestas de los especialistas se recortan para que juntas
+no superen SINTESIS_MAX_TOKENS (el presupuesto que no usa una respuesta corta
+pasa a las largas).
+
+Tamaño de cada salida (bytes y tokens estimados, compacta vs. la verbosa que
+se habría enviado) expuesto en GET /metricas.
+"""
+
+import json
+import sys
+import threading
+from collections import defaultdict
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+from middleware import estimar_tokens
+
+
+_lock  = threading.Lock()
+_tools = defaultdict(lambda: {"llamadas": 0, "bytes": 0, "tokens": 0, "tokens_verbose": 0})
+_sintesis = {"llamadas": 0, "recortes": 0, "tokens_entrada": 0, "tokens_recortados": 0}
+
+
+# ---------------------------------------------------------------------------
+# Salidas de tools
+# ---------------------------------------------------------------------------
+
+def tabla(registros: list[dict]) -> dict:
+    """[{"mes": "Enero", "trm": 1.0}, ...] → {"cols": ["mes", "trm"], "filas": [["Enero", 1.0], ...]}"""
+    if not registros:
+        return {"cols": [], "filas": []}
+    cols = list(registros[0])
+    return {"cols": cols, "filas": [[r.get(c) for c in cols] for r in registros]}
+
+
+def _es_registros(valor) -> bool:
+    return isinstance(valor, list) and bool(valor) and all(isinstance(v, dict) for v in valor)
+
+
+def salida(tool: str, datos: dict, opcionales: tuple = (), series: tuple = (),
+           detalle: bool = False) -> str:
+    """
+    Serializa la salida de una tool.
+
+    opcionales: claves que se omiten en modo compacto
+    series:     claves con listas largas que se resumen salvo detalle=True
+    """
+    verbose = json.dumps(datos, ensure_ascii=False, indent=2)
+    if not config.TOOLS_SALIDA_COMPACTA:
+        _medir(tool, verbose, verbose)
+        return verbose
+
+    compacto = {}
+    for clave, valor in datos.items():
+        if clave in opcionales:
+            continue
+        if clave in series and not detalle and isinstance(valor, list) \
+                and len(valor) > config.TOOLS_MAX_FILAS_SERIE:
+            compacto[f"{clave}_omitidas"] = len(valor) - config.TOOLS_MAX_FILAS_SERIE
+            valor = valor[-config.TOOLS_MAX_FILAS_SERIE:]
+        compacto[clave] = tabla(valor) if _es_registros(valor) else valor
+
+    texto = json.dumps(compacto, ensure_ascii=False, separators=(",", ":"))
+    _medir(tool, texto, verbose)
+    return texto
+
+
+def _medir(tool: str, texto: str, verbose: str) -> None:
+    with _lock:
+        m = _tools[tool]
+        m["llamadas"]       += 1
+        m["bytes"]          += len(texto.encode("utf-8"))
+        m["tokens"]         += estimar_tokens(texto)
+        m["tokens_verbose"] += estimar_tokens(verbose)
+
+
+# ---------------------------------------------------------------------------
+# Presupuesto de tokens del sintetizador
+# ---------------------------------------------------------------------------
+
+def recortar(texto: str, max_tokens: int) -> str:
+    """Corta texto a ~max_tokens, en el último salto de línea si lo hay."""
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+    limite = max_tokens * 4
+    corte  = texto.rfind("\n", 0, limite)
+    if corte < limite // 2:
+        corte = limite
+    omitidos = estimar_tokens(texto[corte:])
+    return f"{texto[:corte].rstrip()}\n[… recortado: ~{omitidos} tokens omitidos]"
+
+
+def presupuesto_sintesis(respuestas: dict[str, str]) -> dict[str, str]:
+    """
+    Recorta las respuestas de los especialistas para que juntas quepan en
+    SINTESIS_MAX_TOKENS. Reparto equitativo; lo que sobra de las respuestas
+    cortas se reparte entre las largas. 0 = sin límite.
+    """
+    presentes = {k: v for k, v in respuestas.items() if v}
+    total     = config.SINTESIS_MAX_TOKENS
+    tokens    = {k: estimar_tokens(v) for k, v in presentes.items()}
+    with _lock:
+        _sintesis["llamadas"]       += 1
+        _sintesis["tokens_entrada"] += sum(tokens.values())
+    if total <= 0 or sum(tokens.values()) <= total:
+        return presentes
+
+    # Reparto tipo "llenado de agua": las más cortas primero
+    cupos, restante = {}, total
+    pendientes = sorted(presentes, key=tokens.get)
+    while pendientes:
+        cuota = restante // len(pendientes)
+        k = pendientes.pop(0)
+        cupos[k] = min(tokens[k], cuota)
+        restante -= cupos[k]
+
+    recortadas = {k: recortar(v, cupos[k]) for k, v in presentes.items()}
+    with _lock:
+        _sintesis["recortes"] += sum(1 for k in presentes if cupos[k] < tokens[k])
+        _sintesis["tokens_recortados"] += sum(tokens[k] - cupos[k] for k in presentes)
+    return recortadas
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Tamaño medio de salida por tool, ahorro frente al JSON verboso y recortes del sintetizador."""
+    with _lock:
+        tools    = {t: dict(m) for t, m in _tools.items()}
+        sintesis = dict(_sintesis)
+    por_tool = {}
+    for t, m in sorted(tools.items()):
+        n = m["llamadas"]
+        por_tool[t] = {
+            "llamadas":             n,
+            "bytes_medio":          round(m["bytes"] / n),
+            "tokens_medio":         round(m["tokens"] / n),
+            "tokens_verbose_medio": round(m["tokens_verbose"] / n),
+            "ahorro_pct":           round(100 * (1 - m["tokens"] / m["tokens_verbose"]), 1)
+                                    if m["tokens_verbose"] else 0.0,
+        }
+    return {
+        "salida_compacta":     config.TOOLS_SALIDA_COMPACTA,
+        "max_filas_serie":     config.TOOLS_MAX_FILAS_SERIE,
+        "sintesis_max_tokens": config.SINTESIS_MAX_TOKENS,
+        "por_tool":            por_tool,
+        "sintetizador":        sintesis,
+    }
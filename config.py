@@ -32,6 +32,7 @@ DOCS_DIR       : Path = BASE_DIR / "documentos"
 LOGS_DIR       : Path = BASE_DIR / "logs"
 RESULTADOS_DIR : Path = BASE_DIR / "resultados"
 SQLITE_PATH    : Path = BASE_DIR / "agente_config.db"   # prompts + config UI
+CHECKPOINTS_PATH: Path = BASE_DIR / "checkpoints.db"    # checkpoints LangGraph (reanudación)
 
 
 # ---------------------------------------------------------------------------
@@ -68,6 +69,7 @@ _PROVIDER_BASE_URLS: dict[str, str] = {
     "qwen":      "https://dashscope.aliyuncs.com/compatible-mode/v1",
     "zhipu":     "https://open.bigmodel.cn/api/paas/v4/",
     "moonshot":  "https://api.moonshot.cn/v1",
+    "mock":      "",   # proveedor simulado sin red (llm_mock.py)
 }
 
 SUPPORTED_PROVIDERS = list(_PROVIDER_BASE_URLS.keys())
@@ -80,6 +82,7 @@ _API_KEYS: dict[str, str] = {
     "qwen":      _get("QWEN_API_KEY",      ""),
     "zhipu":     _get("ZHIPU_API_KEY",     ""),
     "moonshot":  _get("MOONSHOT_API_KEY",  ""),
+    "mock":      "mock",
 }
 
 LLM_PROVIDER: str = _get("LLM_PROVIDER", "deepseek").lower()
@@ -102,8 +105,195 @@ COSTOS_POR_PROVEEDOR: dict[str, dict[str, float]] = {
     "qwen":      {"input": 0.0005,   "output": 0.0015},   # qwen-turbo aprox.
     "zhipu":     {"input": 0.0007,   "output": 0.0007},   # glm-4-flash aprox.
     "moonshot":  {"input": 0.001,    "output": 0.003},    # moonshot-v1-8k aprox.
+    "mock":      {"input": 0.0,      "output": 0.0},      # simulado — sin costo
 }
 
+# Fracción del precio de input que se ahorra en tokens leídos de la caché de prefijo
+DESCUENTO_CACHE_POR_PROVEEDOR: dict[str, float] = {
+    "anthropic": 0.9,    # cache read = 10% del precio de input
+    "openai":    0.5,    # cached input = 50%
+    "deepseek":  0.9,    # cache hit ≈ 10%
+}
+
+
+# ---------------------------------------------------------------------------
+# Resiliencia — reintentos, circuit breaker y failover (resiliencia.py)
+# ---------------------------------------------------------------------------
+
+# Proveedores de respaldo en orden: "openai:gpt-4o-mini,anthropic"
+# (sin modelo → primer modelo de MODELOS_POR_PROVEEDOR)
+LLM_FALLBACKS:      list[str] = [p for p in _get("LLM_FALLBACKS").split(",") if p.strip()]
+LLM_MAX_REINTENTOS: int   = int(_get("LLM_MAX_REINTENTOS", "2"))      # por proveedor
+LLM_BACKOFF_BASE_S: float = float(_get("LLM_BACKOFF_BASE_S", "0.5"))
+LLM_BACKOFF_MAX_S:  float = float(_get("LLM_BACKOFF_MAX_S",  "8"))
+CB_UMBRAL_FALLOS:   int   = int(_get("CB_UMBRAL_FALLOS", "5"))        # fallos seguidos → abierto
+CB_ENFRIAMIENTO_S:  float = float(_get("CB_ENFRIAMIENTO_S", "30"))    # abierto → semiabierto
+
+
+# ---------------------------------------------------------------------------
+# Hedging — duplicar llamadas lentas del supervisor/sintetizador (hedging.py)
+# ---------------------------------------------------------------------------
+
+HEDGING_ENABLED:      bool  = _get("HEDGING_ENABLED", "false").lower() == "true"
+HEDGING_PROVEEDOR:    str   = _get("HEDGING_PROVEEDOR")          # "" = mismo proveedor
+HEDGING_MAX_TASA:     float = float(_get("HEDGING_MAX_TASA", "0.10"))  # máx. 10% de llamadas
+HEDGING_MIN_MUESTRAS: int   = int(_get("HEDGING_MIN_MUESTRAS", "20"))  # antes de confiar en p90
+HEDGING_VENTANA:      int   = int(_get("HEDGING_VENTANA", "200"))      # latencias recordadas
+
+
+# ---------------------------------------------------------------------------
+# Limitador — presupuestos RPM/TPM/concurrencia por proveedor (limitador.py)
+# ---------------------------------------------------------------------------
+
+# Claves: "proveedor/modelo" (más específica) o "proveedor". 0 = sin límite.
+# Valores aproximados de los planes de entrada — ajustar a la cuota real.
+LIMITES_POR_PROVEEDOR: dict[str, dict[str, int]] = {
+    "anthropic": {"rpm": 50,  "tpm": 40000,  "concurrencia": 5},
+    "openai":    {"rpm": 500, "tpm": 200000, "concurrencia": 16},
+    "deepseek":  {"rpm": 300, "tpm": 300000, "concurrencia": 16},
+    "ollama":    {"rpm": 0,   "tpm": 0,      "concurrencia": 2},
+    "qwen":      {"rpm": 60,  "tpm": 100000, "concurrencia": 8},
+    "zhipu":     {"rpm": 60,  "tpm": 100000, "concurrencia": 8},
+    "moonshot":  {"rpm": 3,   "tpm": 32000,  "concurrencia": 1},
+    "mock":      {"rpm": 0,   "tpm": 0,      "concurrencia": 0},
+}
+# Sobrescritura en JSON: LLM_LIMITES={"deepseek/deepseek-chat": {"rpm": 600}}
+if _get("LLM_LIMITES"):
+    import json as _json
+    for _clave, _limites in _json.loads(_get("LLM_LIMITES")).items():
+        LIMITES_POR_PROVEEDOR.setdefault(_clave, {}).update(_limites)
+
+# Tokens de salida que se suponen por llamada antes de conocer el uso real
+LIMITADOR_SALIDA_ESTIMADA: int = int(_get("LIMITADOR_SALIDA_ESTIMADA", "500"))
+
+
+# ---------------------------------------------------------------------------
+# Enrutador local — evita la llamada LLM del supervisor (enrutador.py)
+# ---------------------------------------------------------------------------
+
+ROUTER_LOCAL_ENABLED:   bool  = _get("ROUTER_LOCAL_ENABLED", "true").lower() == "true"
+ROUTER_UMBRAL:          float = float(_get("ROUTER_UMBRAL", "0.8"))       # < umbral → supervisor LLM
+ROUTER_MIN_EJEMPLOS:    int   = int(_get("ROUTER_MIN_EJEMPLOS", "30"))    # para activar el clasificador
+ROUTER_REENTRENAR_CADA: int   = int(_get("ROUTER_REENTRENAR_CADA", "20")) # decisiones LLM nuevas
+
+
+# ---------------------------------------------------------------------------
+# Ejecución especulativa — especialistas adelantados mientras decide el supervisor
+# (especulacion.py). Opt-in: una predicción fallida gasta tokens.
+# ---------------------------------------------------------------------------
+
+ESPECULACION_ENABLED:   bool = _get("ESPECULACION_ENABLED", "false").lower() == "true"
+ESPECULACION_MAX_RUTAS: int  = int(_get("ESPECULACION_MAX_RUTAS", "1"))
+
+
+# ---------------------------------------------------------------------------
+# Vía rápida — preguntas de plantilla sin LLM (respuestas_rapidas.py)
+# ---------------------------------------------------------------------------
+
+VIA_RAPIDA_ENABLED: bool = _get("VIA_RAPIDA_ENABLED", "true").lower() == "true"
+
+
+# ---------------------------------------------------------------------------
+# Salidas compactas de tools y presupuesto del sintetizador (compactar.py)
+# ---------------------------------------------------------------------------
+
+TOOLS_SALIDA_COMPACTA: bool = _get("TOOLS_SALIDA_COMPACTA", "true").lower() == "true"
+TOOLS_MAX_FILAS_SERIE: int  = int(_get("TOOLS_MAX_FILAS_SERIE", "6"))    # sin detalle=True
+SINTESIS_MAX_TOKENS:   int  = int(_get("SINTESIS_MAX_TOKENS", "1500"))   # 0 = sin límite
+
+
+# ---------------------------------------------------------------------------
+# Trazas — desglose de tiempos por nodo, LLM y tool (trazas.py)
+# ---------------------------------------------------------------------------
+
+TRAZAS_ENABLED:   bool = _get("TRAZAS_ENABLED", "true").lower() == "true"
+TRAZAS_MAX_SPANS: int  = int(_get("TRAZAS_MAX_SPANS", "200"))   # por consulta; el resto solo suma
+TRAZAS_VENTANA:   int  = int(_get("TRAZAS_VENTANA", "500"))     # muestras para p50/p95
+
+
+# ---------------------------------------------------------------------------
+# Presupuesto de los loops ReAct por request (presupuesto.py) — 0 = sin límite
+# ---------------------------------------------------------------------------
+
+REACT_MAX_TOOLS:   int   = int(_get("REACT_MAX_TOOLS", "12"))       # llamadas a tools
+REACT_MAX_TURNOS:  int   = int(_get("REACT_MAX_TURNOS", "10"))      # turnos del LLM
+REACT_MAX_TOKENS:  int   = int(_get("REACT_MAX_TOKENS", "40000"))
+REACT_DEADLINE_S:  float = float(_get("REACT_DEADLINE_S", "25"))    # margen bajo el SLA de 30 s
+REACT_PARCIAL_MAX_CHARS: int = int(_get("REACT_PARCIAL_MAX_CHARS", "600"))  # por tool en la parcial
+
+
+# ---------------------------------------------------------------------------
+# Datasets — almacén columnar Arrow IPC memory-mapped (columnar.py, requiere pyarrow)
+# ---------------------------------------------------------------------------
+
+DATASETS_COLUMNAR: bool = _get("DATASETS_COLUMNAR", "true").lower() == "true"
+
+
+# ---------------------------------------------------------------------------
+# Consultas SQL sobre los datasets (consulta_sql.py)
+# ---------------------------------------------------------------------------
+# Límites de la tool consultar_datos_sql: filas devueltas, tiempo de ejecución
+# y tamaño de la salida (en caracteres) que llega al LLM
+SQL_MAX_FILAS: int   = int(_get("SQL_MAX_FILAS", "200"))
+SQL_TIMEOUT_S: float = float(_get("SQL_TIMEOUT_S", "5"))
+SQL_MAX_BYTES: int   = int(_get("SQL_MAX_BYTES", "8000"))
+
+
+# ---------------------------------------------------------------------------
+# Tools generadas para los CSV subidos a datos/ (tools_dinamicas.py)
+# ---------------------------------------------------------------------------
+TOOLS_DINAMICAS_ENABLED: bool  = _get("TOOLS_DINAMICAS_ENABLED", "true").lower() == "true"
+# Máximo de filas / grupos que devuelven filtrar_* y agregar_*
+TOOLS_DINAMICAS_MAX_FILAS: int = int(_get("TOOLS_DINAMICAS_MAX_FILAS", "50"))
+
+
+# ---------------------------------------------------------------------------
+# Cubo OLAP de comercio detallado (cubo_comercio.py)
+# ---------------------------------------------------------------------------
+# Máximo de filas que devuelve consultar_cubo_comercio
+CUBO_MAX_FILAS: int = int(_get("CUBO_MAX_FILAS", "30"))
+# Un cuboide se materializa solo si tiene a lo sumo esta fracción de las filas
+# del cuboide base (mes × todas las dimensiones); si no, se responde desde el base
+CUBO_FRACCION_MAX: float = float(_get("CUBO_FRACCION_MAX", "0.25"))
+
+
+# ---------------------------------------------------------------------------
+# Pool de procesos para tools de cálculo (pool_procesos.py)
+# ---------------------------------------------------------------------------
+# Desactivado por defecto: con los CSV de 12 filas el viaje entre procesos
+# cuesta más que el cálculo
+POOL_PROCESOS_ENABLED: bool = _get("POOL_PROCESOS_ENABLED", "false").lower() == "true"
+# Número de workers (0 = núcleos - 1)
+POOL_PROCESOS_WORKERS: int  = int(_get("POOL_PROCESOS_WORKERS", "0"))
+# Tools que se ejecutan en el pool (deben usar @pool_procesos.en_pool en tools.py;
+# también admite consultar_datos_sql)
+POOL_PROCESOS_TOOLS: list[str] = [t.strip() for t in _get(
+    "POOL_PROCESOS_TOOLS",
+    "analizar_historico_trm,analizar_trm_vs_comercio,consultar_cubo_comercio",
+).split(",") if t.strip()]
+POOL_PROCESOS_TIMEOUT_S: float = float(_get("POOL_PROCESOS_TIMEOUT_S", "30"))   # 0 = sin límite
+POOL_PROCESOS_VENTANA:   int   = int(_get("POOL_PROCESOS_VENTANA", "500"))     # muestras para p50/p95
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints LangGraph — reanudar una solicitud fallida (checkpoints.py)
+# ---------------------------------------------------------------------------
+
+CHECKPOINTS_ENABLED:  bool  = _get("CHECKPOINTS_ENABLED", "true").lower() == "true"
+CHECKPOINT_TTL_S:     float = float(_get("CHECKPOINT_TTL_S", "3600"))      # 1 h sin actividad
+CHECKPOINT_GC_CADA_S: float = float(_get("CHECKPOINT_GC_CADA_S", "300"))
+
+
+# ---------------------------------------------------------------------------
+# Proveedor simulado "mock" — pruebas de carga y CI sin red (llm_mock.py)
+# ---------------------------------------------------------------------------
+
+MOCK_LATENCIA_MS:    float = float(_get("MOCK_LATENCIA_MS", "800"))
+MOCK_LATENCIA_DIST:  str   = _get("MOCK_LATENCIA_DIST", "lognormal").lower()  # fija|normal|lognormal
+MOCK_LATENCIA_SIGMA: float = float(_get("MOCK_LATENCIA_SIGMA", "0.5"))
+MOCK_TOKENS_SALIDA:  int   = int(_get("MOCK_TOKENS_SALIDA", "0"))   # 0 = según el texto generado
+MOCK_SEED:           int   = int(_get("MOCK_SEED", "42"))
+
 
 # ---------------------------------------------------------------------------
 # LangSmith — observabilidad
@@ -164,6 +354,7 @@ MODELOS_POR_PROVEEDOR: dict[str, list[str]] = {
     "qwen":      ["qwen-turbo", "qwen-plus", "qwen-max"],
     "zhipu":     ["glm-4-flash", "glm-4-air", "glm-4"],
     "moonshot":  ["moonshot-v1-8k", "moonshot-v1-32k"],
+    "mock":      ["mock-determinista"],
 }
 
 
@@ -172,37 +363,72 @@ MODELOS_POR_PROVEEDOR: dict[str, list[str]] = {
 # ---------------------------------------------------------------------------
 
 def _make_llm(provider: str, model: str, api_key: str, base_url: str,
-              temperature: float = 0.2, max_tokens: int = 2048):
-    """Fábrica común de LLMs — mismo patrón que caps 1-7."""
+              temperature: float = 0.2, max_tokens: int = 2048,
+              max_retries: int | None = None):
+    """
+    Fábrica común de LLMs — mismo patrón que caps 1-7.
+
+    max_retries: reintentos internos del cliente. resiliencia.py pasa 0 porque
+    maneja él mismo los reintentos, el backoff y el failover entre proveedores.
+    """
+    # Toda llamada pasa por el limitador RPM/TPM/concurrencia del proveedor
+    # y registra los tokens que el proveedor sirvió desde su caché de prefijo
+    import limitador
+    import prompt_cache
+    callbacks = [limitador.CallbackLimitador(provider, model),
+                 prompt_cache.CallbackCacheTokens(provider)]
+
     if provider == "anthropic":
         from langchain_anthropic import ChatAnthropic
-        return ChatAnthropic(model=model, api_key=api_key,
-                             temperature=temperature, max_tokens=max_tokens)
+        kwargs: dict = {"model": model, "api_key": api_key, "callbacks": callbacks,
+                        "temperature": temperature, "max_tokens": max_tokens}
+        if max_retries is not None:
+            kwargs["max_retries"] = max_retries
+        return ChatAnthropic(**kwargs)
+    elif provider == "mock":
+        from llm_mock import ChatMock
+        return ChatMock(model=model, temperature=temperature, callbacks=callbacks)
     elif provider == "ollama":
         from langchain_ollama import ChatOllama
-        return ChatOllama(model=model, base_url="http://localhost:11434")
+        return ChatOllama(model=model, base_url="http://localhost:11434", callbacks=callbacks)
     else:
         from langchain_openai import ChatOpenAI
-        kwargs: dict = {"model": model, "api_key": api_key,
+        kwargs: dict = {"model": model, "api_key": api_key, "callbacks": callbacks,
                         "temperature": temperature, "max_tokens": max_tokens}
         if base_url:
             kwargs["base_url"] = base_url
+        if max_retries is not None:
+            kwargs["max_retries"] = max_retries
         return ChatOpenAI(**kwargs)
 
 
+_llm_cache: dict[tuple, object] = {}
+
+
+def obtener_llm(provider: str, model: str, api_key: str, base_url: str,
+                temperature: float = 0.2, max_retries: int | None = None):
+    """
+    Igual que _make_llm() pero reutiliza la instancia para los mismos parámetros.
+    Los clientes son thread-safe y así se conservan sus conexiones HTTP
+    y los agentes compilados en agente_factory.py.
+    """
+    clave = (provider, model, api_key, base_url, temperature, max_retries)
+    llm = _llm_cache.get(clave)
+    if llm is None:
+        llm = _llm_cache.setdefault(clave, _make_llm(provider, model, api_key, base_url,
+                                                     temperature=temperature,
+                                                     max_retries=max_retries))
+    return llm
+
+
 def crear_llm(temperature: float = 0.2):
     """LLM según configuración del .env."""
     return _make_llm(LLM_PROVIDER, LLM_MODEL, LLM_API_KEY, LLM_BASE_URL,
                      temperature=temperature)
 
 
-def crear_llm_dinamico(temperature: float = 0.2):
-    """
-    LLM que lee proveedor/modelo/api_key desde SQLite (UI) primero.
-    Si no hay nada en SQLite, cae de vuelta a los valores del .env.
-
-    Permite cambiar el modelo desde la interfaz web sin reiniciar la API.
-    """
+def _proveedor_dinamico() -> tuple[str, str, str]:
+    """Retorna (provider, model, api_key) leyendo SQLite (UI) primero y luego el .env."""
     try:
         import database
         db_cfg   = database.get_all_config()
@@ -213,11 +439,59 @@ def crear_llm_dinamico(temperature: float = 0.2):
         provider = LLM_PROVIDER
         model    = LLM_MODEL
         api_key  = LLM_API_KEY
+    return provider, model, api_key
+
 
+def crear_llm_dinamico(temperature: float = 0.2):
+    """
+    LLM que lee proveedor/modelo/api_key desde SQLite (UI) primero.
+    Si no hay nada en SQLite, cae de vuelta a los valores del .env.
+
+    Permite cambiar el modelo desde la interfaz web sin reiniciar la API.
+    """
+    provider, model, api_key = _proveedor_dinamico()
     base_url = _PROVIDER_BASE_URLS.get(provider, "")
     return _make_llm(provider, model, api_key, base_url, temperature=temperature)
 
 
+def cadena_proveedores() -> list[dict]:
+    """
+    Proveedor activo (SQLite > .env) seguido de los fallbacks de LLM_FALLBACKS.
+
+    Cada elemento es un dict con provider, model, api_key y base_url.
+    Los fallbacks sin API key o fuera de SUPPORTED_PROVIDERS se descartan.
+    """
+    provider, model, api_key = _proveedor_dinamico()
+    cadena = [{"provider": provider, "model": model, "api_key": api_key,
+               "base_url": _PROVIDER_BASE_URLS.get(provider, "")}]
+
+    for entrada in LLM_FALLBACKS:
+        fb = entrada_proveedor(entrada)
+        if fb is None:
+            continue
+        if any(c["provider"] == fb["provider"] and c["model"] == fb["model"] for c in cadena):
+            continue
+        cadena.append(fb)
+    return cadena
+
+
+def entrada_proveedor(entrada: str) -> dict | None:
+    """
+    Convierte "proveedor[:modelo]" en un elemento de cadena_proveedores().
+    Retorna None si el proveedor no está soportado o no tiene API key.
+    """
+    provider, _, model = entrada.partition(":")
+    provider = provider.strip().lower()
+    if provider not in SUPPORTED_PROVIDERS:
+        return None
+    model   = model.strip() or MODELOS_POR_PROVEEDOR.get(provider, [""])[0]
+    api_key = _API_KEYS.get(provider, "")
+    if not api_key:
+        return None
+    return {"provider": provider, "model": model, "api_key": api_key,
+            "base_url": _PROVIDER_BASE_URLS.get(provider, "")}
+
+
 # ---------------------------------------------------------------------------
 # Validación
 # ---------------------------------------------------------------------------
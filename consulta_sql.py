@@ -0,0 +1,273 @@
+"""
+consulta_sql.py — SQL de solo lectura sobre los datasets de datos/
+==================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Las tools de datos solo responden las agregaciones que tienen programadas.
+"Promedio de exportaciones del segundo semestre" o "mes con mayor déficit"
+obligaban al LLM a encadenar tools y hacer aritmética. Con la tool
+consultar_datos_sql el agente escribe UNA consulta SELECT y el motor la
+resuelve en memoria.
+
+Motor:
+  - DuckDB (columnar, en proceso) si está instalado: cada dataset se registra
+    como vista sin copia (tabla Arrow memory-mapped o DataFrame de datasets.py)
+    y la conexión no tiene acceso a archivos (enable_external_access=false).
+  - Si no, SQLite en memoria (tablas cargadas desde los DataFrames) con un
+    authorizer que solo permite lecturas.
+
+Cada dataset es una tabla con el nombre del CSV sin extensión, p. ej.
+  trm_2024, comercio_exterior_2024, exportaciones_sectores_2024
+
+Validación y límites (config SQL_*):
+  - una sola sentencia, que empiece por SELECT o WITH, sin comentarios
+  - sentencias que escriben o cambian la sesión prohibidas (INSERT, ATTACH,
+    COPY, PRAGMA...) y funciones que leen archivos (read_csv(...), glob(...));
+    palabras como set, load o export se aceptan como alias o columnas
+  - SQL_MAX_FILAS filas (se marca truncado; total_filas es el total real),
+    SQL_TIMEOUT_S segundos,
+    SQL_MAX_BYTES de salida (se recortan filas hasta caber)
+"""
+
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from pathlib import Path
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+import datasets
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+class ConsultaRechazada(ValueError):
+    """La consulta no pasa la validación de solo lectura."""
+
+
+class ConsultaExcedida(RuntimeError):
+    """La consulta superó SQL_TIMEOUT_S."""
+
+
+# ---------------------------------------------------------------------------
+# Validación
+# ---------------------------------------------------------------------------
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'")
+# Solo palabras clave de sentencia (no sirven como alias sin comillas) y
+# funciones de archivo/sistema cuando se llaman; el resto lo bloquean el
+# prefijo SELECT/WITH y el motor (enable_external_access / authorizer)
+_PROHIBIDAS = re.compile(
+    r"\b(insert|update|delete|merge|drop|create|alter|truncate|attach|detach|"
+    r"copy|install|pragma|vacuum|checkpoint)\b"
+    r"|\b(read_\w+|glob|sniff_csv|parquet_\w+|sqlite_\w+|duckdb_\w+|getenv)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def validar(sql: str) -> str:
+    """Retorna la consulta normalizada (sin ';' final) o lanza ConsultaRechazada."""
+    sql = (sql or "").strip().rstrip(";").strip()
+    if not sql:
+        raise ConsultaRechazada("la consulta está vacía")
+    sin_literales = _LITERALES.sub("''", sql)
+    if "--" in sin_literales or "/*" in sin_literales:
+        raise ConsultaRechazada("no se permiten comentarios")
+    if ";" in sin_literales:
+        raise ConsultaRechazada("solo se permite una sentencia")
+    if not re.match(r"(?is)^\s*(select|with)\b", sin_literales):
+        raise ConsultaRechazada("solo se permiten consultas SELECT / WITH")
+    prohibida = _PROHIBIDAS.search(sin_literales)
+    if prohibida:
+        raise ConsultaRechazada(f"palabra no permitida: {prohibida.group(1) or prohibida.group(2)}")
+    if re.search(r"(?i)\b(from|join)\s+'", sin_literales):
+        raise ConsultaRechazada("no se permite leer archivos")
+    return sql
+
+
+def _nombre_tabla(csv: str) -> str:
+    return re.sub(r"\W", "_", Path(csv).stem).lower()
+
+
+def esquema() -> dict[str, list[str]]:
+    """{tabla: [columnas]} de todos los datasets (para la tool y los mensajes de error)."""
+    return {_nombre_tabla(n): [str(c) for c in datasets.obtener(n).columns]
+            for n in datasets.nombres()}
+
+
+# ---------------------------------------------------------------------------
+# Motores
+# ---------------------------------------------------------------------------
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sql")
+_lock     = threading.Lock()
+_duckdb   = None
+_sqlite: dict = {"clave": None, "conn": None}
+_sqlite_lock = threading.Lock()
+
+
+def motor() -> str:
+    return "duckdb" if duckdb is not None else "sqlite"
+
+
+def _conexion_duckdb():
+    global _duckdb
+    with _lock:
+        if _duckdb is None:
+            _duckdb = duckdb.connect(":memory:", config={
+                "enable_external_access": False,
+                "threads": 2,
+            })
+        return _duckdb
+
+
+def _contar_resto(cur, filas: list, limite: int) -> int:
+    """Total de filas del resultado: las leídas más las que quedan en el cursor."""
+    total = len(filas)
+    if total < limite:
+        return total
+    while lote := cur.fetchmany(10_000):
+        total += len(lote)
+    return total
+
+
+def _ejecutar_duckdb(sql: str, limite: int) -> tuple[list[str], list[tuple], int]:
+    # Las vistas registradas son por cursor: cada consulta registra las vigentes (sin copia)
+    cur = _conexion_duckdb().cursor()
+    try:
+        for n in datasets.nombres():
+            tabla = datasets.tabla_arrow(n)
+            cur.register(_nombre_tabla(n), tabla if tabla is not None else datasets.obtener(n))
+
+        futuro = _executor.submit(cur.execute, sql)
+        try:
+            futuro.result(timeout=config.SQL_TIMEOUT_S)
+        except FuturesTimeout:
+            cur.interrupt()
+            raise ConsultaExcedida(f"la consulta superó {config.SQL_TIMEOUT_S:g} s")
+        columnas = [d[0] for d in cur.description]
+        filas    = cur.fetchmany(limite)
+        return columnas, filas, _contar_resto(cur, filas, limite)
+    finally:
+        cur.close()
+
+
+def _solo_lectura(accion, *_):
+    permitidas = (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                  sqlite3.SQLITE_RECURSIVE)
+    return sqlite3.SQLITE_OK if accion in permitidas else sqlite3.SQLITE_DENY
+
+
+def _conexion_sqlite() -> sqlite3.Connection:
+    """Conexión en memoria con los datasets; se reconstruye si cambió alguna versión."""
+    nombres = datasets.nombres()
+    clave   = tuple((n, datasets.version(n)) for n in nombres)
+    if _sqlite["clave"] != clave:
+        if _sqlite["conn"] is not None:
+            _sqlite["conn"].close()
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        for n in nombres:
+            datasets.obtener(n).to_sql(_nombre_tabla(n), conn, index=False)
+        conn.set_authorizer(_solo_lectura)
+        _sqlite.update(clave=clave, conn=conn)
+    return _sqlite["conn"]
+
+
+def _ejecutar_sqlite(sql: str, limite: int) -> tuple[list[str], list[tuple], int]:
+    with _sqlite_lock:
+        conn  = _conexion_sqlite()
+        fin   = time.monotonic() + config.SQL_TIMEOUT_S
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > fin else 0, 10_000)
+        try:
+            cur = conn.execute(sql)
+            columnas = [d[0] for d in cur.description]
+            filas    = cur.fetchmany(limite)
+            # El progress handler sigue activo: contar el resto respeta el timeout
+            return columnas, filas, _contar_resto(cur, filas, limite)
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                raise ConsultaExcedida(f"la consulta superó {config.SQL_TIMEOUT_S:g} s")
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+_stats = {"consultas": 0, "filas": 0, "truncadas": 0, "suma_ms": 0.0, "errores": Counter()}
+
+
+def _valor(v):
+    """Tipos de los motores → JSON (fechas como texto, floats redondeados)."""
+    if isinstance(v, float):
+        return round(v, 4)
+    if v is None or isinstance(v, (int, str, bool)):
+        return v
+    return str(v)
+
+
+def ejecutar(sql: str) -> dict:
+    """
+    Ejecuta la consulta de solo lectura. Retorna
+      {"motor", "cols", "filas", "total_filas", "truncado", "ms"}
+    total_filas es el número de filas del resultado completo, antes de
+    recortar por SQL_MAX_FILAS o SQL_MAX_BYTES. Lanza ConsultaRechazada, ConsultaExcedida o el error del motor.
+    """
+    inicio = time.perf_counter()
+    try:
+        sql = validar(sql)
+        ejecutor = _ejecutar_duckdb if duckdb is not None else _ejecutar_sqlite
+        columnas, filas, total = ejecutor(sql, config.SQL_MAX_FILAS + 1)
+    except Exception as e:
+        with _lock:
+            _stats["errores"][type(e).__name__] += 1
+        raise
+
+    truncado = len(filas) > config.SQL_MAX_FILAS
+    filas    = [[_valor(v) for v in f] for f in filas[:config.SQL_MAX_FILAS]]
+
+    # Tope de tamaño: se quitan filas del final hasta que la salida quepa
+    tamano = sum(len(str(f)) for f in filas)
+    while filas and tamano > config.SQL_MAX_BYTES:
+        tamano  -= len(str(filas.pop()))
+        truncado = True
+
+    ms = (time.perf_counter() - inicio) * 1000
+    with _lock:
+        _stats["consultas"] += 1
+        _stats["filas"]     += len(filas)
+        _stats["truncadas"] += int(truncado)
+        _stats["suma_ms"]   += ms
+    return {"motor": motor(), "cols": columnas, "filas": filas,
+            "total_filas": total, "truncado": truncado, "ms": round(ms, 1)}
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Consultas SQL ejecutadas, latencia media, truncamientos y errores por tipo."""
+    with _lock:
+        st = {**_stats, "errores": dict(_stats["errores"])}
+    return {
+        "motor":          motor(),
+        "max_filas":      config.SQL_MAX_FILAS,
+        "timeout_s":      config.SQL_TIMEOUT_S,
+        "consultas":      st["consultas"],
+        "filas":          st["filas"],
+        "truncadas":      st["truncadas"],
+        "latencia_media_ms": round(st["suma_ms"] / st["consultas"], 2) if st["consultas"] else None,
+        "errores":        st["errores"],
+    }
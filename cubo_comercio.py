@@ -0,0 +1,430 @@
+"""
+cubo_comercio.py — Cubo OLAP preagregado del comercio exterior detallado
+========================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Los datos reales de comercio son mes × sector × país socio × capítulo
+arancelario: millones de filas. Agrupar esas filas en cada pregunta ("¿cuánto
+se exportó de café a Estados Unidos por trimestre?") es un escaneo completo.
+
+Fuente: datos/comercio_detalle_*.csv (esquema en columnar.ESQUEMAS)
+    año, mes, sector, pais, [capitulo], exportaciones_usd_mill, importaciones_usd_mill
+
+Construcción (al subir el CSV, al arrancar o perezosa si cambió la versión):
+  1. cada dimensión de texto se codifica como enteros (pd.factorize)
+  2. cuboide base: mes × todas las dimensiones (claves combinadas con
+     np.ravel_multi_index, np.unique + np.bincount para las sumas)
+  3. para cada grano (mes, trimestre, año) y subconjunto de dimensiones se
+     agrega un cuboide desde el padre ya materializado más pequeño; solo se
+     guarda si tiene a lo sumo CUBO_FRACCION_MAX de las filas del base (los
+     demás no ahorran nada: esas consultas las responde el base)
+  4. cada cuboide queda como arrays NumPy (tiempo int32, códigos uint8/16,
+     medidas float64); todo se guarda en datos/.cubos/<versión>.npz
+
+Consulta (slice / dice / drill-down): se elige el cuboide más pequeño que
+tenga las dimensiones pedidas (agrupación + filtros) y el grano de tiempo más
+grueso compatible con el rango desde/hasta; se filtra con máscaras y se
+reagrupa con bincount. Nunca se tocan las filas originales.
+
+Uso:
+    cubo_comercio.consultar("exportaciones", tiempo="trimestre", por=["sector"],
+                            filtros={"pais": ["Estados Unidos"]}, desde="2023")
+"""
+
+import hashlib
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+import datasets
+
+PREFIJO     = "comercio_detalle_"
+DIMENSIONES = ("sector", "pais", "capitulo")          # capitulo es opcional en el CSV
+MEDIDAS     = {"exportaciones": "exportaciones_usd_mill",
+               "importaciones": "importaciones_usd_mill"}
+GRANOS      = ("mes", "trimestre", "año")             # de fino a grueso
+_MESES_POR_GRANO = {"mes": 1, "trimestre": 3, "año": 12}
+_FORMATO    = 2   # cambia si cambia la estructura guardada en datos/.cubos/
+
+
+class CuboNoDisponible(LookupError):
+    """No hay datos/comercio_detalle_*.csv para construir el cubo."""
+
+
+@dataclass
+class Cuboide:
+    grano:   str
+    dims:    tuple[str, ...]
+    tiempo:  np.ndarray              # clave de período: año*12+mes-1, año*4+trim-1 o año
+    codigos: dict[str, np.ndarray]   # dimensión → códigos (índices en Cubo.etiquetas)
+    medidas: dict[str, np.ndarray]   # exportaciones, importaciones, registros
+
+    @property
+    def filas(self) -> int:
+        return len(self.tiempo)
+
+
+@dataclass
+class Cubo:
+    version:     str
+    dims:        tuple[str, ...]
+    etiquetas:   dict[str, np.ndarray]
+    cuboides:    list[Cuboide]
+    filas_origen: int
+    construccion_ms: float
+
+    def bytes(self) -> int:
+        return sum(c.tiempo.nbytes + sum(a.nbytes for a in c.codigos.values())
+                   + sum(a.nbytes for a in c.medidas.values()) for c in self.cuboides)
+
+
+# ---------------------------------------------------------------------------
+# Construcción
+# ---------------------------------------------------------------------------
+
+def _agregar(claves: list[np.ndarray], tamanos: list[int], medidas: dict[str, np.ndarray]):
+    """Agrupa por las claves (vectorizado). Retorna (claves únicas por eje, sumas por medida)."""
+    combinada = np.ravel_multi_index(claves, tamanos)
+    unicas, inversa = np.unique(combinada, return_inverse=True)
+    sumas = {m: np.bincount(inversa, weights=v, minlength=len(unicas)) for m, v in medidas.items()}
+    return list(np.unravel_index(unicas, tamanos)), sumas
+
+
+def _compactar_codigos(codigos: np.ndarray, n: int) -> np.ndarray:
+    return codigos.astype(np.min_scalar_type(max(n - 1, 0)))
+
+
+def _enrollar(padre: Cuboide, grano: str, dims: tuple[str, ...],
+              etiquetas: dict[str, np.ndarray]) -> Cuboide:
+    """Agrega un cuboide más fino / con más dimensiones a (grano, dims)."""
+    t  = padre.tiempo.astype(np.int64) // (_MESES_POR_GRANO[grano] // _MESES_POR_GRANO[padre.grano])
+    t0 = int(t.min())
+    ejes    = [t - t0, *(padre.codigos[d].astype(np.int64) for d in dims)]
+    tamanos = [int(t.max()) - t0 + 1, *(len(etiquetas[d]) for d in dims)]
+    claves, sumas = _agregar(ejes, tamanos, padre.medidas)
+    return Cuboide(
+        grano=grano, dims=dims, tiempo=(claves[0] + t0).astype(np.int32),
+        codigos={d: _compactar_codigos(c, len(etiquetas[d])) for d, c in zip(dims, claves[1:])},
+        medidas=sumas,
+    )
+
+
+def _construir(df, version: str) -> Cubo:
+    import pandas as pd
+
+    inicio = time.perf_counter()
+    dims = tuple(d for d in DIMENSIONES if d in df.columns)
+    etiquetas, codigos = {}, {}
+    for d in dims:
+        columna = df[d]
+        if d == "capitulo" and pd.api.types.is_numeric_dtype(columna):
+            columna = columna.map(lambda v: f"{int(v):02d}")   # capítulos arancelarios: "01".."97"
+        c, e = pd.factorize(columna.astype(str), sort=True)
+        codigos[d], etiquetas[d] = c, np.asarray(e, dtype=str)
+
+    meses = df["año"].to_numpy(dtype=np.int64) * 12 + df["mes"].to_numpy(dtype=np.int64) - 1
+    medidas = {m: df[col].fillna(0).to_numpy(dtype=np.float64) for m, col in MEDIDAS.items()}
+    medidas["registros"] = np.ones(len(df))
+
+    # Cuboide base: mes × todas las dimensiones (responde cualquier consulta)
+    hechos = Cuboide(grano="mes", dims=dims, tiempo=meses, codigos=codigos, medidas=medidas)
+    base   = _enrollar(hechos, "mes", dims, etiquetas)
+    cuboides = [base]
+
+    # Resto de la red: cada cuboide se agrega desde el padre materializado más pequeño
+    # y se guarda solo si es bastante más chico que el base
+    for grano in GRANOS:
+        for k in range(len(dims), -1, -1):
+            for subconjunto in itertools.combinations(dims, k):
+                if (grano, subconjunto) == ("mes", dims):
+                    continue
+                padre = min((q for q in cuboides if set(subconjunto) <= set(q.dims)
+                             and GRANOS.index(q.grano) <= GRANOS.index(grano)),
+                            key=lambda q: q.filas)
+                nuevo = _enrollar(padre, grano, subconjunto, etiquetas)
+                if nuevo.filas <= config.CUBO_FRACCION_MAX * base.filas:
+                    cuboides.append(nuevo)
+    return Cubo(version=version, dims=dims, etiquetas=etiquetas, cuboides=cuboides,
+                filas_origen=len(df), construccion_ms=(time.perf_counter() - inicio) * 1000)
+
+
+# ---------------------------------------------------------------------------
+# Persistencia en datos/.cubos/ (npz sin pickle + json)
+# ---------------------------------------------------------------------------
+
+def _dir():
+    return config.DATOS_DIR / ".cubos"
+
+
+def _guardar(cubo: Cubo) -> None:
+    _dir().mkdir(parents=True, exist_ok=True)
+    arrays = {f"etiquetas_{d}": e for d, e in cubo.etiquetas.items()}
+    for i, c in enumerate(cubo.cuboides):
+        arrays[f"{i}_tiempo"] = c.tiempo
+        arrays.update({f"{i}_dim_{d}": v for d, v in c.codigos.items()})
+        arrays.update({f"{i}_med_{m}": v for m, v in c.medidas.items()})
+    np.savez(_dir() / f"{cubo.version}.npz", **arrays)
+    meta = {"version": cubo.version, "dims": cubo.dims, "filas_origen": cubo.filas_origen,
+            "cuboides": [{"grano": c.grano, "dims": c.dims} for c in cubo.cuboides]}
+    (_dir() / "cubo.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    for viejo in _dir().glob("*.npz"):
+        if viejo.stem != cubo.version:
+            viejo.unlink(missing_ok=True)
+
+
+def _cargar(version: str) -> Cubo | None:
+    try:
+        meta = json.loads((_dir() / "cubo.json").read_text(encoding="utf-8"))
+        if meta["version"] != version:
+            return None
+        inicio = time.perf_counter()
+        with np.load(_dir() / f"{version}.npz") as z:
+            cuboides = [Cuboide(
+                grano=c["grano"], dims=tuple(c["dims"]), tiempo=z[f"{i}_tiempo"],
+                codigos={d: z[f"{i}_dim_{d}"] for d in c["dims"]},
+                medidas={m: z[f"{i}_med_{m}"] for m in (*MEDIDAS, "registros")},
+            ) for i, c in enumerate(meta["cuboides"])]
+            etiquetas = {d: z[f"etiquetas_{d}"] for d in meta["dims"]}
+    except (FileNotFoundError, KeyError, ValueError, OSError):
+        return None
+    return Cubo(version=version, dims=tuple(meta["dims"]), etiquetas=etiquetas,
+                cuboides=cuboides, filas_origen=meta["filas_origen"],
+                construccion_ms=(time.perf_counter() - inicio) * 1000)
+
+
+# ---------------------------------------------------------------------------
+# Cubo vigente
+# ---------------------------------------------------------------------------
+
+_lock  = threading.Lock()
+_cubo: dict = {"cubo": None}
+_stats = {"construcciones": 0, "desde_disco": 0, "consultas": 0, "suma_ms": 0.0,
+          "filas_leidas": 0, "por_cuboide": {}}
+
+
+def archivos() -> list[str]:
+    return [n for n in datasets.nombres() if n.startswith(PREFIJO)]
+
+
+def disponible() -> bool:
+    return bool(archivos())
+
+
+def cubo() -> Cubo:
+    """Cubo de la versión actual de los CSV; se reconstruye (o carga de disco) si cambiaron."""
+    import pandas as pd
+
+    nombres = archivos()
+    if not nombres:
+        raise CuboNoDisponible(f"no hay archivos datos/{PREFIJO}*.csv")
+    huella  = [f"{n}:{datasets.version(n)}" for n in nombres]
+    huella += [f"formato:{_FORMATO}", f"fraccion:{config.CUBO_FRACCION_MAX}"]
+    version = hashlib.sha1("|".join(huella).encode()).hexdigest()[:12]
+    with _lock:
+        actual = _cubo["cubo"]
+        if actual is not None and actual.version == version:
+            return actual
+
+        nuevo = _cargar(version)
+        if nuevo is not None:
+            _stats["desde_disco"] += 1
+        else:
+            usadas = ("año", "mes", *DIMENSIONES, *MEDIDAS.values())
+            df = pd.concat([datasets.obtener(n, columnas=[c for c in usadas
+                                                          if c in datasets.columnas(n)])
+                            for n in nombres], ignore_index=True)
+            nuevo = _construir(df, version)
+            _guardar(nuevo)
+            _stats["construcciones"] += 1
+            print(f"  [CUBO] {nuevo.filas_origen} filas → {len(nuevo.cuboides)} cuboides "
+                  f"({nuevo.bytes() / 1024:.0f} KB) en {nuevo.construccion_ms:.0f} ms")
+        _cubo["cubo"] = nuevo
+        return nuevo
+
+
+def construir() -> None:
+    """
+    Construye el cubo si hay datos de detalle (al subir / borrar un CSV y al
+    arrancar). Sin datos de detalle descarta el cubo y sus archivos.
+    """
+    if not disponible():
+        with _lock:
+            _cubo["cubo"] = None
+        for ruta in [*_dir().glob("*.npz"), _dir() / "cubo.json"]:
+            ruta.unlink(missing_ok=True)
+        return
+    try:
+        cubo()
+    except Exception as e:
+        print(f"  [CUBO] {type(e).__name__}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Consulta
+# ---------------------------------------------------------------------------
+
+def _normalizar(texto: str) -> str:
+    return unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode().lower().strip()
+
+
+def _meses_limite(texto: str, fin: bool) -> int:
+    """'AAAA', 'AAAA-Tn' o 'AAAA-MM' → mes absoluto inicial (o final con fin=True)."""
+    texto = texto.strip().upper()
+    if m := re.fullmatch(r"(\d{4})", texto):
+        a, desde, largo = int(m[1]), 0, 12
+    elif m := re.fullmatch(r"(\d{4})-?T([1-4])", texto):
+        a, desde, largo = int(m[1]), (int(m[2]) - 1) * 3, 3
+    elif m := re.fullmatch(r"(\d{4})-(\d{1,2})", texto):
+        a, desde, largo = int(m[1]), int(m[2]) - 1, 1
+    else:
+        raise ValueError(f"fecha '{texto}' inválida: usa AAAA, AAAA-Tn o AAAA-MM")
+    return a * 12 + desde + (largo - 1 if fin else 0)
+
+
+def _etiqueta_periodo(clave: int, grano: str) -> str:
+    if grano == "mes":
+        return f"{clave // 12}-{clave % 12 + 1:02d}"
+    if grano == "trimestre":
+        return f"{clave // 4}-T{clave % 4 + 1}"
+    return str(clave)
+
+
+def _elegir(c: Cubo, grano: str, dims: set[str], m0: int | None, m1: int | None) -> Cuboide:
+    """
+    Cuboide materializado más pequeño con las dimensiones pedidas, de grano
+    igual o más fino que el pedido y alineado con el rango desde/hasta.
+    """
+    def alinea(g: str) -> bool:
+        n = _MESES_POR_GRANO[g]
+        return (m0 is None or m0 % n == 0) and (m1 is None or (m1 + 1) % n == 0)
+
+    finos = GRANOS[:GRANOS.index(grano) + 1]
+    candidatos = [q for q in c.cuboides
+                  if q.grano in finos and alinea(q.grano) and dims <= set(q.dims)]
+    return min(candidatos, key=lambda q: q.filas)   # el base (mes × todo) siempre califica
+
+
+def consultar(medida: str = "exportaciones", tiempo: str = "año", por: list[str] | None = None,
+              filtros: dict[str, list[str]] | None = None, desde: str = "", hasta: str = "",
+              limite: int | None = None) -> dict:
+    """
+    Agrega la medida por período (tiempo = mes | trimestre | año | total) y las
+    dimensiones de por, con filtros {dimensión: [valores]} y rango desde/hasta.
+    """
+    inicio = time.perf_counter()
+    c = cubo()
+    por, filtros = list(por or []), dict(filtros or {})
+    if medida not in (*MEDIDAS, "balanza", "registros"):
+        raise ValueError(f"medida inválida '{medida}': exportaciones | importaciones | balanza | registros")
+    if tiempo not in (*GRANOS, "total"):
+        raise ValueError(f"tiempo inválido '{tiempo}': mes | trimestre | año | total")
+    desconocidas = [d for d in [*por, *filtros] if d not in c.dims]
+    if desconocidas:
+        raise ValueError(f"dimensiones inexistentes {desconocidas}; disponibles: {list(c.dims)}")
+
+    m0 = _meses_limite(desde, fin=False) if desde else None
+    m1 = _meses_limite(hasta, fin=True) if hasta else None
+    grano = "año" if tiempo == "total" else tiempo
+    q = _elegir(c, grano, set(por) | set(filtros), m0, m1)
+
+    # Slice / dice: máscara sobre el cuboide
+    mascara = np.ones(q.filas, dtype=bool)
+    n = _MESES_POR_GRANO[q.grano]
+    if m0 is not None:
+        mascara &= q.tiempo >= m0 // n
+    if m1 is not None:
+        mascara &= q.tiempo <= m1 // n
+    for d, valores in filtros.items():
+        normalizadas = {_normalizar(e): i for i, e in enumerate(c.etiquetas[d])}
+        faltan = [v for v in valores if _normalizar(v) not in normalizadas]
+        if faltan:
+            raise ValueError(f"valores de {d} inexistentes {faltan}; "
+                             f"ejemplos: {[str(e) for e in c.etiquetas[d][:10]]}")
+        mascara &= np.isin(q.codigos[d], [normalizadas[_normalizar(v)] for v in valores])
+
+    # Roll-up al grano pedido y reagrupación por las dimensiones de salida
+    ejes, tamanos = [], []
+    if tiempo != "total":
+        t = q.tiempo[mascara] // (_MESES_POR_GRANO[grano] // n)
+        t0 = int(t.min()) if len(t) else 0
+        ejes.append(t - t0)
+        tamanos.append(int(t.max()) - t0 + 1 if len(t) else 1)
+    for d in por:
+        ejes.append(q.codigos[d][mascara].astype(np.int64))
+        tamanos.append(len(c.etiquetas[d]))
+    valores = (q.medidas["exportaciones"] - q.medidas["importaciones"]
+               if medida == "balanza" else q.medidas[medida])[mascara]
+    if not ejes:
+        ejes, tamanos = [np.zeros(len(valores), dtype=np.int64)], [1]
+    claves, sumas = _agregar(ejes, tamanos, {"valor": valores})
+    valor = sumas["valor"]
+
+    # Orden: período ascendente y, dentro de cada período, valor descendente
+    if tiempo != "total":
+        orden = np.lexsort((-valor, claves[0]))
+    else:
+        orden = np.argsort(-valor, kind="stable")
+    limite = limite or config.CUBO_MAX_FILAS
+    filas = []
+    for k in orden[:limite]:
+        fila = {}
+        if tiempo != "total":
+            fila["periodo"] = _etiqueta_periodo(int(claves[0][k]) + t0, grano)
+        for i, d in enumerate(por):
+            fila[d] = str(c.etiquetas[d][claves[i + (tiempo != "total")][k]])
+        fila["valor"] = round(float(valor[k]), 2)
+        filas.append(fila)
+
+    ms = (time.perf_counter() - inicio) * 1000
+    fuente = f"{q.grano}×{'×'.join(q.dims) or 'total'}"
+    with _lock:
+        _stats["consultas"] += 1
+        _stats["suma_ms"] += ms
+        _stats["filas_leidas"] += q.filas
+        _stats["por_cuboide"][fuente] = _stats["por_cuboide"].get(fuente, 0) + 1
+    return {
+        "medida":   medida + ("" if medida == "registros" else "_usd_mill"),
+        "tiempo":   tiempo,
+        "por":      por,
+        "filtros":  filtros,
+        "total":    round(float(valor.sum()), 2),
+        "grupos":   len(valor),
+        "truncado": len(valor) > limite,
+        "filas":    filas,
+        "fuente":   {"cuboide": fuente, "filas_cuboide": q.filas, "filas_origen": c.filas_origen},
+    }
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Cubo cargado (cuboides, tamaño) y consultas por cuboide usado."""
+    with _lock:
+        c  = _cubo["cubo"]
+        st = {**_stats, "por_cuboide": dict(_stats["por_cuboide"])}
+    return {
+        "cargado":        c is not None,
+        "version":        c.version if c else None,
+        "filas_origen":   c.filas_origen if c else 0,
+        "cuboides":       len(c.cuboides) if c else 0,
+        "tamano_kb":      round(c.bytes() / 1024, 1) if c else 0.0,
+        "construccion_ms": round(c.construccion_ms, 1) if c else None,
+        "construcciones": st["construcciones"],
+        "desde_disco":    st["desde_disco"],
+        "consultas":      st["consultas"],
+        "latencia_media_ms": round(st["suma_ms"] / st["consultas"], 2) if st["consultas"] else None,
+        "consultas_por_cuboide": st["por_cuboide"],
+    }
@@ -35,10 +35,17 @@ PROMPTS_DEFAULT: dict[str, str] = {
         "Eres un analista económico de Colombia con acceso a tres dominios de información:\n\n"
         "1. TIPO DE CAMBIO (TRM)\n"
         "   - obtener_trm_actual()          → TRM vigente en diciembre 2024 y variación mensual\n"
-        "   - analizar_historico_trm(meses) → tendencia del dólar en los últimos N meses\n\n"
+        "   - analizar_historico_trm(meses) → tendencia del dólar en los últimos N meses\n"
+        "     analizar_historico_trm(desde, hasta) → mismo análisis para un rango de fechas\n"
+        "                                            (volatilidad, máxima caída, variación anual)\n\n"
         "2. COMERCIO EXTERIOR\n"
         "   - consultar_balanza_comercial()       → exportaciones vs importaciones mensuales 2024\n"
-        "   - analizar_sectores_exportacion()     → sectores exportadores y su participación\n\n"
+        "   - analizar_sectores_exportacion()     → sectores exportadores y su participación\n"
+        "   - consultar_datos_sql(sql)            → SELECT de solo lectura sobre los datasets (promedios,\n"
+        "                                           rankings, filtros que las otras tools no traen)\n"
+        "   - analizar_trm_vs_comercio(rezago_max) → correlaciones y elasticidades TRM ↔ comercio\n"
+        "   - consultar_cubo_comercio(...)        → comercio por sector / país / capítulo (si hay detalle)\n"
+        "   - describir_* / filtrar_* / agregar_* → una por cada CSV subido a datos/\n\n"
         "3. DOCUMENTOS DANE (requiere índice vectorial — ejecutar preparar_base.py)\n"
         "   - listar_reportes_dane()              → catálogo de reportes disponibles\n"
         "   - buscar_documentos_dane(query, k)    → búsqueda semántica en reportes de desempleo,\n"
@@ -49,17 +56,20 @@ PROMPTS_DEFAULT: dict[str, str] = {
         "- Llama primero a las herramientas de catálogo (listar_*) cuando no estés seguro.\n"
         "- Cita siempre los números exactos de las herramientas (no inventes cifras).\n"
         "- Responde SIEMPRE en español con una conclusión clara al final.\n"
-        "- Para preguntas cruzadas (ej: TRM + inflación), explica la relación entre ambas."
+        "- Para preguntas cruzadas (ej: TRM + inflación), explica la relación entre ambas.\n"
+        "- Para TRM vs exportaciones/importaciones usa analizar_trm_vs_comercio: no calcules\n"
+        "  correlaciones ni elasticidades de cabeza."
     ),
 
     "langgraph_supervisor": (
-        "Eres un enrutador de consultas económicas. Clasifica la pregunta en UNA de estas rutas:\n\n"
-        "  'trm'      → solo sobre tipo de cambio: dólar, TRM, devaluación, variación del peso\n"
-        "  'datos'    → solo sobre comercio exterior: exportaciones, importaciones, balanza, sectores\n"
-        "  'rag'      → solo sobre estadísticas DANE: desempleo, inflación, PIB, población, censo\n"
-        "  'multiple' → combina TRM+DANE, o TRM+exportaciones con contexto macro\n\n"
+        "Eres un enrutador de consultas económicas. Clasifica la pregunta en UNA O VARIAS de estas rutas:\n\n"
+        "  'trm'   → tipo de cambio: dólar, TRM, devaluación, variación del peso\n"
+        "  'datos' → comercio exterior: exportaciones, importaciones, balanza, sectores\n"
+        "  'rag'   → estadísticas DANE: desempleo, inflación, PIB, población, censo\n\n"
+        "Incluye varias rutas solo si la pregunta realmente cruza dominios "
+        "(ej: TRM + exportaciones → [\"trm\", \"datos\"]).\n"
         "Responde EXACTAMENTE con este JSON (sin markdown):\n"
-        "{\"ruta\": \"<ruta>\", \"justificacion\": \"<una oración breve>\"}"
+        "{\"rutas\": [\"<ruta>\", ...], \"justificacion\": \"<una oración breve>\"}"
     ),
 
     "langgraph_trm": (
@@ -73,7 +83,16 @@ PROMPTS_DEFAULT: dict[str, str] = {
         "Eres un analista de comercio exterior de Colombia. "
         "Responde preguntas sobre exportaciones, importaciones y balanza comercial del 2024. "
         "Destaca los sectores mas importantes, el deficit/superavit y tendencias clave. "
-        "Usa datos exactos de las herramientas. Responde en español."
+        "Usa datos exactos de las herramientas. "
+        "Para cálculos que esas herramientas no traen (promedios por período, rankings, "
+        "el mes con mayor déficit) usa consultar_datos_sql con una sola consulta SELECT. "
+        "Si la pregunta relaciona el dólar con el comercio, usa analizar_trm_vs_comercio "
+        "y cita sus correlaciones y elasticidades en vez de calcularlas. "
+        "Para comercio por país socio o capítulo arancelario usa consultar_cubo_comercio "
+        "si está disponible. "
+        "Los CSV subidos por el usuario tienen tools describir_*, filtrar_* y agregar_*: "
+        "empieza por describir_* para conocer sus columnas. "
+        "Responde en español."
     ),
 
     "langgraph_rag": (
@@ -134,9 +153,16 @@ def init_db() -> None:
             tokens_out  INTEGER DEFAULT 0,
             costo_usd   REAL    DEFAULT 0,
             modelo      TEXT    DEFAULT '',
-            backend     TEXT    DEFAULT 'langgraph'
+            backend     TEXT    DEFAULT 'langgraph',
+            desglose    TEXT    DEFAULT ''
         )
     """)
+    # BDs creadas antes de trazas.py: agregar la columna desglose
+    columnas = [r[1] for r in c.execute("PRAGMA table_info(consultas)")]
+    if "desglose" not in columnas:
+        c.execute("ALTER TABLE consultas ADD COLUMN desglose TEXT DEFAULT ''")
+
+    _crear_enrutamientos(c)
 
     # Insertar defaults solo si no existen (INSERT OR IGNORE)
     for nombre, contenido in PROMPTS_DEFAULT.items():
@@ -237,17 +263,18 @@ def save_consulta(
     costo_usd:   float,
     modelo:      str,
     backend:     str = "langgraph",
+    desglose:    str = "",
 ) -> None:
-    """Guarda una consulta en la tabla SQLite consultas."""
+    """Guarda una consulta en la tabla SQLite consultas (desglose: JSON de trazas.py)."""
     conn = sqlite3.connect(DB_PATH)
     c    = conn.cursor()
     c.execute("""
         INSERT INTO consultas
             (timestamp, pregunta, respuesta, latencia_ms,
-             tokens_in, tokens_out, costo_usd, modelo, backend)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+             tokens_in, tokens_out, costo_usd, modelo, backend, desglose)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (timestamp, pregunta, respuesta, latencia_ms,
-          tokens_in, tokens_out, costo_usd, modelo, backend))
+          tokens_in, tokens_out, costo_usd, modelo, backend, desglose))
     conn.commit()
     conn.close()
 
@@ -297,6 +324,9 @@ def get_metricas_consultas() -> dict:
     c.execute("SELECT modelo, COUNT(*) FROM consultas GROUP BY modelo")
     por_modelo = {r[0]: r[1] for r in c.fetchall()}
 
+    c.execute("SELECT backend, COUNT(*) FROM consultas GROUP BY backend")
+    por_backend = {r[0]: r[1] for r in c.fetchall()}
+
     conn.close()
 
     def pct(lst, p):
@@ -320,11 +350,74 @@ def get_metricas_consultas() -> dict:
         "costo_promedio_usd":   round(float(row[6] or 0), 6),
         "costo_por_mil_tokens": round(costo_tot / max(total_in + total_out, 1) * 1000, 4),
         "consultas_por_modelo": por_modelo,
+        "consultas_por_backend": por_backend,   # "rapida" = vía rápida sin LLM
         "primera_consulta":     row[7],
         "ultima_consulta":      row[8],
     }
 
 
+# ---------------------------------------------------------------------------
+# Historial de enrutamiento (entrenamiento del enrutador local)
+# ---------------------------------------------------------------------------
+
+def _crear_enrutamientos(c) -> None:
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS enrutamientos (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp   TEXT    NOT NULL,
+            pregunta    TEXT    NOT NULL,
+            rutas       TEXT    NOT NULL,
+            origen      TEXT    NOT NULL,
+            confianza   REAL    DEFAULT 0
+        )
+    """)
+
+
+def save_enrutamiento(
+    timestamp: str,
+    pregunta:  str,
+    rutas:     list[str],
+    origen:    str,
+    confianza: float,
+) -> None:
+    """Guarda qué rutas se eligieron para una pregunta y quién las eligió ("local" | "llm")."""
+    conn = sqlite3.connect(DB_PATH)
+    c    = conn.cursor()
+    # CLI y pipeline directo no pasan por init_db() (solo el arranque de la API)
+    _crear_enrutamientos(c)
+    c.execute("""
+        INSERT INTO enrutamientos (timestamp, pregunta, rutas, origen, confianza)
+        VALUES (?, ?, ?, ?, ?)
+    """, (timestamp, pregunta, ",".join(rutas), origen, confianza))
+    conn.commit()
+    conn.close()
+
+
+def get_enrutamientos(origen: str | None = None, n: int = 5000) -> list[dict]:
+    """Últimos n enrutamientos (opcionalmente solo de un origen), rutas como lista."""
+    conn = sqlite3.connect(DB_PATH)
+    c    = conn.cursor()
+    if origen:
+        c.execute("""
+            SELECT timestamp, pregunta, rutas, origen, confianza
+            FROM enrutamientos WHERE origen = ?
+            ORDER BY id DESC LIMIT ?
+        """, (origen, n))
+    else:
+        c.execute("""
+            SELECT timestamp, pregunta, rutas, origen, confianza
+            FROM enrutamientos
+            ORDER BY id DESC LIMIT ?
+        """, (n,))
+    rows = c.fetchall()
+    conn.close()
+    return [
+        {"timestamp": r[0], "pregunta": r[1], "rutas": [x for x in r[2].split(",") if x],
+         "origen": r[3], "confianza": r[4]}
+        for r in rows
+    ]
+
+
 # ---------------------------------------------------------------------------
 # Punto de entrada (diagnóstico)
 # ---------------------------------------------------------------------------
@@ -0,0 +1,201 @@
+"""
+datasets.py — Registro en memoria de los CSV de datos/
+======================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Las tools de TRM y comercio exterior hacían pd.read_csv en cada llamada; una
+sola request ReAct de varios turnos parseaba el mismo archivo varias veces.
+
+Este módulo carga cada datos/*.csv una vez y mantiene el DataFrame en memoria.
+Antes de reutilizarlo compara (mtime, tamaño) del archivo con los de la carga:
+si cambió, lo vuelve a leer. Además main.py invalida la entrada cuando
+/api/upload/datos o DELETE /api/archivos/datos/... tocan el archivo.
+
+Cada carga calcula una versión (sha1 corto del contenido): identifica la
+versión del dataset para cachés derivadas.
+
+Con pyarrow instalado (DATASETS_COLUMNAR) la carga no parsea el CSV: abre la
+versión Arrow IPC memory-mapped de columnar.py, y obtener(columnas=, ultimas=)
+solo materializa las columnas y filas pedidas. Sin pyarrow se lee el CSV con
+pandas y se guarda el DataFrame completo.
+
+Uso en tools.py:
+    df = datasets.obtener("trm_2024.csv")      # DataFrame compartido: NO mutar
+    df = df.sort_values(...)                   # las operaciones que copian están bien
+    df = datasets.obtener("trm_2024.csv", columnas=["nombre_mes", "trm"], ultimas=6)
+"""
+
+import hashlib
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import columnar
+import config
+
+
+@dataclass
+class _Entrada:
+    df:       object    # pandas.DataFrame completo (None hasta que se pide, en modo columnar)
+    tabla:    object    # pyarrow.Table memory-mapped, o None en modo CSV
+    mtime_ns: int
+    tamano:   int
+    version:  str
+    cargado:  float     # time.time() de la carga
+    carga_ms: float
+
+
+_entradas: dict[str, _Entrada] = {}
+_lock  = threading.Lock()
+_locks_carga: dict[str, threading.Lock] = {}
+_stats = {"aciertos": 0, "cargas": 0, "recargas_por_cambio": 0, "invalidaciones": 0}
+
+
+def _ruta(nombre: str) -> Path:
+    return config.DATOS_DIR / Path(nombre).name
+
+
+def _cargar(ruta: Path) -> _Entrada:
+    import pandas as pd
+
+    inicio = time.perf_counter()
+    if columnar.disponible():
+        st = ruta.stat()
+        tabla, meta = columnar.abrir(ruta.name)
+        return _Entrada(
+            df=None, tabla=tabla, mtime_ns=st.st_mtime_ns, tamano=st.st_size,
+            version=meta["version"], cargado=time.time(),
+            carga_ms=(time.perf_counter() - inicio) * 1000,
+        )
+
+    contenido = ruta.read_bytes()
+    st        = ruta.stat()
+    df        = pd.read_csv(ruta)
+    # Texto repetido (meses, sectores) como category: menos memoria, mismos valores
+    for col in df.select_dtypes(include="object"):
+        if df[col].nunique() <= len(df) // 2:
+            df[col] = df[col].astype("category")
+    return _Entrada(
+        df=df, tabla=None, mtime_ns=st.st_mtime_ns, tamano=st.st_size,
+        version=hashlib.sha1(contenido).hexdigest()[:12],
+        cargado=time.time(), carga_ms=(time.perf_counter() - inicio) * 1000,
+    )
+
+
+def _vigente(nombre: str) -> _Entrada:
+    """Entrada en memoria del archivo, recargándola si cambió en disco."""
+    ruta = _ruta(nombre)
+    st   = ruta.stat()   # FileNotFoundError si no existe: la tool lo reporta
+    with _lock:
+        e = _entradas.get(ruta.name)
+        if e is not None and (e.mtime_ns, e.tamano) == (st.st_mtime_ns, st.st_size):
+            _stats["aciertos"] += 1
+            return e
+        lock_carga = _locks_carga.setdefault(ruta.name, threading.Lock())
+
+    # Una sola carga por archivo aunque lleguen varias requests a la vez
+    with lock_carga:
+        with _lock:
+            actual = _entradas.get(ruta.name)
+            if actual is not None and actual is not e:
+                _stats["aciertos"] += 1
+                return actual
+        nueva = _cargar(ruta)
+        with _lock:
+            _entradas[ruta.name] = nueva
+            _stats["cargas"] += 1
+            if e is not None:
+                _stats["recargas_por_cambio"] += 1
+        return nueva
+
+
+def obtener(nombre: str, columnas: list[str] | None = None, ultimas: int | None = None):
+    """
+    DataFrame de datos/<nombre>. Sin argumentos retorna el frame completo
+    compartido entre requests (no mutarlo). columnas / ultimas proyectan las
+    columnas y las últimas N filas; en modo columnar solo eso se lee del mapa.
+    """
+    e = _vigente(nombre)
+    if e.tabla is None or (columnas is None and ultimas is None):
+        if e.df is None:
+            e.df = e.tabla.to_pandas()
+        df = e.df
+        if ultimas is not None:
+            df = df.tail(ultimas)
+        return df[columnas] if columnas is not None else df
+
+    tabla = e.tabla
+    if ultimas is not None:
+        tabla = tabla.slice(max(0, tabla.num_rows - ultimas))
+    if columnas is not None:
+        tabla = tabla.select(columnas)
+    return tabla.to_pandas()
+
+
+def tabla_arrow(nombre: str):
+    """pyarrow.Table memory-mapped de datos/<nombre>, o None si no hay modo columnar."""
+    return _vigente(nombre).tabla
+
+
+def columnas(nombre: str) -> list[str]:
+    """Columnas de datos/<nombre> (en modo columnar, del esquema sin leer datos)."""
+    e = _vigente(nombre)
+    return e.tabla.column_names if e.tabla is not None else [str(c) for c in e.df.columns]
+
+
+def nombres() -> list[str]:
+    """CSV disponibles en datos/."""
+    return sorted(p.name for p in config.DATOS_DIR.glob("*.csv"))
+
+
+def version(nombre: str) -> str:
+    """Versión (sha1 corto del contenido) del dataset cargado."""
+    return _vigente(nombre).version
+
+
+def invalidar(nombre: str | None = None) -> None:
+    """
+    Descarta la entrada de nombre (o todas): la próxima lectura recarga del
+    disco (y re-ingiere la versión columnar si el CSV cambió).
+    """
+    with _lock:
+        if nombre is None:
+            n = len(_entradas)
+            _entradas.clear()
+        else:
+            n = 1 if _entradas.pop(Path(nombre).name, None) is not None else 0
+        _stats["invalidaciones"] += n
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Datasets en memoria (filas, memoria, versión) y aciertos del registro."""
+    with _lock:
+        entradas = dict(_entradas)
+        st = dict(_stats)
+    lecturas = st["aciertos"] + st["cargas"]
+    return {
+        "columnar":     columnar.disponible(),
+        "tasa_acierto": round(st["aciertos"] / lecturas, 3) if lecturas else 0.0,
+        **st,
+        "datasets": {
+            nombre: {
+                "filas":      e.tabla.num_rows if e.tabla is not None else len(e.df),
+                "memoria_kb": round(e.df.memory_usage(deep=True).sum() / 1024, 1)
+                              if e.df is not None else 0.0,
+                "mapeado_kb": round(e.tabla.nbytes / 1024, 1) if e.tabla is not None else 0.0,
+                "version":    e.version,
+                "carga_ms":   round(e.carga_ms, 1),
+                "cargado":    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e.cargado)),
+            }
+            for nombre, e in sorted(entradas.items())
+        },
+    }
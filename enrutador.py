@@ -0,0 +1,293 @@
+"""
+enrutador.py — Enrutador local rápido delante del supervisor LLM
+================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+El supervisor de agente_langgraph gastaba un viaje completo al LLM (1–3 s) solo
+para elegir entre trm / datos / rag. Este módulo decide en microsegundos:
+
+  1. Capa de palabras clave (regex por dominio): "dólar", "exportaciones",
+     "desempleo"... Cubre la gran mayoría de preguntas.
+  2. Clasificador Naive Bayes multinomial (uno contra el resto por ruta),
+     entrenado con las rutas que eligió el supervisor LLM en el historial
+     (tabla SQLite enrutamientos). Se activa con ROUTER_MIN_EJEMPLOS y se
+     reentrena cada ROUTER_REENTRENAR_CADA ejemplos nuevos.
+
+Si la confianza combinada es menor que ROUTER_UMBRAL, o si las dos capas no
+están de acuerdo, se llama al supervisor LLM como antes y su decisión se guarda
+como nuevo ejemplo de entrenamiento. Solo se entrena con decisiones del LLM:
+el enrutador no aprende de sí mismo.
+
+Uso:
+    decision = enrutador.clasificar(pregunta)
+    if decision.confianza >= config.ROUTER_UMBRAL:
+        rutas = decision.rutas
+"""
+
+import math
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+RUTAS = ("trm", "datos", "rag")
+
+
+# ---------------------------------------------------------------------------
+# Normalización de texto
+# ---------------------------------------------------------------------------
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes: 'Inflación' → 'inflacion'."""
+    sin_tildes = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in sin_tildes if not unicodedata.combining(c))
+
+
+def tokenizar(texto: str) -> list[str]:
+    return [t for t in re.findall(r"[a-z0-9]+", normalizar(texto)) if len(t) >= 3]
+
+
+# ---------------------------------------------------------------------------
+# Capa 1: palabras clave
+# ---------------------------------------------------------------------------
+
+# Patrones sobre texto normalizado (sin tildes). Muchos son prefijos a propósito:
+# "\bexporta" cubre exportaciones, exportadores, exportar...
+_PATRONES: dict[str, list[re.Pattern]] = {
+    "trm": [re.compile(p) for p in (
+        r"\bdolar", r"\btrm\b", r"tasa de cambio", r"tipo de cambio", r"\bdevalua",
+        r"\brevalua", r"peso colombiano", r"\bdivisa", r"\busd\b", r"\bcambiari",
+    )],
+    "datos": [re.compile(p) for p in (
+        r"\bexporta", r"\bimporta", r"\bbalanza", r"comercio exterior", r"\bsector",
+        r"\bdeficit", r"\bsuperavit", r"\barancel", r"\bpetroleo", r"\bcafe\b",
+    )],
+    "rag": [re.compile(p) for p in (
+        r"\bdesemple", r"\binflacion", r"\bipc\b", r"\bpib\b", r"\bpoblacion",
+        r"\bcenso", r"\bdane\b", r"mercado laboral", r"\bocupacion", r"\bcrecimiento economico",
+    )],
+}
+
+# Más coincidencias → más confianza. Una sola palabra clave ("dólar") ya
+# supera el umbral por defecto (0.8).
+_CONFIANZA_POR_ACIERTOS = (0.0, 0.85, 0.92, 0.95)
+
+
+def por_palabras_clave(pregunta: str) -> tuple[list[str], float]:
+    """(rutas, confianza). Confianza 0 si no hay ninguna coincidencia."""
+    texto    = normalizar(pregunta)
+    aciertos = {r: sum(1 for p in pats if p.search(texto)) for r, pats in _PATRONES.items()}
+    rutas    = [r for r in RUTAS if aciertos[r]]
+    if not rutas:
+        return [], 0.0
+    total = sum(aciertos.values())
+    return rutas, _CONFIANZA_POR_ACIERTOS[min(total, len(_CONFIANZA_POR_ACIERTOS) - 1)]
+
+
+# ---------------------------------------------------------------------------
+# Capa 2: Naive Bayes multinomial entrenado con el historial
+# ---------------------------------------------------------------------------
+
+class ClasificadorNB:
+    """Un Naive Bayes binario (ruta sí / no) por cada ruta; suavizado de Laplace."""
+
+    def __init__(self):
+        self.ejemplos = 0
+        self._conteos: dict[tuple[str, bool], Counter] = {}
+        self._totales: dict[tuple[str, bool], int]     = {}
+        self._docs:    dict[tuple[str, bool], int]     = {}
+        self._vocabulario: set[str] = set()
+
+    def entrenar(self, ejemplos: list[tuple[str, list[str]]]) -> None:
+        conteos = {(r, s): Counter() for r in RUTAS for s in (True, False)}
+        docs    = {(r, s): 0 for r in RUTAS for s in (True, False)}
+        vocab: set[str] = set()
+        for pregunta, rutas in ejemplos:
+            tokens = tokenizar(pregunta)
+            vocab.update(tokens)
+            for r in RUTAS:
+                clave = (r, r in rutas)
+                conteos[clave].update(tokens)
+                docs[clave] += 1
+        self._conteos     = conteos
+        self._totales     = {k: sum(c.values()) for k, c in conteos.items()}
+        self._docs        = docs
+        self._vocabulario = vocab
+        self.ejemplos     = len(ejemplos)
+
+    def probabilidades(self, pregunta: str) -> dict[str, float]:
+        """P(ruta | pregunta) para cada ruta."""
+        tokens = [t for t in tokenizar(pregunta) if t in self._vocabulario]
+        if not tokens:
+            return {r: 0.5 for r in RUTAS}             # sin evidencia
+        v      = max(len(self._vocabulario), 1)
+        probs  = {}
+        for r in RUTAS:
+            log = {}
+            for s in (True, False):
+                clave = (r, s)
+                prior = (self._docs[clave] + 1) / (self.ejemplos + 2)
+                log[s] = math.log(prior) + sum(
+                    math.log((self._conteos[clave][t] + 1) / (self._totales[clave] + v))
+                    for t in tokens
+                )
+            # softmax de dos clases, estable numéricamente
+            probs[r] = 1.0 / (1.0 + math.exp(max(-700.0, min(700.0, log[False] - log[True]))))
+        return probs
+
+    def clasificar(self, pregunta: str) -> tuple[list[str], float]:
+        """(rutas, confianza); la confianza es la de la ruta más dudosa."""
+        probs = self.probabilidades(pregunta)
+        rutas = [r for r in RUTAS if probs[r] >= 0.5]
+        if not rutas:
+            return [], 0.0
+        return rutas, min(max(p, 1.0 - p) for p in probs.values())
+
+
+# ---------------------------------------------------------------------------
+# Decisión combinada
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Decision:
+    rutas:     list[str]
+    confianza: float
+    metodo:    str          # palabras_clave | clasificador | ambos | desacuerdo | ninguno
+    detalle:   dict = field(default_factory=dict)
+
+
+_lock          = threading.Lock()
+_clasificador: ClasificadorNB | None = None
+_pendientes    = 0                          # ejemplos nuevos desde el último entrenamiento
+_cargado       = False
+_entrenando    = False                      # un hilo ya está leyendo el historial
+_stats = {
+    "decisiones": 0, "locales": 0, "fallback_llm": 0, "desacuerdos": 0,
+    "por_metodo": Counter(), "suma_confianza": 0.0, "suma_us": 0.0,
+}
+
+
+def _entrenar_desde_historial() -> ClasificadorNB | None:
+    """
+    Clasificador entrenado con las decisiones del LLM guardadas en SQLite
+    (None si aún no hay suficientes). Lee la BD: se llama SIN _lock.
+    """
+    try:
+        import database
+        filas = database.get_enrutamientos(origen="llm")
+    except Exception:
+        filas = []
+    if len(filas) < config.ROUTER_MIN_EJEMPLOS:
+        return None
+    nuevo = ClasificadorNB()
+    nuevo.entrenar([(f["pregunta"], f["rutas"]) for f in filas])
+    return nuevo
+
+
+def clasificar(pregunta: str) -> Decision:
+    """Decide las rutas localmente. No llama al LLM ni escribe en SQLite."""
+    global _clasificador, _pendientes, _cargado, _entrenando
+    inicio = time.perf_counter()
+    with _lock:
+        reentrenar = (not _cargado or _pendientes >= config.ROUTER_REENTRENAR_CADA) \
+            and not _entrenando
+        if reentrenar:
+            _entrenando = True
+            _pendientes = 0
+        clasificador = _clasificador
+
+    # El historial se lee fuera del lock: las demás decisiones siguen con el
+    # clasificador vigente y el nuevo se publica al terminar
+    if reentrenar:
+        nuevo = clasificador
+        try:
+            nuevo = _entrenar_desde_historial()
+        finally:
+            with _lock:
+                _clasificador, _cargado, _entrenando = nuevo, True, False
+        clasificador = nuevo
+
+    rutas_kw, conf_kw = por_palabras_clave(pregunta)
+    rutas_nb, conf_nb = clasificador.clasificar(pregunta) if clasificador else ([], 0.0)
+    if conf_nb < config.ROUTER_UMBRAL:
+        rutas_nb = []                               # clasificador dudoso: no vota
+
+    if rutas_kw and rutas_nb:
+        if set(rutas_kw) == set(rutas_nb):
+            decision = Decision(rutas_kw, max(conf_kw, conf_nb), "ambos")
+        else:
+            # Capas en desacuerdo: que decida el LLM
+            decision = Decision(rutas_kw, 0.0, "desacuerdo")
+    elif rutas_kw:
+        decision = Decision(rutas_kw, conf_kw, "palabras_clave")
+    elif rutas_nb:
+        decision = Decision(rutas_nb, conf_nb, "clasificador")
+    else:
+        decision = Decision([], 0.0, "ninguno")
+
+    decision.detalle = {"palabras_clave": [rutas_kw, round(conf_kw, 3)],
+                        "clasificador":   [rutas_nb, round(conf_nb, 3)]}
+    us = (time.perf_counter() - inicio) * 1e6
+
+    with _lock:
+        _stats["decisiones"]     += 1
+        _stats["suma_confianza"] += decision.confianza
+        _stats["suma_us"]        += us
+        _stats["por_metodo"][decision.metodo] += 1
+        if decision.metodo == "desacuerdo":
+            _stats["desacuerdos"] += 1
+    return decision
+
+
+def registrar(pregunta: str, rutas: list[str], origen: str, confianza: float) -> None:
+    """
+    Guarda la decisión final en SQLite (origen: "local" o "llm") y actualiza
+    los contadores de fallback. Las decisiones "llm" alimentan el clasificador.
+    """
+    global _pendientes
+    with _lock:
+        if origen == "llm":
+            _stats["fallback_llm"] += 1
+            _pendientes += 1
+        else:
+            _stats["locales"] += 1
+    try:
+        import database
+        database.save_enrutamiento(datetime.now().isoformat(), pregunta, rutas, origen, confianza)
+    except Exception as e:
+        print(f"  [ENRUTADOR] No se pudo guardar la decisión: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Decisiones por método, tasa de fallback al LLM y confianza media."""
+    with _lock:
+        st       = {k: (dict(v) if isinstance(v, Counter) else v) for k, v in _stats.items()}
+        ejemplos = _clasificador.ejemplos if _clasificador else 0
+    n     = st["decisiones"]
+    final = st["locales"] + st["fallback_llm"]
+    return {
+        "habilitado":            config.ROUTER_LOCAL_ENABLED,
+        "umbral":                config.ROUTER_UMBRAL,
+        "decisiones":            n,
+        "por_metodo":            st["por_metodo"],
+        "locales":               st["locales"],
+        "fallback_llm":          st["fallback_llm"],
+        "tasa_fallback":         round(st["fallback_llm"] / final, 3) if final else 0.0,
+        "desacuerdos":           st["desacuerdos"],
+        "confianza_media":       round(st["suma_confianza"] / n, 3) if n else None,
+        "latencia_media_us":     round(st["suma_us"] / n, 1) if n else None,
+        "clasificador_ejemplos": ejemplos,
+    }
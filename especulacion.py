@@ -0,0 +1,216 @@
+"""
+especulacion.py — Ejecución especulativa de especialistas
+=========================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Cuando el enrutador local no está seguro, el supervisor LLM añade un viaje
+serial al LLM antes de que arranque cualquier especialista. En modo
+especulativo (ESPECULACION_ENABLED, opt-in):
+
+  1. Antes de llamar al supervisor LLM se toma la predicción barata del
+     enrutador local (enrutador.clasificar) y se lanzan en segundo plano
+     hasta ESPECULACION_MAX_RUTAS especialistas.
+  2. Cuando el supervisor decide:
+       ruta predicha ∈ rutas elegidas → el nodo especialista reutiliza el
+                                          resultado especulativo (acierto)
+       ruta predicha ∉ rutas elegidas → se cancela (fallo)
+  3. La cancelación es cooperativa: un callback de LangChain corta la
+     ejecución antes de la siguiente llamada al LLM o a una tool. Los tokens
+     que alcanzó a gastar se cuentan como desperdiciados.
+  4. Cada rama gasta un presupuesto propio (presupuesto.abrir_rama): las
+     tools, turnos y tokens de una rama cancelada no se descuentan del
+     presupuesto de la request; los de una rama adoptada sí (tomar()).
+
+El estado del grafo solo lleva id_especulacion (string); los futures viven en
+este módulo. Tras un reinicio o una reanudación desde checkpoint no hay
+especulación que reutilizar y el especialista corre normalmente.
+"""
+
+import contextvars
+import sys
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+import limitador
+import presupuesto
+
+
+class EspeculacionCancelada(Exception):
+    """La rama especulativa se canceló porque el supervisor eligió otra ruta."""
+
+
+class CallbackEspeculacion(BaseCallbackHandler):
+    """Corta la rama si fue cancelada y cuenta los tokens que consume."""
+
+    raise_error = True   # sin esto LangChain se traga la excepción del callback
+
+    def __init__(self):
+        self.cancelada = threading.Event()
+        self.tokens    = 0
+        self._lock     = threading.Lock()
+
+    def _verificar(self):
+        if self.cancelada.is_set():
+            raise EspeculacionCancelada("rama especulativa cancelada")
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._verificar()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._verificar()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._verificar()
+
+    def on_llm_end(self, response, **kwargs):
+        with self._lock:
+            self.tokens += limitador.tokens_reales(response) or 0
+
+
+class _Rama:
+    def __init__(self, ruta: str, future: Future, callback: CallbackEspeculacion,
+                 id_presupuesto: str):
+        self.ruta     = ruta
+        self.future   = future
+        self.callback = callback
+        self.id_presupuesto = id_presupuesto   # presupuesto propio de la rama
+        self.ms_adelantados = 0.0    # duración del supervisor LLM que se solapó
+
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="especulacion")
+_ramas: dict[str, dict[str, _Rama]] = {}
+_lock  = threading.Lock()
+_stats = {
+    "lanzadas": 0, "aciertos": 0, "fallos": 0, "errores": 0,
+    "tokens_desperdiciados": 0, "ms_adelantados": 0.0,
+}
+
+
+def _en_contexto_limpio(trabajo: Callable, callback: CallbackEspeculacion):
+    """
+    Ejecuta trabajo(callbacks) en otro hilo conservando los contextvars propios
+    (memo de tools) pero SIN el config del nodo LangGraph que la lanzó: la rama
+    sobrevive al supervisor y no debe escribir en su checkpoint ni en su traza.
+    """
+    from langchain_core.runnables.config import var_child_runnable_config
+
+    ctx = contextvars.copy_context()
+
+    def _correr():
+        var_child_runnable_config.set(None)
+        return trabajo([callback])
+
+    return ctx.run(_correr)
+
+
+def iniciar(rutas: list[str], trabajo_por_ruta: Callable[[str, str], Callable],
+            id_presupuesto: str = "") -> str:
+    """
+    Lanza las ramas especulativas. trabajo_por_ruta(ruta, id_presupuesto_rama)
+    retorna una función trabajo(callbacks) -> str que ejecuta el especialista
+    completo con el presupuesto de la rama (abierto desde id_presupuesto, el
+    de la request). Retorna el id_especulacion para guardar en el estado.
+    """
+    id_esp = uuid.uuid4().hex
+    ramas  = {}
+    for ruta in rutas[:config.ESPECULACION_MAX_RUTAS]:
+        cb      = CallbackEspeculacion()
+        id_rama = presupuesto.abrir_rama(id_presupuesto)
+        future  = _executor.submit(_en_contexto_limpio, trabajo_por_ruta(ruta, id_rama), cb)
+        ramas[ruta] = _Rama(ruta, future, cb, id_rama)
+    with _lock:
+        _ramas[id_esp] = ramas
+        _stats["lanzadas"] += len(ramas)
+    print(f"  [ESPECULACION] lanzadas: {list(ramas)}")
+    return id_esp
+
+
+def resolver(id_esp: str, rutas_elegidas: list[str], ms_supervisor: float = 0.0) -> None:
+    """Cancela las ramas que el supervisor no eligió; las demás quedan para tomar()."""
+    with _lock:
+        ramas = _ramas.get(id_esp, {})
+        fallidas = [r for ruta, r in ramas.items() if ruta not in rutas_elegidas]
+        for r in fallidas:
+            ramas.pop(r.ruta)
+        for r in ramas.values():
+            r.ms_adelantados = ms_supervisor
+        _stats["fallos"] += len(fallidas)
+    for r in fallidas:
+        r.callback.cancelada.set()
+        r.future.cancel()
+        r.future.add_done_callback(lambda _f, rama=r: _contar_desperdicio(rama))
+    if fallidas:
+        print(f"  [ESPECULACION] canceladas: {[r.ruta for r in fallidas]}")
+
+
+def _contar_desperdicio(rama: _Rama) -> None:
+    # Se llama cuando la rama ya terminó: su presupuesto deja de usarse
+    presupuesto.cerrar_rama(rama.id_presupuesto, adoptar=False)
+    with _lock:
+        _stats["tokens_desperdiciados"] += rama.callback.tokens
+
+
+def tomar(id_esp: str, ruta: str) -> str | None:
+    """
+    Resultado especulativo de la ruta (espera a que termine), o None si no hay
+    rama para ella o si falló: en ese caso el nodo ejecuta el especialista.
+    """
+    with _lock:
+        rama = _ramas.get(id_esp, {}).pop(ruta, None)
+    if rama is None:
+        return None
+    try:
+        respuesta = rama.future.result()
+    except Exception as e:
+        presupuesto.cerrar_rama(rama.id_presupuesto, adoptar=False)
+        print(f"  [ESPECULACION] rama '{ruta}' falló ({type(e).__name__}); se re-ejecuta")
+        with _lock:
+            _stats["errores"] += 1
+        return None
+    presupuesto.cerrar_rama(rama.id_presupuesto, adoptar=True)
+    with _lock:
+        _stats["aciertos"]       += 1
+        _stats["ms_adelantados"] += rama.ms_adelantados
+    print(f"  [ESPECULACION] acierto: se reutiliza la rama '{ruta}'")
+    return respuesta
+
+
+def cerrar(id_esp: str) -> None:
+    """Cancela lo que quede pendiente al terminar la ejecución del grafo."""
+    with _lock:
+        restantes = list(_ramas.pop(id_esp, {}).values())
+        _stats["fallos"] += len(restantes)
+    for r in restantes:
+        r.callback.cancelada.set()
+        r.future.cancel()
+        r.future.add_done_callback(lambda _f, rama=r: _contar_desperdicio(rama))
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Tasa de acierto de la especulación y tokens gastados en ramas canceladas."""
+    with _lock:
+        st = dict(_stats)
+    resueltas = st["aciertos"] + st["fallos"]
+    return {
+        "habilitada":            config.ESPECULACION_ENABLED,
+        "max_rutas":             config.ESPECULACION_MAX_RUTAS,
+        "ramas_lanzadas":        st["lanzadas"],
+        "aciertos":              st["aciertos"],
+        "fallos":                st["fallos"],
+        "errores":               st["errores"],
+        "tasa_acierto":          round(st["aciertos"] / resueltas, 3) if resueltas else None,
+        "tokens_desperdiciados": st["tokens_desperdiciados"],
+        "ms_adelantados":        round(st["ms_adelantados"], 1),
+    }
@@ -0,0 +1,172 @@
+"""
+hedging.py — Llamadas LLM "hedged" para recortar la latencia de cola
+====================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+El p99 lo dominan respuestas muy lentas del proveedor, no nuestro código.
+Con HEDGING_ENABLED=true el supervisor y el sintetizador hacen esto:
+
+  1. Lanzan la llamada principal.
+  2. Si no ha respondido dentro del p90 móvil de ese nodo, lanzan un
+     duplicado (mismo proveedor o HEDGING_PROVEEDOR).
+  3. Se quedan con la primera respuesta; la otra se ignora.
+
+Controles de costo:
+  - No se cubre nada hasta tener HEDGING_MIN_MUESTRAS latencias del nodo.
+  - Los duplicados nunca superan HEDGING_MAX_TASA de las llamadas del nodo.
+  - Los tokens de la llamada descartada se contabilizan como tokens extra.
+
+Ambas llamadas pasan por resiliencia.invocar_nodo() (reintentos y failover).
+"""
+
+import contextvars
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+import middleware
+import prompt_cache
+import resiliencia
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedging")
+
+_lock       = threading.Lock()
+_latencias: dict[str, deque] = {}
+_stats:     dict[str, dict]  = {}
+
+
+def _stats_nodo(nodo: str) -> dict:
+    """Contadores del nodo (crear si no existen). Llamar con _lock tomado."""
+    if nodo not in _stats:
+        _stats[nodo] = {"llamadas": 0, "hedges": 0, "ganados_por_hedge": 0,
+                        "tokens_extra_in": 0, "tokens_extra_out": 0}
+        _latencias[nodo] = deque(maxlen=config.HEDGING_VENTANA)
+    return _stats[nodo]
+
+
+def _registrar_latencia(nodo: str, ms: float) -> None:
+    with _lock:
+        _stats_nodo(nodo)
+        _latencias[nodo].append(ms)
+
+
+def umbral_p90_ms(nodo: str) -> float | None:
+    """p90 móvil de la latencia del nodo, o None si aún no hay suficientes muestras."""
+    with _lock:
+        muestras = sorted(_latencias.get(nodo, ()))
+    if len(muestras) < config.HEDGING_MIN_MUESTRAS:
+        return None
+    return muestras[max(0, int(len(muestras) * 0.9) - 1)]
+
+
+def _reservar_hedge(nodo: str) -> bool:
+    """True (y cuenta el hedge) si el nodo no ha superado HEDGING_MAX_TASA."""
+    with _lock:
+        st = _stats_nodo(nodo)
+        if st["hedges"] + 1 > config.HEDGING_MAX_TASA * st["llamadas"]:
+            return False
+        st["hedges"] += 1
+        return True
+
+
+def _cadena_hedge() -> list[dict]:
+    """Cadena de proveedores del duplicado: HEDGING_PROVEEDOR primero, si existe."""
+    cadena = config.cadena_proveedores()
+    secundario = config.entrada_proveedor(config.HEDGING_PROVEEDOR) if config.HEDGING_PROVEEDOR else None
+    if secundario is None:
+        return cadena
+    return [secundario] + [c for c in cadena
+                           if (c["provider"], c["model"]) != (secundario["provider"], secundario["model"])]
+
+
+def _contar_tokens_extra(nodo: str, messages: list, futuro) -> None:
+    """Callback de la llamada descartada: suma sus tokens como costo extra del hedging."""
+    tokens_in  = sum(middleware.estimar_tokens(str(m.content)) for m in messages)
+    tokens_out = 0
+    if not futuro.cancelled() and futuro.exception() is None:
+        respuesta = futuro.result()
+        uso = getattr(respuesta, "usage_metadata", None) or {}
+        tokens_in  = uso.get("input_tokens",  tokens_in)
+        tokens_out = uso.get("output_tokens", middleware.estimar_tokens(str(respuesta.content)))
+    with _lock:
+        st = _stats_nodo(nodo)
+        st["tokens_extra_in"]  += tokens_in
+        st["tokens_extra_out"] += tokens_out
+
+
+def invocar(nodo: str, messages: list, temperature: float = 0.2):
+    """
+    llm.invoke(messages) para el nodo, con hedging si está habilitado.
+    Retorna el AIMessage de la primera llamada que responda con éxito.
+    """
+    def _llamar(cadena=None):
+        inicio    = time.perf_counter()
+        respuesta = resiliencia.invocar_nodo(
+            nodo, lambda llm: llm.invoke(prompt_cache.preparar_mensajes(messages, llm)),
+            temperature=temperature, cadena=cadena)
+        _registrar_latencia(nodo, (time.perf_counter() - inicio) * 1000)
+        return respuesta
+
+    if not config.HEDGING_ENABLED:
+        return _llamar()
+
+    with _lock:
+        _stats_nodo(nodo)["llamadas"] += 1
+
+    umbral_ms = umbral_p90_ms(nodo)
+    principal = _executor.submit(contextvars.copy_context().run, _llamar)
+    if umbral_ms is None:
+        return principal.result()
+
+    wait([principal], timeout=umbral_ms / 1000)
+    if principal.done() or not _reservar_hedge(nodo):
+        return principal.result()
+
+    print(f"  [HEDGING] {nodo}: sin respuesta en {umbral_ms:.0f} ms (p90), lanzando duplicado")
+    duplicado = _executor.submit(contextvars.copy_context().run, _llamar, _cadena_hedge())
+
+    pendientes = {principal, duplicado}
+    while True:
+        listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+        exitosos = [f for f in listos if f.exception() is None]
+        if exitosos or not pendientes:
+            break
+
+    ganador  = exitosos[0] if exitosos else principal
+    perdedor = duplicado if ganador is principal else principal
+    perdedor.add_done_callback(lambda f: _contar_tokens_extra(nodo, messages, f))
+    if ganador is duplicado:
+        with _lock:
+            _stats_nodo(nodo)["ganados_por_hedge"] += 1
+    return ganador.result()
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Tasa de hedging, victorias del duplicado y tokens extra por nodo."""
+    nodos = {}
+    with _lock:
+        nombres = list(_stats)
+    for nodo in nombres:
+        umbral = umbral_p90_ms(nodo)
+        with _lock:
+            st = dict(_stats[nodo])
+            muestras = len(_latencias[nodo])
+        st["tasa_hedge"]   = round(st["hedges"] / max(st["llamadas"], 1), 3)
+        st["umbral_p90_ms"] = round(umbral, 1) if umbral is not None else None
+        st["muestras"]     = muestras
+        nodos[nodo] = st
+    return {
+        "habilitado": config.HEDGING_ENABLED,
+        "max_tasa":   config.HEDGING_MAX_TASA,
+        "nodos":      nodos,
+    }
@@ -0,0 +1,224 @@
+"""
+limitador.py — Limitador RPM/TPM y planificador de concurrencia por proveedor
+=============================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Bajo carga, varios requests en paralelo disparan ráfagas de 429. Este módulo
+reparte la cuota de cada proveedor/modelo entre todas las llamadas del proceso:
+
+  rpm          → máximo de llamadas en los últimos 60 s
+  tpm          → máximo de tokens (entrada + salida) en los últimos 60 s
+  concurrencia → máximo de llamadas en vuelo al mismo tiempo
+
+Las llamadas que no caben NO fallan: esperan en una cola FIFO (justa) hasta que
+haya capacidad. Antes de la llamada se reserva una estimación de tokens; al
+terminar se ajusta con el uso real que reporta el proveedor.
+
+Se engancha como callback de LangChain en config._make_llm(), así cubre también
+las llamadas internas de los agentes ReAct (create_agent / create_react_agent).
+Los límites vienen de config.LIMITES_POR_PROVEEDOR (0 = sin límite).
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+VENTANA_S = 60.0
+
+
+def _limites(proveedor: str, modelo: str) -> dict[str, int]:
+    """Límites del modelo: "proveedor/modelo" > "proveedor" > sin límite."""
+    base = {"rpm": 0, "tpm": 0, "concurrencia": 0}
+    base.update(config.LIMITES_POR_PROVEEDOR.get(proveedor, {}))
+    base.update(config.LIMITES_POR_PROVEEDOR.get(f"{proveedor}/{modelo}", {}))
+    return base
+
+
+class Limitador:
+    """Cola FIFO con ventana deslizante de 60 s para un proveedor/modelo."""
+
+    def __init__(self, clave: str, rpm: int, tpm: int, concurrencia: int):
+        self.clave        = clave
+        self.rpm          = rpm
+        self.tpm          = tpm
+        self.concurrencia = concurrencia
+        self.en_vuelo     = 0
+        self.ventana: deque[list] = deque()   # [instante, tokens]
+        self.tokens_ventana = 0
+        self.cola: deque[int]     = deque()   # turnos esperando
+        self._siguiente_turno = 0
+        self.llamadas        = 0
+        self.esperas         = 0
+        self.espera_total_ms = 0.0
+        self.espera_max_ms   = 0.0
+        self._cond = threading.Condition()
+
+    def _purgar(self, ahora: float) -> None:
+        while self.ventana and ahora - self.ventana[0][0] >= VENTANA_S:
+            _, tokens = self.ventana.popleft()
+            self.tokens_ventana -= tokens
+
+    def _hay_capacidad(self, tokens: int) -> bool:
+        if self.concurrencia and self.en_vuelo >= self.concurrencia:
+            return False
+        if self.rpm and len(self.ventana) >= self.rpm:
+            return False
+        # Una llamada más grande que el TPM completo pasa sola con la ventana vacía
+        if self.tpm and self.ventana and self.tokens_ventana + tokens > self.tpm:
+            return False
+        return True
+
+    def _espera_sugerida(self, ahora: float) -> float:
+        """Segundos hasta que caduque la entrada más antigua de la ventana."""
+        if not self.ventana:
+            return 0.5
+        return max(0.01, VENTANA_S - (ahora - self.ventana[0][0]))
+
+    def adquirir(self, tokens_estimados: int) -> list:
+        """Bloquea hasta tener turno y capacidad. Retorna el registro de la ventana."""
+        inicio = time.perf_counter()
+        with self._cond:
+            turno = self._siguiente_turno
+            self._siguiente_turno += 1
+            self.cola.append(turno)
+            try:
+                while True:
+                    ahora = time.time()
+                    self._purgar(ahora)
+                    if self.cola[0] == turno and self._hay_capacidad(tokens_estimados):
+                        break
+                    self._cond.wait(timeout=self._espera_sugerida(ahora))
+            finally:
+                self.cola.remove(turno)
+
+            registro = [time.time(), tokens_estimados]
+            self.ventana.append(registro)
+            self.tokens_ventana += tokens_estimados
+            self.en_vuelo       += 1
+            self.llamadas       += 1
+
+            espera_ms = (time.perf_counter() - inicio) * 1000
+            if espera_ms >= 1:
+                self.esperas         += 1
+                self.espera_total_ms += espera_ms
+                self.espera_max_ms    = max(self.espera_max_ms, espera_ms)
+            self._cond.notify_all()
+        return registro
+
+    def liberar(self, registro: list, tokens_reales: int | None = None) -> None:
+        """Libera el cupo de concurrencia y corrige los tokens con el uso real."""
+        with self._cond:
+            self.en_vuelo = max(0, self.en_vuelo - 1)
+            if tokens_reales is not None and registro in self.ventana:
+                self.tokens_ventana += tokens_reales - registro[1]
+                registro[1] = tokens_reales
+            self._cond.notify_all()
+
+    def resumen(self) -> dict:
+        with self._cond:
+            self._purgar(time.time())
+            ratios = [
+                self.en_vuelo / self.concurrencia if self.concurrencia else 0.0,
+                len(self.ventana) / self.rpm      if self.rpm else 0.0,
+                self.tokens_ventana / self.tpm    if self.tpm else 0.0,
+            ]
+            return {
+                "en_vuelo":          self.en_vuelo,
+                "max_concurrencia":  self.concurrencia,
+                "rpm_usado":         len(self.ventana),
+                "rpm_limite":        self.rpm,
+                "tpm_usado":         self.tokens_ventana,
+                "tpm_limite":        self.tpm,
+                "en_cola":           len(self.cola),
+                "saturacion":        round(max(ratios), 3),
+                "llamadas":          self.llamadas,
+                "llamadas_en_espera": self.esperas,
+                "espera_total_ms":   round(self.espera_total_ms, 1),
+                "espera_max_ms":     round(self.espera_max_ms, 1),
+            }
+
+
+_limitadores: dict[str, Limitador] = {}
+_limitadores_lock = threading.Lock()
+
+
+def obtener_limitador(proveedor: str, modelo: str) -> Limitador:
+    clave = f"{proveedor}/{modelo}"
+    with _limitadores_lock:
+        if clave not in _limitadores:
+            _limitadores[clave] = Limitador(clave, **_limites(proveedor, modelo))
+        return _limitadores[clave]
+
+
+# ---------------------------------------------------------------------------
+# Estimación y medición de tokens
+# ---------------------------------------------------------------------------
+
+def estimar_tokens_llamada(messages: list, invocation_params: dict | None = None) -> int:
+    """Tokens de entrada (mensajes + esquemas de tools, ~4 chars/token) + salida esperada."""
+    chars = sum(len(str(m.content)) for m in messages)
+    tools = (invocation_params or {}).get("tools")
+    if tools:
+        chars += len(json.dumps(tools, ensure_ascii=False, default=str))
+    return max(1, chars // 4) + config.LIMITADOR_SALIDA_ESTIMADA
+
+
+def tokens_reales(response) -> int | None:
+    """Total de tokens que reporta el proveedor en un LLMResult, si lo reporta."""
+    total = 0
+    for generaciones in response.generations:
+        for gen in generaciones:
+            uso = getattr(getattr(gen, "message", None), "usage_metadata", None)
+            if uso:
+                total += uso.get("total_tokens", 0)
+    if total:
+        return total
+    uso = (response.llm_output or {}).get("token_usage") or {}
+    return uso.get("total_tokens")
+
+
+# ---------------------------------------------------------------------------
+# Callback de LangChain — se adjunta a cada LLM en config._make_llm()
+# ---------------------------------------------------------------------------
+
+class CallbackLimitador(BaseCallbackHandler):
+    """Reserva cupo antes de cada llamada al modelo y lo libera al terminar."""
+
+    def __init__(self, proveedor: str, modelo: str):
+        self.limitador = obtener_limitador(proveedor, modelo)
+        self._registros: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        planos   = [m for lote in messages for m in lote]
+        estimado = estimar_tokens_llamada(planos, kwargs.get("invocation_params"))
+        self._registros[run_id] = self.limitador.adquirir(estimado)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        registro = self._registros.pop(run_id, None)
+        if registro is not None:
+            self.limitador.liberar(registro, tokens_reales(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        registro = self._registros.pop(run_id, None)
+        if registro is not None:
+            self.limitador.liberar(registro)
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Saturación por proveedor/modelo: concurrencia, RPM, TPM y colas."""
+    with _limitadores_lock:
+        limitadores = list(_limitadores.values())
+    return {lim.clave: lim.resumen() for lim in limitadores}
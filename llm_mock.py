@@ -0,0 +1,171 @@
+"""
+llm_mock.py — Proveedor LLM simulado, determinista y sin red
+============================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Permite hacer pruebas de carga y benchmarks de main.py / pipeline.py sin gastar
+cuota de API y sin la variabilidad de latencia de los proveedores reales.
+
+Activación (.env o panel lateral de la UI):
+    LLM_PROVIDER=mock
+    LLM_MODEL=mock-determinista
+
+Respuestas según el rol de la llamada (misma entrada → misma salida):
+  supervisor    → JSON válido {"rutas": [...], "justificacion": ...} por palabras clave
+  agente ReAct  → 1er turno: tool_calls a las tools enlazadas del dominio de la pregunta
+                  2º turno:  texto final que resume las salidas de las tools
+  sintetizador  → texto que integra las respuestas de los especialistas
+
+Latencia simulada (MOCK_LATENCIA_DIST):
+  "fija"      → siempre MOCK_LATENCIA_MS
+  "normal"    → N(MOCK_LATENCIA_MS, MOCK_LATENCIA_SIGMA · MOCK_LATENCIA_MS)
+  "lognormal" → mediana MOCK_LATENCIA_MS, sigma MOCK_LATENCIA_SIGMA (cola larga realista)
+La semilla se deriva de MOCK_SEED + el contenido de los mensajes: las corridas
+son reproducibles.
+
+Tokens: usage_metadata con ~4 chars/token de entrada; la salida usa
+MOCK_TOKENS_SALIDA si es > 0, o la longitud real del texto generado.
+"""
+
+import hashlib
+import json
+import random
+import sys
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+
+# Palabras clave por dominio — mismas rutas que el supervisor real
+_DOMINIOS: dict[str, tuple[str, ...]] = {
+    "trm":   ("dólar", "dolar", "trm", "tasa de cambio", "tipo de cambio", "devaluación",
+              "peso colombiano", "divisa"),
+    "datos": ("exporta", "importa", "balanza", "comercio exterior", "sector", "déficit",
+              "deficit", "superávit"),
+    "rag":   ("desempleo", "inflación", "inflacion", "ipc", "pib", "población", "poblacion",
+              "censo", "dane", "mercado laboral"),
+}
+
+# Tools preferidas por dominio (el resto de tools enlazadas se ignora)
+_TOOLS_POR_DOMINIO: dict[str, tuple[str, ...]] = {
+    "trm":   ("obtener_trm_actual", "analizar_historico_trm"),
+    "datos": ("consultar_balanza_comercial", "analizar_sectores_exportacion"),
+    "rag":   ("buscar_documentos_dane",),
+}
+
+
+def _texto(contenido) -> str:
+    """Contenido de un mensaje como texto (admite bloques tipo Anthropic)."""
+    if isinstance(contenido, str):
+        return contenido
+    return "".join(b.get("text", "") if isinstance(b, dict) else str(b) for b in contenido)
+
+
+def dominios_de(pregunta: str) -> list[str]:
+    """Dominios mencionados en la pregunta, en orden fijo trm → datos → rag."""
+    p = pregunta.lower()
+    return [d for d, claves in _DOMINIOS.items() if any(c in p for c in claves)]
+
+
+class ChatMock(BaseChatModel):
+    """Chat model determinista para pruebas de carga y CI sin red."""
+
+    model:       str   = "mock-determinista"
+    temperature: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model": self.model}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    # ------------------------------------------------------------------
+    # Generación
+    # ------------------------------------------------------------------
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        sistema  = next((_texto(m.content) for m in messages if isinstance(m, SystemMessage)), "")
+        pregunta = next((_texto(m.content) for m in messages if isinstance(m, HumanMessage)), "")
+        tools    = kwargs.get("tools") or []
+        resultados_tools = [m for m in messages if isinstance(m, ToolMessage)]
+
+        if '"rutas"' in sistema or "enrutador" in sistema.lower():
+            mensaje = AIMessage(content=self._responder_supervisor(pregunta))
+        elif tools and not resultados_tools:
+            mensaje = AIMessage(content="", tool_calls=self._elegir_tools(pregunta, tools))
+        elif resultados_tools:
+            mensaje = AIMessage(content=self._responder_con_tools(pregunta, resultados_tools))
+        else:
+            mensaje = AIMessage(content=self._sintetizar(pregunta))
+
+        entrada = sum(len(_texto(m.content)) for m in messages) + len(json.dumps(tools))
+        tokens_in  = max(1, entrada // 4)
+        tokens_out = config.MOCK_TOKENS_SALIDA or max(1, len(_texto(mensaje.content)) // 4)
+        mensaje.usage_metadata = {"input_tokens": tokens_in, "output_tokens": tokens_out,
+                                  "total_tokens": tokens_in + tokens_out}
+
+        time.sleep(self._latencia_s(messages))
+        return ChatResult(generations=[ChatGeneration(message=mensaje)])
+
+    def _latencia_s(self, messages) -> float:
+        huella = hashlib.sha256(
+            (str(config.MOCK_SEED) + "".join(_texto(m.content) for m in messages)).encode("utf-8")
+        ).hexdigest()
+        rng   = random.Random(int(huella[:16], 16))
+        media = config.MOCK_LATENCIA_MS
+        sigma = config.MOCK_LATENCIA_SIGMA
+        if config.MOCK_LATENCIA_DIST == "normal":
+            ms = rng.gauss(media, sigma * media)
+        elif config.MOCK_LATENCIA_DIST == "lognormal":
+            ms = rng.lognormvariate(0.0, sigma) * media
+        else:
+            ms = media
+        return max(0.0, ms) / 1000
+
+    def _responder_supervisor(self, pregunta: str) -> str:
+        dominios = dominios_de(pregunta.replace("Pregunta:", ""))
+        return json.dumps({
+            "rutas": dominios or ["rag"],
+            "justificacion": f"mock: dominios detectados {dominios or ['ninguno']}",
+        }, ensure_ascii=False)
+
+    def _elegir_tools(self, pregunta: str, tools: list[dict]) -> list[dict]:
+        disponibles = {t["function"]["name"]: t["function"] for t in tools}
+        elegidas = [nombre for d in dominios_de(pregunta) for nombre in _TOOLS_POR_DOMINIO[d]
+                    if nombre in disponibles]
+        if not elegidas:
+            elegidas = [next(iter(disponibles))]
+
+        llamadas = []
+        for i, nombre in enumerate(dict.fromkeys(elegidas)):
+            esquema   = disponibles[nombre].get("parameters", {})
+            argumentos = {}
+            for param, spec in esquema.get("properties", {}).items():
+                if param in esquema.get("required", []) and spec.get("type") == "string":
+                    argumentos[param] = pregunta
+            llamadas.append({"name": nombre, "args": argumentos, "id": f"mock_{i}_{nombre}"})
+        return llamadas
+
+    def _responder_con_tools(self, pregunta: str, resultados: list) -> str:
+        partes = [f"- {m.name}: {_texto(m.content)[:300]}" for m in resultados]
+        return (f"Respuesta simulada (mock) a: {pregunta}\n\n"
+                "Datos obtenidos de las herramientas:\n" + "\n".join(partes) +
+                "\n\nConclusión: respuesta generada sin LLM real para pruebas.")
+
+    def _sintetizar(self, contenido: str) -> str:
+        return ("Síntesis simulada (mock) de las respuestas de los especialistas.\n\n"
+                f"{contenido[:800]}\n\nConclusión: respuesta generada sin LLM real para pruebas.")
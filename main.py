@@ -18,6 +18,11 @@ Endpoints:
   POST /api/config         → guardar configuración
   GET  /api/modelos        → modelos disponibles por proveedor
 
+  GET  /api/datos/trm      → TRM más reciente          (payloads de las tools,
+  GET  /api/datos/trm/historico?meses= → histórico TRM   sin LLM; con ETag /
+  GET  /api/datos/balanza  → balanza comercial          Last-Modified y 304)
+  GET  /api/datos/sectores → exportaciones por sector
+
 Uso (desarrollo):
     python -m uvicorn main:app --host 0.0.0.0 --port 8001 --reload
 
@@ -33,23 +38,48 @@ import time
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
 
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from typing import Optional
 import csv
+import hashlib
 import io
 import json
+import os
 import shutil
+import uuid
 
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
 
 import config
+import agente_factory
+import checkpoints
+import columnar
+import compactar
+import consulta_sql
+import cubo_comercio
 import middleware
 import pipeline
 import database
+import datasets
+import enrutador
+import especulacion
+import hedging
+import limitador
+import memo
+import pool_procesos
+import presupuesto
+import prompt_cache
+import resiliencia
+import respuestas_rapidas
+import resumenes
+import serie_trm
+import tools_dinamicas
+import trazas
 
 # ---------------------------------------------------------------------------
 # Activar LangSmith si está configurado
@@ -86,14 +116,33 @@ templates = Jinja2Templates(directory=str(config.BASE_DIR / "templates"))
 
 @app.on_event("startup")
 async def startup_event():
-    """Inicializa SQLite al arrancar la API."""
+    """Inicializa SQLite, limpia checkpoints expirados y prepara resúmenes y tools de datos/."""
     database.init_db()
+    checkpoints.recolectar_expirados(forzar=True)
+    resumenes.materializar_todos()
+    tools_dinamicas.sincronizar()
+    cubo_comercio.construir()
+    pool_procesos.iniciar()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Cierra el pool de procesos de las tools de cálculo."""
+    pool_procesos.detener()
 
 
 # ---------------------------------------------------------------------------
 # Modelos Pydantic — Contratos de la API
 # ---------------------------------------------------------------------------
 
+class PresupuestoRequest(BaseModel):
+    """Límites del loop ReAct para una consulta (los omitidos salen de config; 0 = sin límite)."""
+    max_tools:  Optional[int]   = Field(default=None, ge=0, description="Llamadas a tools")
+    max_turnos: Optional[int]   = Field(default=None, ge=0, description="Turnos del LLM")
+    max_tokens: Optional[int]   = Field(default=None, ge=0, description="Tokens del LLM")
+    deadline_s: Optional[float] = Field(default=None, ge=0, description="Segundos máximos")
+
+
 class ConsultaRequest(BaseModel):
     """Cuerpo del request POST /consulta."""
     pregunta: str = Field(
@@ -117,6 +166,16 @@ class ConsultaRequest(BaseModel):
         default=None,
         description="Prompts personalizados para esta consulta (sobreescriben los de SQLite)",
     )
+    id_solicitud: Optional[str] = Field(
+        default=None,
+        max_length=128,
+        description="Id de la solicitud. Al reintentar con el mismo id tras un error, "
+                    "se reanuda desde el último nodo completado",
+    )
+    presupuesto: Optional[PresupuestoRequest] = Field(
+        default=None,
+        description="Límites del loop ReAct; al agotarse se devuelve una respuesta parcial",
+    )
 
 
 class ConsultaResponse(BaseModel):
@@ -131,6 +190,12 @@ class ConsultaResponse(BaseModel):
     modelo:             str
     backend:            str
     version:            str
+    via:                str = "agente"   # "rapida" = respondida por plantilla, sin LLM
+    plantilla:          str = ""
+    memo_tools:         dict = {}        # aciertos de la memo de tools en esta request
+    id_solicitud:       str = ""         # reusar en un reintento para reanudar
+    desglose:           Optional[dict] = None   # tiempos por nodo / LLM / tool (trazas.py)
+    presupuesto:        dict = {}        # límites, consumo y motivo si se agotó (presupuesto.py)
 
 
 class HealthResponse(BaseModel):
@@ -161,8 +226,11 @@ class VersionResponse(BaseModel):
 
 @app.post("/consulta", response_model=ConsultaResponse, tags=["Agente"],
           summary="Consultar al agente")
-async def consultar(req: ConsultaRequest) -> ConsultaResponse:
+def consultar(req: ConsultaRequest) -> ConsultaResponse:
     """Procesa una consulta a través del pipeline de producción."""
+    # def (no async): FastAPI la corre en su threadpool. El pipeline es
+    # bloqueante (LLM, tools, espera en la cola de limitador.py) y en el event
+    # loop frenaría /health, /metricas y /api/datos/* mientras tanto
     backend = req.backend if req.backend in ("langchain", "langgraph") else "langgraph"
 
     # Activar LangSmith dinámicamente (SQLite > .env)
@@ -177,16 +245,28 @@ async def consultar(req: ConsultaRequest) -> ConsultaResponse:
     else:
         os.environ["LANGCHAIN_TRACING_V2"] = "false"
 
+    # El id viaja en el header X-Id-Solicitud de los errores para poder reanudar
+    id_solicitud = req.id_solicitud or uuid.uuid4().hex
+    cabeceras    = {"X-Id-Solicitud": id_solicitud}
+
     try:
         resultado = pipeline.procesar_consulta(
             pregunta=req.pregunta,
             temperatura=req.temperatura,
             backend=backend,
             prompts=req.prompts,
+            id_solicitud=id_solicitud,
+            presupuesto=req.presupuesto.model_dump(exclude_none=True) if req.presupuesto else None,
         )
+    except checkpoints.SolicitudEnConflicto as e:
+        raise HTTPException(status_code=409, detail=f"[SolicitudEnConflicto] {e}",
+                            headers=cabeceras)
+    except resiliencia.ProveedoresAgotados as e:
+        raise HTTPException(status_code=503, detail=f"[ProveedoresAgotados] {e}",
+                            headers=cabeceras)
     except Exception as e:
         tipo = type(e).__name__
-        raise HTTPException(status_code=500, detail=f"[{tipo}] {e}")
+        raise HTTPException(status_code=500, detail=f"[{tipo}] {e}", headers=cabeceras)
 
     return ConsultaResponse(
         respuesta=resultado["respuesta"],
@@ -199,6 +279,12 @@ async def consultar(req: ConsultaRequest) -> ConsultaResponse:
         modelo=resultado["modelo"],
         backend=resultado["backend"],
         version=config.API_VERSION,
+        via=resultado["via"],
+        plantilla=resultado["plantilla"],
+        memo_tools=resultado["memo_tools"],
+        id_solicitud=resultado["id_solicitud"],
+        desglose=resultado.get("desglose"),
+        presupuesto=resultado.get("presupuesto") or {},
     )
 
 
@@ -217,7 +303,28 @@ async def health() -> HealthResponse:
 
 @app.get("/metricas", tags=["Operaciones"], summary="Métricas operativas")
 async def metricas() -> dict:
-    return middleware.calcular_metricas()
+    resultado = middleware.calcular_metricas()
+    resultado["resiliencia"] = resiliencia.estado()
+    resultado["hedging"]     = hedging.estado()
+    resultado["limitador"]   = limitador.estado()
+    resultado["cache_prompt"] = prompt_cache.estado()
+    resultado["cache_agentes"] = agente_factory.estado()
+    resultado["enrutador"]     = enrutador.estado()
+    resultado["via_rapida"]    = respuestas_rapidas.estado()
+    resultado["memo_tools"]    = memo.estado()
+    resultado["checkpoints"]   = checkpoints.estado()
+    resultado["especulacion"]  = especulacion.estado()
+    resultado["salida_tools"]  = compactar.estado()
+    resultado["trazas"]        = trazas.estado()
+    resultado["presupuesto"]   = presupuesto.estado()
+    resultado["datasets"]      = datasets.estado()
+    resultado["sql"]           = consulta_sql.estado()
+    resultado["serie_trm"]     = serie_trm.estado()
+    resultado["resumenes"]     = resumenes.estado()
+    resultado["tools_dinamicas"] = tools_dinamicas.estado()
+    resultado["cubo_comercio"] = cubo_comercio.estado()
+    resultado["pool_procesos"] = pool_procesos.estado()
+    return resultado
 
 
 @app.get("/historial", tags=["Operaciones"], summary="Historial de consultas")
@@ -371,8 +478,34 @@ async def upload_archivo(carpeta: str, archivo: UploadFile = File(...)) -> dict:
     if carpeta not in ("datos", "documentos"):
         raise HTTPException(status_code=400, detail="carpeta debe ser 'datos' o 'documentos'")
     destino = (_DATOS_DIR if carpeta == "datos" else _DOCS_DIR) / archivo.filename
-    with open(destino, "wb") as f:
-        shutil.copyfileobj(archivo.file, f)
+    columnar_csv = carpeta == "datos" and destino.suffix.lower() == ".csv" and columnar.disponible()
+
+    # Se escribe aparte y se valida antes de reemplazar: una subida inválida
+    # no toca el archivo vigente ni sus caches (Arrow, resumen, datasets)
+    temporal = destino.with_name(f".{destino.name}.subida")
+    try:
+        with open(temporal, "wb") as f:
+            shutil.copyfileobj(archivo.file, f)
+        if columnar_csv:
+            columnar.validar_archivo(temporal, destino.name)
+        os.replace(temporal, destino)
+    except columnar.EsquemaInvalido as e:
+        raise HTTPException(status_code=400, detail=f"[EsquemaInvalido] {e}")
+    finally:
+        temporal.unlink(missing_ok=True)
+
+    if carpeta == "datos":
+        if columnar_csv:
+            columnar.ingerir(destino.name)   # ya validado: solo escribe la versión Arrow
+        datasets.invalidar(archivo.filename)   # las tools releen la nueva versión
+        if destino.suffix.lower() == ".csv":
+            try:
+                resumenes.materializar(destino.name)
+            except Exception as e:
+                print(f"  [RESUMENES] {destino.name}: {type(e).__name__}: {e}")
+            tools_dinamicas.sincronizar()   # tools describir_/filtrar_/agregar_ del CSV nuevo
+            if destino.name.startswith(cubo_comercio.PREFIJO):
+                cubo_comercio.construir()     # preagregados del detalle de comercio
     return {"ok": True, "nombre": archivo.filename}
 
 
@@ -385,9 +518,108 @@ async def eliminar_archivo(carpeta: str, nombre: str) -> dict:
     if not ruta.exists() or not ruta.is_file():
         raise HTTPException(status_code=404, detail=f"Archivo no encontrado: {nombre}")
     ruta.unlink()
+    if carpeta == "datos":
+        datasets.invalidar(nombre)
+        columnar.eliminar(nombre)
+        resumenes.eliminar(nombre)
+        tools_dinamicas.sincronizar()
+        if nombre.startswith(cubo_comercio.PREFIJO):
+            cubo_comercio.construir()
     return {"ok": True, "nombre": nombre}
 
 
+# ---------------------------------------------------------------------------
+# Datos directos para dashboards — mismos payloads que las tools, sin LLM
+# ---------------------------------------------------------------------------
+# ETag = huella de las versiones de los CSV de origen (y de los parámetros);
+# Last-Modified = mtime más reciente de esos CSV. Si el cliente repite la
+# petición con If-None-Match / If-Modified-Since y nada cambió, recibe 304 sin
+# que se calcule ni serialice el payload.
+
+_cuerpos: dict[str, tuple[str, bytes]] = {}   # ruta + parámetros → (ETag, JSON)
+_MAX_CUERPOS = 256
+
+
+def _validadores(archivos: list[str], *parametros) -> tuple[str, datetime]:
+    """(ETag, Last-Modified) de los CSV de origen; FileNotFoundError si falta alguno."""
+    if not archivos:
+        raise FileNotFoundError("no hay archivos de origen en datos/")
+    huella = [f"{n}:{datasets.version(n)}" for n in archivos] + [str(p) for p in parametros]
+    etag   = '"' + hashlib.sha1("|".join(huella).encode()).hexdigest()[:16] + '"'
+    mtime  = max((_DATOS_DIR / n).stat().st_mtime for n in archivos)
+    return etag, datetime.fromtimestamp(int(mtime), tz=timezone.utc)
+
+
+def _no_modificado(request: Request, etag: str, modificado: datetime) -> bool:
+    """If-None-Match tiene prioridad sobre If-Modified-Since (RFC 9110)."""
+    si_no_coincide = request.headers.get("if-none-match")
+    if si_no_coincide is not None:
+        etiquetas = [e.strip().removeprefix("W/") for e in si_no_coincide.split(",")]
+        return "*" in etiquetas or etag in etiquetas
+    si_modificado = request.headers.get("if-modified-since")
+    if si_modificado:
+        try:
+            return modificado <= parsedate_to_datetime(si_modificado)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _respuesta_datos(request: Request, archivos: list[str], calcular, *parametros) -> Response:
+    """200 con el payload de calcular() (cacheado por ETag) o 304 si el cliente ya lo tiene."""
+    try:
+        etag, modificado = _validadores(archivos, *parametros)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Datos no disponibles: {e}")
+    cabeceras = {"ETag": etag, "Last-Modified": format_datetime(modificado, usegmt=True),
+                 "Cache-Control": "no-cache"}
+    if _no_modificado(request, etag, modificado):
+        return Response(status_code=304, headers=cabeceras)
+
+    clave    = f"{request.url.path}|{'|'.join(map(str, parametros))}"
+    guardado = _cuerpos.get(clave)
+    if guardado is None or guardado[0] != etag:
+        try:
+            cuerpo = json.dumps(calcular(), ensure_ascii=False).encode("utf-8")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if len(_cuerpos) >= _MAX_CUERPOS:
+            _cuerpos.clear()
+        _cuerpos[clave] = guardado = (etag, cuerpo)
+    return Response(content=guardado[1], media_type="application/json", headers=cabeceras)
+
+
+@app.get("/api/datos/trm", tags=["Datos"], summary="TRM más reciente (payload de obtener_trm_actual)")
+async def datos_trm(request: Request) -> Response:
+    return _respuesta_datos(request, ["trm_2024.csv"],
+                            lambda: resumenes.obtener("trm_2024.csv"))
+
+
+@app.get("/api/datos/trm/historico", tags=["Datos"],
+         summary="Histórico de la TRM (payload de analizar_historico_trm)")
+async def datos_trm_historico(request: Request, meses: int = 6, desde: str = "",
+                              hasta: str = "") -> Response:
+    if meses < 1:
+        raise HTTPException(status_code=400, detail="meses debe ser mayor o igual a 1")
+    return _respuesta_datos(request, serie_trm.archivos(),
+                            lambda: serie_trm.historico(meses, desde, hasta),
+                            meses, desde, hasta)
+
+
+@app.get("/api/datos/balanza", tags=["Datos"],
+         summary="Balanza comercial (payload de consultar_balanza_comercial)")
+async def datos_balanza(request: Request) -> Response:
+    return _respuesta_datos(request, ["comercio_exterior_2024.csv"],
+                            lambda: resumenes.obtener("comercio_exterior_2024.csv"))
+
+
+@app.get("/api/datos/sectores", tags=["Datos"],
+         summary="Exportaciones por sector (payload de analizar_sectores_exportacion)")
+async def datos_sectores(request: Request) -> Response:
+    return _respuesta_datos(request, ["exportaciones_sectores_2024.csv"],
+                            lambda: resumenes.obtener("exportaciones_sectores_2024.csv"))
+
+
 # ---------------------------------------------------------------------------
 # Workflow n8n
 # ---------------------------------------------------------------------------
@@ -0,0 +1,211 @@
+"""
+memo.py — Memoización de tools por request
+==========================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Dentro de UNA consulta la misma tool se llama varias veces con los mismos
+argumentos: el especialista RAG siempre empieza con listar_reportes_dane(), los
+loops ReAct repiten llamadas y, con el fan-out, dos especialistas pueden pedir
+lo mismo al mismo tiempo. Este módulo deduplica esas llamadas:
+
+  - Una MemoSolicitud por request: (tool, argumentos normalizados) → resultado.
+  - Llamadas idénticas concurrentes esperan a la primera en vez de repetirla.
+  - La memo vive solo lo que dura la request (no es una caché global: los
+    datos pueden cambiar entre requests).
+
+Cómo viaja la memo:
+  - pipeline / ejecutar_agente abren la memo con solicitud() → id_memo.
+  - El grafo multi-agente lleva id_memo en su estado; cada nodo especialista
+    la activa con usar(id_memo). (El estado solo guarda el id: el objeto no es
+    serializable y no debe ir a un checkpoint.)
+  - Las tools la encuentran a través de un contextvar, que LangChain propaga
+    al ejecutor de tools.
+
+Uso en tools.py (el decorador va DEBAJO de @tool):
+    @tool
+    @memo.memoizar
+    def obtener_trm_actual() -> str: ...
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import sys
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+
+class MemoSolicitud:
+    """Resultados de tools de una request, con conteo de aciertos por tool."""
+
+    def __init__(self):
+        self.id          = uuid.uuid4().hex
+        self._datos:     dict[tuple, str]             = {}
+        self._en_curso:  dict[tuple, threading.Event] = {}
+        self.aciertos    = Counter()
+        self.ejecuciones = Counter()
+        self._lock       = threading.Lock()
+
+    def obtener_o_calcular(self, clave: tuple, calcular) -> str:
+        tool = clave[0]
+        with self._lock:
+            if clave in self._datos:
+                self.aciertos[tool] += 1
+                return self._datos[clave]
+            evento = self._en_curso.get(clave)
+            if evento is None:
+                evento = self._en_curso[clave] = threading.Event()
+                propio = True
+            else:
+                propio = False
+
+        if not propio:
+            # Otra rama ya está calculando lo mismo: esperar su resultado
+            evento.wait()
+            with self._lock:
+                if clave in self._datos:
+                    self.aciertos[tool] += 1
+                    return self._datos[clave]
+            # La primera llamada falló o devolvió error: calcular aparte
+            with self._lock:
+                self.ejecuciones[tool] += 1
+            return calcular()
+
+        try:
+            resultado = calcular()
+            with self._lock:
+                self.ejecuciones[tool] += 1
+                if not _es_error(resultado):
+                    self._datos[clave] = resultado
+            return resultado
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+            evento.set()
+
+    def resumen(self) -> dict:
+        with self._lock:
+            aciertos, ejecuciones = dict(self.aciertos), dict(self.ejecuciones)
+        return {
+            "aciertos":  sum(aciertos.values()),
+            "llamadas":  sum(aciertos.values()) + sum(ejecuciones.values()),
+            "por_tool":  {t: {"aciertos": aciertos.get(t, 0), "ejecuciones": ejecuciones.get(t, 0)}
+                          for t in sorted(set(aciertos) | set(ejecuciones))},
+        }
+
+
+def _es_error(resultado) -> bool:
+    """Las tools devuelven {"error": ...} ante fallos: eso no se memoiza."""
+    return isinstance(resultado, str) and resultado.lstrip().startswith('{"error"')
+
+
+# ---------------------------------------------------------------------------
+# Registro de memos activas y contextvar
+# ---------------------------------------------------------------------------
+
+_memo_actual: contextvars.ContextVar[MemoSolicitud | None] = contextvars.ContextVar(
+    "memo_actual", default=None
+)
+_memos: dict[str, MemoSolicitud] = {}
+_memos_lock = threading.Lock()
+_global = {"solicitudes": 0, "aciertos": Counter(), "ejecuciones": Counter()}
+
+
+def actual() -> MemoSolicitud | None:
+    return _memo_actual.get()
+
+
+@contextmanager
+def usar(id_memo: str):
+    """Activa la memo id_memo en este contexto (no-op si no existe)."""
+    with _memos_lock:
+        m = _memos.get(id_memo)
+    if m is None:
+        yield None
+        return
+    token = _memo_actual.set(m)
+    try:
+        yield m
+    finally:
+        _memo_actual.reset(token)
+
+
+@contextmanager
+def solicitud():
+    """
+    Memo de la request actual. Si ya hay una activa (p. ej. la abrió el
+    pipeline) se reutiliza; si no, se crea y se cierra al salir.
+    """
+    existente = _memo_actual.get()
+    if existente is not None:
+        yield existente
+        return
+
+    m = MemoSolicitud()
+    with _memos_lock:
+        _memos[m.id] = m
+    token = _memo_actual.set(m)
+    try:
+        yield m
+    finally:
+        _memo_actual.reset(token)
+        with _memos_lock:
+            _memos.pop(m.id, None)
+            _global["solicitudes"] += 1
+            _global["aciertos"].update(m.aciertos)
+            _global["ejecuciones"].update(m.ejecuciones)
+
+
+# ---------------------------------------------------------------------------
+# Decorador
+# ---------------------------------------------------------------------------
+
+def memoizar(func):
+    """
+    Deduplica llamadas a func dentro de la request activa. Los argumentos se
+    normalizan con la firma (defaults incluidos): f() y f(meses=6) son la misma
+    llamada. Sin memo activa, llama a func directamente.
+    """
+    firma = inspect.signature(func)
+
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        m = _memo_actual.get()
+        if m is None:
+            return func(*args, **kwargs)
+        ligados = firma.bind(*args, **kwargs)
+        ligados.apply_defaults()
+        clave = (func.__name__,
+                 json.dumps(ligados.arguments, sort_keys=True, ensure_ascii=False, default=str))
+        return m.obtener_o_calcular(clave, lambda: func(*args, **kwargs))
+
+    return envoltura
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Aciertos acumulados de la memo de tools (todas las requests cerradas)."""
+    with _memos_lock:
+        aciertos    = dict(_global["aciertos"])
+        ejecuciones = dict(_global["ejecuciones"])
+        solicitudes = _global["solicitudes"]
+        activas     = len(_memos)
+    total_aciertos = sum(aciertos.values())
+    total          = total_aciertos + sum(ejecuciones.values())
+    return {
+        "solicitudes":         solicitudes,
+        "solicitudes_activas": activas,
+        "aciertos":            total_aciertos,
+        "ejecuciones":         sum(ejecuciones.values()),
+        "tasa_acierto":        round(total_aciertos / total, 3) if total else 0.0,
+        "aciertos_por_tool":   aciertos,
+    }
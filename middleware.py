@@ -70,22 +70,28 @@ def registrar_consulta(
     tokens_out:  int,
     costo_usd:   float,
     backend:     str = "langgraph",
+    modelo:      str | None = None,
+    desglose:    dict | None = None,
 ) -> None:
     """
     Guarda un registro de la consulta en:
       1. SQLite (agente_config.db) — BD operacional principal
       2. logs/consultas.jsonl      — backup legible / exportable
+
+    modelo: "proveedor/modelo"; si es None se usa el proveedor activo.
+    desglose: tiempos por nodo / LLM / tool de trazas.py (opcional).
     """
     ts = datetime.now().isoformat()
-    # Proveedor/modelo dinámico (SQLite > .env)
-    try:
-        db_cfg   = database.get_all_config()
-        provider = db_cfg.get("llm_provider", "") or config.LLM_PROVIDER
-        model    = db_cfg.get("llm_model",    "") or config.LLM_MODEL
-    except Exception:
-        provider = config.LLM_PROVIDER
-        model    = config.LLM_MODEL
-    modelo = f"{provider}/{model}"
+    if modelo is None:
+        # Proveedor/modelo dinámico (SQLite > .env)
+        try:
+            db_cfg   = database.get_all_config()
+            provider = db_cfg.get("llm_provider", "") or config.LLM_PROVIDER
+            model    = db_cfg.get("llm_model",    "") or config.LLM_MODEL
+        except Exception:
+            provider = config.LLM_PROVIDER
+            model    = config.LLM_MODEL
+        modelo = f"{provider}/{model}"
 
     # 1. SQLite — fuente primaria
     try:
@@ -95,6 +101,7 @@ def registrar_consulta(
             tokens_in=tokens_in, tokens_out=tokens_out,
             costo_usd=round(costo_usd, 6),
             modelo=modelo, backend=backend,
+            desglose=json.dumps(desglose, ensure_ascii=False) if desglose else "",
         )
     except Exception:
         pass  # no bloquear la respuesta si SQLite falla
@@ -112,6 +119,8 @@ def registrar_consulta(
         "modelo":      modelo,
         "backend":     backend,
     }
+    if desglose:
+        registro["desglose"] = desglose
     with open(LOGS_FILE, "a", encoding="utf-8") as f:
         f.write(json.dumps(registro, ensure_ascii=False) + "\n")
 
@@ -8,11 +8,19 @@ Soporta dos backends de agente:
   - "langchain" → agente_langchain.py (ReAct con todas las tools)
   - "langgraph" → agente_langgraph.py (Supervisor + 3 especialistas)
 
-Arquitectura (3 nodos lineales):
+Con checkpoints.py cada request se guarda por id_solicitud: un reintento con
+el mismo id reanuda desde el último nodo completado.
+
+Con trazas.py cada request lleva el desglose de tiempos por nodo, llamada LLM
+y tool (campo desglose de la respuesta y del registro de la consulta).
+
+Arquitectura:
   START
     ↓
+  nodo_via_rapida        → ¿pregunta de plantilla? responde desde la tool (sin LLM)
+    ↓ (si no aplica)          ↓ (si aplica, salta el agente)
   nodo_ejecutar_agente   → llama al agente seleccionado
-    ↓
+    ↓                         ↓
   nodo_calcular_metricas → estima tokens y costo USD
     ↓
   nodo_registrar         → guarda en SQLite y logs/consultas.jsonl
@@ -22,6 +30,7 @@ Arquitectura (3 nodos lineales):
 
 import sys
 import time
+import uuid
 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
@@ -32,7 +41,14 @@ from typing import TypedDict
 from langgraph.graph import StateGraph, END
 
 import middleware
+import checkpoints
 import config
+import memo
+import presupuesto
+import trazas
+
+# Modelo que se reporta/registra cuando la consulta no usa LLM
+MODELO_VIA_RAPIDA = "sin_llm/plantilla"
 
 
 def _modelo_activo() -> str:
@@ -53,6 +69,7 @@ def _modelo_activo() -> str:
 
 class EstadoConsulta(TypedDict):
     """Estado compartido entre los nodos del pipeline."""
+    id_solicitud: str   # clave del checkpoint (reanudación)
     pregunta:    str
     backend:     str    # "langchain" | "langgraph"
     temperatura: float
@@ -63,34 +80,65 @@ class EstadoConsulta(TypedDict):
     tokens_out:  int
     costo_usd:   float
     timestamp:   str
+    via:         str    # "agente" | "rapida"
+    plantilla:   str    # plantilla usada por la vía rápida ("" si via = "agente")
+    memo_tools:  dict   # aciertos de la memo de tools de esta request (memo.py)
+    presupuesto: dict   # límites del loop ReAct pedidos en la request (presupuesto.py)
+    presupuesto_uso: dict   # límites, consumo y motivo de agotamiento ("" si no se agotó)
 
 
 # ---------------------------------------------------------------------------
 # Nodos del pipeline
 # ---------------------------------------------------------------------------
 
+def nodo_via_rapida(estado: EstadoConsulta) -> dict:
+    """Nodo 0: Responde preguntas de plantilla directamente desde las tools."""
+    if not config.VIA_RAPIDA_ENABLED:
+        return {"via": "agente"}
+
+    import respuestas_rapidas
+    rapida = respuestas_rapidas.intentar(estado["pregunta"])
+    if rapida is None:
+        return {"via": "agente"}
+
+    return {
+        "via":         "rapida",
+        "plantilla":   rapida["plantilla"],
+        "respuesta":   rapida["respuesta"],
+        "latencia_ms": rapida["latencia_ms"],
+        "timestamp":   datetime.now().isoformat(),
+    }
+
+
+def enrutar_via(estado: EstadoConsulta) -> str:
+    return "calcular_metricas" if estado.get("via") == "rapida" else "ejecutar_agente"
+
+
 def nodo_ejecutar_agente(estado: EstadoConsulta) -> dict:
     """Nodo 1: Invoca el agente seleccionado y mide la latencia."""
     inicio      = time.time()
     backend     = estado.get("backend", "langgraph")
     prompts_raw = estado.get("prompts") or {}
 
-    if backend == "langchain":
-        import agente_langchain
-        system_prompt = prompts_raw.get("langchain_main") or None
-        respuesta = agente_langchain.ejecutar_agente(
-            pregunta=estado["pregunta"], silencioso=True,
-            system_prompt=system_prompt,
-        )
-    else:
-        import agente_langgraph
-        lg_prompts = {k.replace("langgraph_", ""): v
-                      for k, v in prompts_raw.items()
-                      if k.startswith("langgraph_")} or None
-        respuesta = agente_langgraph.ejecutar_agente(
-            pregunta=estado["pregunta"], silencioso=True,
-            prompts=lg_prompts,
-        )
+    # Una memo de tools y un presupuesto ReAct por request, compartidos por todos los agentes
+    with memo.solicitud() as memo_tools, \
+            presupuesto.solicitud(estado.get("presupuesto")) as pres:
+        if backend == "langchain":
+            import agente_langchain
+            system_prompt = prompts_raw.get("langchain_main") or None
+            respuesta = agente_langchain.ejecutar_agente(
+                pregunta=estado["pregunta"], silencioso=True,
+                system_prompt=system_prompt,
+            )
+        else:
+            import agente_langgraph
+            lg_prompts = {k.replace("langgraph_", ""): v
+                          for k, v in prompts_raw.items()
+                          if k.startswith("langgraph_")} or None
+            respuesta = agente_langgraph.ejecutar_agente(
+                pregunta=estado["pregunta"], silencioso=True,
+                prompts=lg_prompts, id_solicitud=estado.get("id_solicitud") or None,
+            )
 
     latencia_ms = (time.time() - inicio) * 1000
 
@@ -98,11 +146,17 @@ def nodo_ejecutar_agente(estado: EstadoConsulta) -> dict:
         "respuesta":   respuesta,
         "latencia_ms": round(latencia_ms, 1),
         "timestamp":   datetime.now().isoformat(),
+        "memo_tools":  memo_tools.resumen(),
+        "presupuesto_uso": pres.resumen(),
     }
 
 
 def nodo_calcular_metricas(estado: EstadoConsulta) -> dict:
     """Nodo 2: Estima tokens y calcula el costo USD del request."""
+    if estado.get("via") == "rapida":
+        # Sin LLM: no hay tokens facturables
+        return {"tokens_in": 0, "tokens_out": 0, "costo_usd": 0.0}
+
     tokens_in  = middleware.estimar_tokens(estado["pregunta"])
     tokens_out = middleware.estimar_tokens(estado["respuesta"])
     costo_usd  = middleware.calcular_costo(tokens_in, tokens_out)
@@ -116,6 +170,8 @@ def nodo_calcular_metricas(estado: EstadoConsulta) -> dict:
 
 def nodo_registrar(estado: EstadoConsulta) -> dict:
     """Nodo 3: Persiste el registro en SQLite y logs/consultas.jsonl."""
+    rapida = estado.get("via") == "rapida"
+    traza  = trazas.actual()
     middleware.registrar_consulta(
         pregunta=estado["pregunta"],
         respuesta=estado["respuesta"],
@@ -123,7 +179,9 @@ def nodo_registrar(estado: EstadoConsulta) -> dict:
         tokens_in=estado["tokens_in"],
         tokens_out=estado["tokens_out"],
         costo_usd=estado["costo_usd"],
-        backend=estado.get("backend", "langgraph"),
+        backend="rapida" if rapida else estado.get("backend", "langgraph"),
+        modelo=MODELO_VIA_RAPIDA if rapida else None,
+        desglose=traza.desglose() if traza else None,
     )
     return {}
 
@@ -132,20 +190,26 @@ def nodo_registrar(estado: EstadoConsulta) -> dict:
 # Construir el grafo
 # ---------------------------------------------------------------------------
 
-def construir_pipeline():
+def construir_pipeline(checkpointer=None):
     """Construye y compila el grafo de producción."""
     grafo = StateGraph(EstadoConsulta)
 
-    grafo.add_node("ejecutar_agente",   nodo_ejecutar_agente)
-    grafo.add_node("calcular_metricas", nodo_calcular_metricas)
-    grafo.add_node("registrar",         nodo_registrar)
+    grafo.add_node("via_rapida",        trazas.nodo("via_rapida",        nodo_via_rapida))
+    grafo.add_node("ejecutar_agente",   trazas.nodo("ejecutar_agente",   nodo_ejecutar_agente))
+    grafo.add_node("calcular_metricas", trazas.nodo("calcular_metricas", nodo_calcular_metricas))
+    grafo.add_node("registrar",         trazas.nodo("registrar",         nodo_registrar))
 
-    grafo.set_entry_point("ejecutar_agente")
+    grafo.set_entry_point("via_rapida")
+    grafo.add_conditional_edges(
+        "via_rapida",
+        enrutar_via,
+        {"ejecutar_agente": "ejecutar_agente", "calcular_metricas": "calcular_metricas"},
+    )
     grafo.add_edge("ejecutar_agente",   "calcular_metricas")
     grafo.add_edge("calcular_metricas", "registrar")
     grafo.add_edge("registrar",         END)
 
-    return grafo.compile()
+    return grafo.compile(checkpointer=checkpointer)
 
 
 _pipeline_app = None
@@ -154,7 +218,7 @@ _pipeline_app = None
 def obtener_pipeline():
     global _pipeline_app
     if _pipeline_app is None:
-        _pipeline_app = construir_pipeline()
+        _pipeline_app = construir_pipeline(checkpointer=checkpoints.obtener_saver())
     return _pipeline_app
 
 
@@ -164,16 +228,29 @@ def obtener_pipeline():
 
 def procesar_consulta(pregunta: str, temperatura: float = 0.2,
                       backend: str = "langgraph",
-                      prompts: dict | None = None) -> dict:
+                      prompts: dict | None = None,
+                      id_solicitud: str | None = None,
+                      presupuesto: dict | None = None) -> dict:
     """
     Procesa una consulta pasándola por el pipeline completo.
 
+    id_solicitud: si se repite el id de una solicitud que falló, se reanuda
+    desde el último nodo completado; si ya había terminado, se devuelve el
+    mismo resultado. Si es None se genera uno nuevo.
+
+    presupuesto: límites del loop ReAct para esta request (max_tools,
+    max_turnos, max_tokens, deadline_s); los que falten salen de config.
+
     Retorna dict con: respuesta, latencia_ms, tokens_in, tokens_out,
-                      costo_usd, timestamp, modelo, backend
+                      costo_usd, timestamp, modelo, backend, via, plantilla,
+                      memo_tools, id_solicitud, desglose (None sin trazas),
+                      presupuesto (límites, consumo y motivo de agotamiento)
     """
-    app = obtener_pipeline()
+    app          = obtener_pipeline()
+    id_solicitud = id_solicitud or uuid.uuid4().hex
 
     estado_inicial: EstadoConsulta = {
+        "id_solicitud": id_solicitud,
         "pregunta":    pregunta,
         "backend":     backend,
         "temperatura": temperatura,
@@ -184,9 +261,16 @@ def procesar_consulta(pregunta: str, temperatura: float = 0.2,
         "tokens_out":  0,
         "costo_usd":   0.0,
         "timestamp":   "",
+        "via":         "agente",
+        "plantilla":   "",
+        "memo_tools":  {},
+        "presupuesto": presupuesto or {},
+        "presupuesto_uso": {},
     }
 
-    estado_final = app.invoke(estado_inicial)
+    with trazas.solicitud() as traza:
+        estado_final = checkpoints.ejecutar(app, "pipeline", id_solicitud, estado_inicial)
+    rapida       = estado_final["via"] == "rapida"
 
     return {
         "respuesta":    estado_final["respuesta"],
@@ -196,8 +280,14 @@ def procesar_consulta(pregunta: str, temperatura: float = 0.2,
         "tokens_total": estado_final["tokens_in"] + estado_final["tokens_out"],
         "costo_usd":    estado_final["costo_usd"],
         "timestamp":    estado_final["timestamp"],
-        "modelo":       _modelo_activo(),
+        "modelo":       MODELO_VIA_RAPIDA if rapida else _modelo_activo(),
         "backend":      backend,
+        "via":          estado_final["via"],
+        "plantilla":    estado_final["plantilla"],
+        "memo_tools":   estado_final["memo_tools"],
+        "id_solicitud": id_solicitud,
+        "desglose":     traza.desglose() if traza else None,
+        "presupuesto":  estado_final.get("presupuesto_uso", {}),
     }
 
 
@@ -0,0 +1,267 @@
+"""
+pool_procesos.py — Pool de procesos caliente para tools de cálculo (CPU)
+========================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Las tools de análisis (serie TRM, TRM vs comercio, cubo) hacen trabajo
+NumPy/pandas en el hilo de la request. Con datasets grandes ese trabajo
+retiene el GIL y frena a todas las requests concurrentes del proceso.
+
+Con POOL_PROCESOS_ENABLED=true las tools de POOL_PROCESOS_TOOLS se ejecutan
+en un ProcessPoolExecutor que se arranca con la API:
+
+  - Los workers quedan calientes: al iniciar importan tools.py y abren los
+    datasets (serie TRM, cubo) una vez; después solo se recargan si cambia la
+    versión del CSV (datasets.py y los caches derivados ya lo verifican).
+  - Los datos NO viajan entre procesos: cada worker abre los mismos archivos
+    Arrow IPC de datos/.columnar/ con memory-map, así que las páginas las
+    comparte el sistema operativo. Solo se serializan los argumentos de la
+    tool y el texto JSON que retorna.
+  - Si el pool se rompe (un worker muere), se recrea y la llamada se
+    ejecuta en el proceso de la API. Si supera POOL_PROCESOS_TIMEOUT_S la
+    tool retorna un error (el worker termina la tarea en segundo plano).
+
+Las métricas propias de cada módulo (compactar, cubo, serie_trm) de las
+tareas del pool se cuentan en el worker, no en GET /metricas de la API.
+
+Uso en tools.py (el decorador va DEBAJO de @memo.memoizar, para que los
+aciertos de la memo no pasen por el pool):
+    @tool
+    @memo.memoizar
+    @pool_procesos.en_pool
+    def analizar_historico_trm(...) -> str: ...
+"""
+
+import functools
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as TimeoutFuturo
+from concurrent.futures.process import BrokenProcessPool
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+# Funciones originales (sin envoltura) por nombre; cada proceso las registra
+# al importar su módulo
+_funciones: dict[str, callable] = {}
+
+_lock  = threading.Lock()
+_pool: dict = {"executor": None, "workers": 0, "inicio": None}
+_stats = {"tareas": 0, "locales": 0, "timeouts": 0, "errores": 0, "reinicios": 0,
+          "en_curso": 0, "ejecucion_ms": 0.0}
+_tools: dict[str, dict]  = {}
+_latencias: dict[str, deque] = {}
+
+
+# ---------------------------------------------------------------------------
+# Lado del worker
+# ---------------------------------------------------------------------------
+
+def _iniciar_worker(modulos: tuple[str, ...], barrera) -> None:
+    """Initializer de cada proceso: importa las tools y abre los datos una vez."""
+    for modulo in modulos:
+        importlib.import_module(modulo)
+
+    import cubo_comercio
+    import datasets
+    import serie_trm
+
+    for nombre in datasets.nombres():
+        try:
+            datasets.tabla_arrow(nombre)
+        except Exception:
+            pass
+    for calentar in (serie_trm.serie, cubo_comercio.cubo):
+        try:
+            calentar()
+        except Exception:
+            pass
+
+    # Ningún worker toma tareas hasta que todos estén listos (ver iniciar())
+    try:
+        barrera.wait(timeout=60)
+    except threading.BrokenBarrierError:
+        pass
+
+
+def _calentar() -> int:
+    return os.getpid()
+
+
+def _ejecutar(modulo: str, nombre: str, args: tuple, kwargs: dict) -> tuple[str, float]:
+    """Corre la tool en el worker; retorna (resultado, ms de ejecución)."""
+    if nombre not in _funciones:
+        importlib.import_module(modulo)
+    inicio = time.perf_counter()
+    resultado = _funciones[nombre](*args, **kwargs)
+    return resultado, (time.perf_counter() - inicio) * 1000
+
+
+# ---------------------------------------------------------------------------
+# Ciclo de vida (main.py: startup / shutdown)
+# ---------------------------------------------------------------------------
+
+def _num_workers() -> int:
+    if config.POOL_PROCESOS_WORKERS > 0:
+        return config.POOL_PROCESOS_WORKERS
+    return max(1, (os.cpu_count() or 2) - 1)   # un núcleo queda para la API
+
+
+def iniciar() -> None:
+    """Arranca el pool y espera a que todos los workers estén calientes."""
+    if not config.POOL_PROCESOS_ENABLED:
+        return
+    with _lock:
+        if _pool["executor"] is not None:
+            return
+        workers  = _num_workers()
+        modulos  = tuple(sorted({f.__module__ for n, f in _funciones.items()
+                                 if n in config.POOL_PROCESOS_TOOLS}))
+        # spawn: no hereda hilos ni locks del servidor (fork con hilos no es seguro)
+        contexto = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=contexto,
+                                       initializer=_iniciar_worker,
+                                       initargs=(modulos, contexto.Barrier(workers)))
+        _pool.update(executor=executor, workers=workers,
+                     inicio=_pool["inicio"] or time.perf_counter())
+
+    # Con la barrera del initializer, que una tarea termine implica que todos
+    # los workers ya abrieron los datos
+    inicio = time.perf_counter()
+    for futuro in [executor.submit(_calentar) for _ in range(workers)]:
+        futuro.result()
+    print(f"  [POOL] {workers} workers listos en {(time.perf_counter() - inicio) * 1000:.0f} ms "
+          f"· tools: {', '.join(config.POOL_PROCESOS_TOOLS)}")
+
+
+def detener() -> None:
+    with _lock:
+        executor, _pool["executor"] = _pool["executor"], None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _reiniciar(roto) -> None:
+    """Recrea el pool tras un BrokenProcessPool (solo una vez por pool roto)."""
+    with _lock:
+        if _pool["executor"] is not roto:
+            return
+        _pool["executor"] = None
+        _stats["reinicios"] += 1
+    roto.shutdown(wait=False, cancel_futures=True)
+    try:
+        iniciar()
+    except Exception as e:
+        print(f"  [POOL] no se pudo reiniciar: {type(e).__name__}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Decorador
+# ---------------------------------------------------------------------------
+
+def _registrar(tool: str, total_ms: float, ejecucion_ms: float) -> None:
+    with _lock:
+        if tool not in _tools:
+            _tools[tool] = {"tareas": 0, "suma_ms": 0.0, "suma_espera_ms": 0.0}
+            _latencias[tool] = deque(maxlen=config.POOL_PROCESOS_VENTANA)
+        t = _tools[tool]
+        t["tareas"]         += 1
+        t["suma_ms"]        += total_ms
+        t["suma_espera_ms"] += max(0.0, total_ms - ejecucion_ms)
+        _latencias[tool].append(total_ms)
+        _stats["tareas"]       += 1
+        _stats["ejecucion_ms"] += ejecucion_ms
+
+
+def en_pool(func):
+    """
+    Ejecuta func en el pool si está activo y su nombre está en
+    POOL_PROCESOS_TOOLS; si no, la llama directamente.
+    """
+    nombre = func.__name__
+    _funciones[nombre] = func
+
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        executor = _pool["executor"]
+        if executor is None or nombre not in config.POOL_PROCESOS_TOOLS:
+            return func(*args, **kwargs)
+
+        inicio = time.perf_counter()
+        with _lock:
+            _stats["en_curso"] += 1
+        try:
+            futuro = executor.submit(_ejecutar, func.__module__, nombre, args, kwargs)
+            resultado, ejecucion_ms = futuro.result(timeout=config.POOL_PROCESOS_TIMEOUT_S or None)
+        except TimeoutFuturo:
+            futuro.cancel()
+            with _lock:
+                _stats["timeouts"] += 1
+            return json.dumps({"error": f"{nombre} superó {config.POOL_PROCESOS_TIMEOUT_S} s "
+                                        f"en el pool de procesos"}, ensure_ascii=False)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Pool roto o cerrándose: se recrea y esta llamada corre aquí
+            with _lock:
+                _stats["errores"] += 1
+                _stats["locales"] += 1
+            print(f"  [POOL] {nombre}: {type(e).__name__}: {e} → ejecución local")
+            if isinstance(e, BrokenProcessPool):
+                _reiniciar(executor)
+            return func(*args, **kwargs)
+        finally:
+            with _lock:
+                _stats["en_curso"] -= 1
+
+        _registrar(nombre, (time.perf_counter() - inicio) * 1000, ejecucion_ms)
+        return resultado
+
+    return envoltura
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Workers, utilización del pool y latencia (total y espera en cola) por tool."""
+    with _lock:
+        st      = dict(_stats)
+        activo  = _pool["executor"] is not None
+        workers = _pool["workers"]
+        inicio  = _pool["inicio"]
+        tools   = {n: (dict(t), sorted(_latencias[n])) for n, t in _tools.items()}
+
+    def pct(lst, p):
+        return round(lst[max(0, int(len(lst) * p / 100) - 1)], 1)
+
+    # Fracción del tiempo de CPU disponible (workers × tiempo activo) usada en tareas
+    capacidad_ms = (time.perf_counter() - inicio) * 1000 * workers if activo and inicio else 0
+    return {
+        "habilitado":   config.POOL_PROCESOS_ENABLED,
+        "activo":       activo,
+        "workers":      workers if activo else 0,
+        "en_curso":     st["en_curso"],
+        "utilizacion":  round(st["ejecucion_ms"] / capacidad_ms, 4) if capacidad_ms else 0.0,
+        "tareas":       st["tareas"],
+        "locales":      st["locales"],
+        "timeouts":     st["timeouts"],
+        "errores":      st["errores"],
+        "reinicios":    st["reinicios"],
+        "tools": {
+            n: {"tareas":          t["tareas"],
+                "media_ms":        round(t["suma_ms"] / t["tareas"], 2),
+                "espera_media_ms": round(t["suma_espera_ms"] / t["tareas"], 2),
+                "p50_ms":          pct(lat, 50),
+                "p95_ms":          pct(lat, 95)}
+            for n, (t, lat) in sorted(tools.items())
+        },
+    }
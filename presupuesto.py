@@ -0,0 +1,353 @@
+"""
+presupuesto.py — Límites de los loops ReAct por request
+=======================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Los agentes ReAct (agente_langchain y los especialistas de agente_langgraph)
+iteran hasta que el modelo deja de pedir tools. Un modelo confundido puede dar
+muchas vueltas y pasarse del SLA de 30 s (exportar_dashboard.py).
+
+Cada request abre un Presupuesto con cuatro límites (0 = sin límite):
+  max_tools    llamadas a tools       (REACT_MAX_TOOLS)
+  max_turnos   turnos del LLM         (REACT_MAX_TURNOS)
+  max_tokens   tokens del LLM         (REACT_MAX_TOKENS)
+  deadline_s   segundos desde el inicio de la request (REACT_DEADLINE_S)
+Los límites se pueden sobrescribir por request (POST /consulta "presupuesto").
+
+Los contadores son de la REQUEST, compartidos por todos los especialistas del
+fan-out. Un callback de LangChain los revisa antes de cada turno del LLM y de
+cada tool; al agotarse lanza PresupuestoAgotado y ejecutar_react() devuelve la
+mejor respuesta parcial con lo que el agente alcanzó a reunir (salidas de
+tools y último texto del modelo). Si el deadline ya pasó al llegar al
+sintetizador, éste une las respuestas sin llamar al LLM.
+
+Cómo viaja (igual que memo.py): solicitud() abre el presupuesto → el grafo
+lleva id_presupuesto en su estado → cada nodo lo activa con usar().
+
+Las ramas especulativas (especulacion.py) no gastan el presupuesto de la
+request mientras no se sepa si sirven: abrir_rama() les da uno propio (mismos
+límites y deadline, contadores desde el consumo actual) y cerrar_rama() suma
+lo que gastaron a la request solo si la rama se adopta.
+"""
+
+import contextvars
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+import limitador
+
+MOTIVOS = ("tools", "turnos", "tokens", "deadline")
+
+
+class PresupuestoAgotado(Exception):
+    """Se agotó uno de los límites del loop ReAct de la request."""
+
+    def __init__(self, motivo: str):
+        super().__init__(f"presupuesto agotado: {motivo}")
+        self.motivo = motivo
+
+
+def limites_por_defecto() -> dict:
+    return {
+        "max_tools":  config.REACT_MAX_TOOLS,
+        "max_turnos": config.REACT_MAX_TURNOS,
+        "max_tokens": config.REACT_MAX_TOKENS,
+        "deadline_s": config.REACT_DEADLINE_S,
+    }
+
+
+class Presupuesto:
+    """Límites y consumo de una request. Thread-safe (fan-out en paralelo)."""
+
+    def __init__(self, limites: dict | None = None):
+        self.id      = uuid.uuid4().hex
+        self.limites = {**limites_por_defecto(),
+                        **{k: v for k, v in (limites or {}).items() if v is not None}}
+        self.inicio  = time.monotonic()
+        self.tools   = 0
+        self.turnos  = 0
+        self.tokens  = 0
+        self.agotado: str | None = None   # primer motivo de agotamiento
+        self._lock   = threading.Lock()
+
+    def segundos(self) -> float:
+        return time.monotonic() - self.inicio
+
+    def deadline_vencido(self) -> bool:
+        return bool(self.limites["deadline_s"]) and self.segundos() >= self.limites["deadline_s"]
+
+    def _agotar(self, motivo: str):
+        with self._lock:
+            self.agotado = self.agotado or motivo
+        raise PresupuestoAgotado(motivo)
+
+    def antes_de_turno(self) -> None:
+        if self.deadline_vencido():
+            self._agotar("deadline")
+        with self._lock:
+            lim = self.limites
+            if lim["max_tokens"] and self.tokens >= lim["max_tokens"]:
+                motivo = "tokens"
+            elif lim["max_turnos"] and self.turnos >= lim["max_turnos"]:
+                motivo = "turnos"
+            else:
+                self.turnos += 1
+                return
+        self._agotar(motivo)
+
+    def antes_de_tool(self) -> None:
+        if self.deadline_vencido():
+            self._agotar("deadline")
+        with self._lock:
+            if not self.limites["max_tools"] or self.tools < self.limites["max_tools"]:
+                self.tools += 1
+                return
+        self._agotar("tools")
+
+    def sumar_tokens(self, n: int) -> None:
+        with self._lock:
+            self.tokens += n
+
+    def rama(self) -> "Presupuesto":
+        """Copia con los mismos límites y deadline que parte del consumo actual."""
+        r = Presupuesto(self.limites)
+        r.inicio = self.inicio
+        with self._lock:
+            r.tools, r.turnos, r.tokens = self.tools, self.turnos, self.tokens
+        r._base = (r.tools, r.turnos, r.tokens)
+        return r
+
+    def incorporar(self, rama: "Presupuesto") -> None:
+        """Suma a este presupuesto lo que la rama gastó desde que se abrió."""
+        with rama._lock:
+            tools, turnos, tokens = (a - b for a, b in
+                                     zip((rama.tools, rama.turnos, rama.tokens), rama._base))
+            agotado = rama.agotado
+        with self._lock:
+            self.tools  += tools
+            self.turnos += turnos
+            self.tokens += tokens
+            self.agotado = self.agotado or agotado
+
+    def resumen(self) -> dict:
+        with self._lock:
+            return {
+                "limites":  dict(self.limites),
+                "usado":    {"tools": self.tools, "turnos": self.turnos, "tokens": self.tokens,
+                             "segundos": round(self.segundos(), 2)},
+                "agotado":  self.agotado,
+            }
+
+
+class CallbackPresupuesto(BaseCallbackHandler):
+    """Cuenta turnos, tools y tokens del loop ReAct; corta al agotarse."""
+
+    raise_error = True   # sin esto LangChain se traga la excepción del callback
+
+    def __init__(self, presupuesto: Presupuesto):
+        self.presupuesto = presupuesto
+        # Salidas de tools ya ejecutadas: si el presupuesto se agota a mitad de
+        # un paso de tools, LangGraph descarta el paso completo y estas son lo
+        # único que queda de las llamadas que sí corrieron
+        self.salidas: list = []
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.presupuesto.antes_de_turno()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.presupuesto.antes_de_turno()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.presupuesto.antes_de_tool()
+
+    def on_tool_end(self, output, **kwargs):
+        from langchain_core.messages import ToolMessage
+
+        if isinstance(output, ToolMessage):
+            self.salidas.append(output)
+
+    def on_llm_end(self, response, **kwargs):
+        self.presupuesto.sumar_tokens(limitador.tokens_reales(response) or 0)
+
+
+# ---------------------------------------------------------------------------
+# Registro de presupuestos activos y contextvar
+# ---------------------------------------------------------------------------
+
+_actual: contextvars.ContextVar[Presupuesto | None] = contextvars.ContextVar(
+    "presupuesto_actual", default=None
+)
+_activos: dict[str, Presupuesto] = {}
+_padres:  dict[str, str] = {}        # id de rama especulativa → id de la request
+_lock  = threading.Lock()
+_stats = {"solicitudes": 0, "agotados": Counter(), "agotados_por_nodo": Counter(),
+          "respuestas_parciales": 0, "sintesis_sin_llm": 0}
+
+
+def actual() -> Presupuesto | None:
+    return _actual.get()
+
+
+@contextmanager
+def solicitud(limites: dict | None = None):
+    """
+    Presupuesto de la request actual. Si ya hay uno activo (lo abrió el
+    pipeline) se reutiliza; si no, se crea y se cierra al salir.
+    """
+    existente = _actual.get()
+    if existente is not None:
+        yield existente
+        return
+
+    p = Presupuesto(limites)
+    with _lock:
+        _activos[p.id] = p
+    token = _actual.set(p)
+    try:
+        yield p
+    finally:
+        _actual.reset(token)
+        with _lock:
+            _activos.pop(p.id, None)
+            _stats["solicitudes"] += 1
+            if p.agotado:
+                _stats["agotados"][p.agotado] += 1
+
+
+@contextmanager
+def usar(id_presupuesto: str):
+    """Activa el presupuesto id_presupuesto en este contexto (no-op si no existe)."""
+    with _lock:
+        p = _activos.get(id_presupuesto)
+    if p is None:
+        yield _actual.get()
+        return
+    token = _actual.set(p)
+    try:
+        yield p
+    finally:
+        _actual.reset(token)
+
+
+def abrir_rama(id_presupuesto: str) -> str:
+    """
+    Registra un presupuesto propio para una rama especulativa de la request
+    id_presupuesto y retorna su id ("" si la request no tiene presupuesto).
+    """
+    with _lock:
+        padre = _activos.get(id_presupuesto)
+    if padre is None:
+        return ""
+    r = padre.rama()
+    with _lock:
+        _activos[r.id] = r
+        _padres[r.id]  = id_presupuesto
+    return r.id
+
+
+def cerrar_rama(id_rama: str, adoptar: bool) -> None:
+    """
+    Da de baja la rama. Si se adopta, su consumo pasa a la request; si se
+    descarta (cancelada o fallida), lo que gastó no cuenta para la request.
+    """
+    with _lock:
+        rama  = _activos.pop(id_rama, None)
+        padre = _activos.get(_padres.pop(id_rama, ""))
+    if adoptar and rama is not None and padre is not None:
+        padre.incorporar(rama)
+
+
+# ---------------------------------------------------------------------------
+# Ejecución acotada de un agente ReAct
+# ---------------------------------------------------------------------------
+
+def _respuesta_parcial(mensajes: list, motivo: str) -> str:
+    """Mejor respuesta posible con lo que el loop alcanzó a reunir."""
+    from langchain_core.messages import AIMessage, ToolMessage
+
+    texto = next((m.content for m in reversed(mensajes)
+                  if isinstance(m, AIMessage) and isinstance(m.content, str) and m.content.strip()), "")
+    datos = [f"- {m.name}: {str(m.content)[:config.REACT_PARCIAL_MAX_CHARS]}"
+             for m in mensajes if isinstance(m, ToolMessage)]
+
+    partes = [f"[Respuesta parcial: se agotó el presupuesto del agente ({motivo})]"]
+    if texto:
+        partes.append(texto)
+    if datos:
+        partes.append("Datos obtenidos de las herramientas:\n" + "\n".join(datos))
+    if not texto and not datos:
+        partes.append("No se alcanzó a consultar ninguna herramienta.")
+    return "\n\n".join(partes)
+
+
+def _con_salidas(mensajes: list, cb: CallbackPresupuesto | None) -> list:
+    """Mensajes del último estado + salidas de tools del paso que se abortó."""
+    from langchain_core.messages import ToolMessage
+
+    if cb is None:
+        return mensajes
+    vistos = {m.tool_call_id for m in mensajes if isinstance(m, ToolMessage)}
+    return list(mensajes) + [m for m in cb.salidas if m.tool_call_id not in vistos]
+
+
+def ejecutar_react(agente, entrada: dict, callbacks: list | None = None,
+                   nodo: str = "agente") -> str:
+    """
+    Ejecuta el agente ReAct compilado y retorna el texto del último mensaje.
+    Con un presupuesto activo, lo hace cumplir y ante PresupuestoAgotado
+    retorna la respuesta parcial en vez de propagar el error.
+    """
+    p  = _actual.get()
+    cb = CallbackPresupuesto(p) if p is not None else None
+    callbacks = list(callbacks or []) + ([cb] if cb else [])
+    cfg = {"callbacks": callbacks} if callbacks else None
+
+    ultimo = {"messages": []}
+    try:
+        for ultimo in agente.stream(entrada, config=cfg, stream_mode="values"):
+            pass
+    except PresupuestoAgotado as e:
+        with _lock:
+            _stats["agotados_por_nodo"][f"{nodo}:{e.motivo}"] += 1
+            _stats["respuestas_parciales"] += 1
+        print(f"  [PRESUPUESTO] {nodo}: {e.motivo} agotado, respuesta parcial")
+        return _respuesta_parcial(_con_salidas(ultimo.get("messages", []), cb), e.motivo)
+    return ultimo["messages"][-1].content
+
+
+def contar_sintesis_sin_llm() -> None:
+    with _lock:
+        _stats["sintesis_sin_llm"] += 1
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Límites por defecto y eventos de agotamiento (por motivo y por nodo)."""
+    with _lock:
+        st = {k: (dict(v) if isinstance(v, Counter) else v) for k, v in _stats.items()}
+        activos = len(_activos) - len(_padres)
+    agotadas = sum(st["agotados"].values())
+    return {
+        "limites":              limites_por_defecto(),
+        "solicitudes":          st["solicitudes"],
+        "solicitudes_activas":  activos,
+        "agotadas":             agotadas,
+        "tasa_agotamiento":     round(agotadas / st["solicitudes"], 3) if st["solicitudes"] else 0.0,
+        "agotadas_por_motivo":  {m: st["agotados"].get(m, 0) for m in MOTIVOS},
+        "agotados_por_nodo":    st["agotados_por_nodo"],
+        "respuestas_parciales": st["respuestas_parciales"],
+        "sintesis_sin_llm":     st["sintesis_sin_llm"],
+    }
@@ -0,0 +1,150 @@
+"""
+prompt_cache.py — Caché de prefijo de prompt del lado del proveedor
+====================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Los system prompts (sobre todo langchain_main) y los esquemas de las tools se
+reenvían idénticos en cada turno ReAct de cada request. Los proveedores pueden
+cachear ese prefijo si llega SIEMPRE primero y byte a byte igual:
+
+  anthropic       → caché explícita: el system prompt se marca con
+                    cache_control={"type": "ephemeral"}; el punto de corte
+                    cubre también los esquemas de tools (van antes del system)
+  openai/deepseek → caché automática de prefijo: basta con que el prefijo
+                    estático (tools + system) sea estable y vaya primero
+
+Reglas para que el prefijo sea estable:
+  - Nada dinámico (fechas, ids, la pregunta) dentro del system prompt.
+  - La pregunta siempre va en el HumanMessage que sigue al system prompt.
+  - Las listas TOOLS_* mantienen un orden fijo.
+
+CallbackCacheTokens lee los tokens cacheados que reporta cada proveedor y los
+acumula para GET /metricas (tasa de acierto, ahorro estimado y latencia media
+de llamadas con y sin acierto).
+"""
+
+import sys
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import SystemMessage
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+
+def _es_anthropic(llm) -> bool:
+    return type(llm).__name__ == "ChatAnthropic"
+
+
+def mensaje_sistema(prompt: str, llm) -> SystemMessage:
+    """
+    System prompt listo para caché de prefijo según el proveedor del LLM.
+    Para Anthropic lo marca como cacheable; para el resto lo deja en texto plano.
+    """
+    prompt = prompt.strip()
+    if _es_anthropic(llm):
+        return SystemMessage(content=[{
+            "type": "text",
+            "text": prompt,
+            "cache_control": {"type": "ephemeral"},
+        }])
+    return SystemMessage(content=prompt)
+
+
+def preparar_mensajes(messages: list, llm) -> list:
+    """Aplica mensaje_sistema() al SystemMessage inicial de una lista de mensajes."""
+    if messages and isinstance(messages[0], SystemMessage) and isinstance(messages[0].content, str):
+        return [mensaje_sistema(messages[0].content, llm)] + list(messages[1:])
+    return messages
+
+
+# ---------------------------------------------------------------------------
+# Medición de tokens cacheados
+# ---------------------------------------------------------------------------
+
+def tokens_cache(response) -> tuple[int, int, int]:
+    """(tokens_entrada, cache_leidos, cache_escritos) de un LLMResult."""
+    entrada = leidos = escritos = 0
+    for generaciones in response.generations:
+        for gen in generaciones:
+            uso = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+            detalle   = uso.get("input_token_details") or {}
+            entrada  += uso.get("input_tokens", 0)
+            leidos   += detalle.get("cache_read", 0) or 0
+            escritos += detalle.get("cache_creation", 0) or 0
+    if not leidos:
+        # DeepSeek reporta sus aciertos con campos propios en token_usage
+        uso_raw = (response.llm_output or {}).get("token_usage") or {}
+        leidos  = uso_raw.get("prompt_cache_hit_tokens", 0) or 0
+    return entrada, leidos, escritos
+
+
+_lock  = threading.Lock()
+_stats: dict[str, dict] = {}
+
+
+def _registrar(proveedor: str, entrada: int, leidos: int, escritos: int, ms: float) -> None:
+    with _lock:
+        st = _stats.setdefault(proveedor, {
+            "llamadas": 0, "llamadas_con_acierto": 0,
+            "tokens_entrada": 0, "tokens_cache_leidos": 0, "tokens_cache_escritos": 0,
+            "ms_con_acierto": 0.0, "ms_sin_acierto": 0.0,
+        })
+        st["llamadas"]              += 1
+        st["tokens_entrada"]        += entrada
+        st["tokens_cache_leidos"]   += leidos
+        st["tokens_cache_escritos"] += escritos
+        if leidos:
+            st["llamadas_con_acierto"] += 1
+            st["ms_con_acierto"]       += ms
+        else:
+            st["ms_sin_acierto"]       += ms
+
+
+class CallbackCacheTokens(BaseCallbackHandler):
+    """Acumula tokens cacheados y latencia por proveedor — se adjunta en config._make_llm()."""
+
+    def __init__(self, proveedor: str):
+        self.proveedor = proveedor
+        self._inicios: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._inicios[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        inicio = self._inicios.pop(run_id, None)
+        ms     = (time.perf_counter() - inicio) * 1000 if inicio else 0.0
+        _registrar(self.proveedor, *tokens_cache(response), ms)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._inicios.pop(run_id, None)
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Tokens cacheados, tasa de acierto y ahorro estimado por proveedor."""
+    resultado = {}
+    with _lock:
+        copia = {p: dict(st) for p, st in _stats.items()}
+    for proveedor, st in copia.items():
+        precio    = config.COSTOS_POR_PROVEEDOR.get(proveedor, {"input": 0.0})["input"]
+        descuento = config.DESCUENTO_CACHE_POR_PROVEEDOR.get(proveedor, 0.0)
+        con, sin  = st["llamadas_con_acierto"], st["llamadas"] - st["llamadas_con_acierto"]
+        resultado[proveedor] = {
+            "llamadas":              st["llamadas"],
+            "tokens_entrada":        st["tokens_entrada"],
+            "tokens_cache_leidos":   st["tokens_cache_leidos"],
+            "tokens_cache_escritos": st["tokens_cache_escritos"],
+            "tasa_acierto_tokens":   round(st["tokens_cache_leidos"] / max(st["tokens_entrada"], 1), 3),
+            "ahorro_estimado_usd":   round(st["tokens_cache_leidos"] * precio * descuento / 1000, 6),
+            "latencia_media_con_acierto_ms": round(st["ms_con_acierto"] / con, 1) if con else None,
+            "latencia_media_sin_acierto_ms": round(st["ms_sin_acierto"] / sin, 1) if sin else None,
+        }
+    return resultado
@@ -0,0 +1,243 @@
+"""
+resiliencia.py — Reintentos, circuit breaker y failover para llamadas LLM
+=========================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Un 429 o 5xx del proveedor ya no tumba toda la consulta:
+
+  1. Reintentos con backoff exponencial + jitter ("full jitter")
+  2. Un circuit breaker por proveedor:
+       cerrado     → llamadas normales
+       abierto     → tras CB_UMBRAL_FALLOS fallos seguidos; se salta el proveedor
+       semiabierto → pasados CB_ENFRIAMIENTO_S se deja pasar una llamada de prueba
+  3. Failover al siguiente proveedor de config.cadena_proveedores()
+     (proveedor activo + LLM_FALLBACKS)
+
+El reintento es a nivel de NODO: cada nodo del grafo envuelve su trabajo en
+invocar_nodo(), así un fallo en el sintetizador no vuelve a ejecutar los
+especialistas que ya terminaron.
+
+Uso:
+    def _trabajo(llm):
+        return llm.invoke(messages)
+    respuesta = resiliencia.invocar_nodo("supervisor", _trabajo, temperature=0)
+"""
+
+import random
+import sys
+import threading
+import time
+from typing import Callable, TypeVar
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+T = TypeVar("T")
+
+
+class ProveedoresAgotados(Exception):
+    """Todos los proveedores de la cadena fallaron o tienen el circuito abierto."""
+
+
+# ---------------------------------------------------------------------------
+# Clasificación de errores
+# ---------------------------------------------------------------------------
+
+_ERRORES_TRANSITORIOS = {
+    "RateLimitError", "APIConnectionError", "APITimeoutError",
+    "InternalServerError", "ServiceUnavailableError", "OverloadedError",
+}
+
+
+def es_error_transitorio(exc: Exception) -> bool:
+    """True si vale la pena reintentar: 408, 429, 5xx, timeouts y errores de red."""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in (408, 429) or status >= 500
+    if type(exc).__name__ in _ERRORES_TRANSITORIOS:
+        return True
+    return isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def calcular_backoff(intento: int) -> float:
+    """Segundos de espera antes del reintento N (0, 1, 2...) — full jitter."""
+    techo = min(config.LLM_BACKOFF_MAX_S, config.LLM_BACKOFF_BASE_S * (2 ** intento))
+    return random.uniform(0, techo)
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker por proveedor
+# ---------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """Circuit breaker clásico de tres estados para un proveedor LLM."""
+
+    def __init__(self, proveedor: str, umbral: int, enfriamiento_s: float):
+        self.proveedor       = proveedor
+        self.umbral          = umbral
+        self.enfriamiento_s  = enfriamiento_s
+        self.estado          = "cerrado"
+        self.fallos_seguidos = 0
+        self.abierto_desde   = 0.0
+        self.total_exitos    = 0
+        self.total_fallos    = 0
+        self.aperturas       = 0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        """Indica si se puede llamar al proveedor ahora mismo."""
+        with self._lock:
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "abierto":
+                if time.time() - self.abierto_desde < self.enfriamiento_s:
+                    return False
+                self.estado = "semiabierto"
+                self._prueba_en_curso = False
+            # semiabierto: una sola llamada de prueba a la vez
+            if self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def registrar_exito(self) -> None:
+        with self._lock:
+            self.total_exitos    += 1
+            self.fallos_seguidos  = 0
+            self.estado           = "cerrado"
+            self._prueba_en_curso = False
+
+    def liberar_prueba(self) -> None:
+        """La llamada terminó sin veredicto sobre el proveedor: no cambia el estado."""
+        with self._lock:
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self) -> None:
+        with self._lock:
+            self.total_fallos    += 1
+            self.fallos_seguidos += 1
+            self._prueba_en_curso = False
+            if self.estado == "semiabierto" or self.fallos_seguidos >= self.umbral:
+                if self.estado != "abierto":
+                    self.aperturas += 1
+                self.estado        = "abierto"
+                self.abierto_desde = time.time()
+
+    def resumen(self) -> dict:
+        with self._lock:
+            restante = 0.0
+            if self.estado == "abierto":
+                restante = max(0.0, self.enfriamiento_s - (time.time() - self.abierto_desde))
+            return {
+                "estado":          self.estado,
+                "fallos_seguidos": self.fallos_seguidos,
+                "total_exitos":    self.total_exitos,
+                "total_fallos":    self.total_fallos,
+                "aperturas":       self.aperturas,
+                "reabre_en_s":     round(restante, 1),
+            }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+_contadores = {"llamadas": 0, "reintentos": 0, "failovers": 0, "agotados": 0}
+_contadores_lock = threading.Lock()
+
+
+def obtener_breaker(proveedor: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if proveedor not in _breakers:
+            _breakers[proveedor] = CircuitBreaker(
+                proveedor, config.CB_UMBRAL_FALLOS, config.CB_ENFRIAMIENTO_S
+            )
+        return _breakers[proveedor]
+
+
+def _contar(clave: str) -> None:
+    with _contadores_lock:
+        _contadores[clave] += 1
+
+
+# ---------------------------------------------------------------------------
+# Ejecución resiliente de un nodo
+# ---------------------------------------------------------------------------
+
+def invocar_nodo(nodo: str, trabajo: Callable[..., T], temperature: float = 0.2,
+                 cadena: list[dict] | None = None) -> T:
+    """
+    Ejecuta trabajo(llm) con reintentos, circuit breaker y failover.
+
+    Parámetros:
+        nodo:        nombre del nodo (solo para logs)
+        trabajo:     función que recibe un LLM y hace TODO el trabajo del nodo
+        temperature: temperatura del LLM
+        cadena:      proveedores a usar (default: config.cadena_proveedores())
+
+    Errores no transitorios (p. ej. 400 o 401) se propagan sin reintentar.
+    Si toda la cadena falla se lanza ProveedoresAgotados.
+    """
+    cadena = cadena if cadena is not None else config.cadena_proveedores()
+    ultimo_error: Exception | None = None
+    _contar("llamadas")
+
+    for posicion, p in enumerate(cadena):
+        breaker = obtener_breaker(p["provider"])
+        if not breaker.permitir():
+            print(f"  [RESILIENCIA] {nodo}: circuito abierto para '{p['provider']}', se omite")
+            continue
+        if posicion > 0:
+            _contar("failovers")
+            print(f"  [RESILIENCIA] {nodo}: failover a {p['provider']}/{p['model']}")
+
+        for intento in range(config.LLM_MAX_REINTENTOS + 1):
+            llm = config.obtener_llm(p["provider"], p["model"], p["api_key"], p["base_url"],
+                                     temperature=temperature, max_retries=0)
+            try:
+                resultado = trabajo(llm)
+            except Exception as e:
+                if not es_error_transitorio(e):
+                    # Puede ser un error de nuestro código en trabajo(): no cuenta
+                    # como éxito (cerraría un circuito semiabierto) ni como fallo
+                    breaker.liberar_prueba()
+                    raise
+                breaker.registrar_fallo()
+                ultimo_error = e
+                print(f"  [RESILIENCIA] {nodo}: {p['provider']} falló "
+                      f"(intento {intento + 1}): {type(e).__name__}")
+                if intento >= config.LLM_MAX_REINTENTOS or not breaker.permitir():
+                    break
+                _contar("reintentos")
+                time.sleep(calcular_backoff(intento))
+                continue
+            breaker.registrar_exito()
+            return resultado
+
+    _contar("agotados")
+    detalle = f"{type(ultimo_error).__name__}: {ultimo_error}" if ultimo_error else "circuitos abiertos"
+    raise ProveedoresAgotados(
+        f"Nodo '{nodo}': ningún proveedor disponible "
+        f"({', '.join(p['provider'] for p in cadena)}) — {detalle}"
+    )
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Estado de los circuit breakers y contadores de reintentos/failover."""
+    with _breakers_lock:
+        breakers = {nombre: b.resumen() for nombre, b in _breakers.items()}
+    with _contadores_lock:
+        contadores = dict(_contadores)
+    return {
+        "breakers":  breakers,
+        "fallbacks": config.LLM_FALLBACKS,
+        **contadores,
+    }
@@ -0,0 +1,288 @@
+"""
+respuestas_rapidas.py — Vía rápida determinista para preguntas de plantilla
+===========================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Preguntas como "¿Cuánto está el dólar hoy?" o "¿Cuál fue la balanza comercial
+de 2024?" se responden por completo con UNA tool. Por el camino normal pasan
+por supervisor + especialista ReAct + sintetizador (3+ llamadas LLM).
+
+Este módulo reconoce esas preguntas y responde directamente desde la salida de
+la tool con una plantilla en español: milisegundos y costo cero.
+
+Plantillas:
+  trm_actual        → obtener_trm_actual()
+  trm_historico     → analizar_historico_trm(meses)   (min / max / promedio)
+  balanza_comercial → consultar_balanza_comercial()
+
+Una pregunta solo toma la vía rápida si:
+  - coincide con el patrón de una plantilla,
+  - no menciona otro dominio (enrutador.RUTAS) ni pide análisis
+    ("por qué", "cómo afecta", "relación", "compara"...),
+  - no pide un período que la plantilla no sirve: un año distinto al de los
+    datos, un mes, trimestre, semestre o rango de fechas, o más meses de los
+    que tiene la serie (las plantillas solo conocen el último dato / año),
+  - y la tool responde sin error.
+En cualquier otro caso se devuelve None y la consulta sigue al agente.
+
+Uso:
+    rapida = respuestas_rapidas.intentar(pregunta)
+    if rapida:
+        print(rapida["plantilla"], rapida["respuesta"])
+
+    python respuestas_rapidas.py    # verifica los casos de regresión (CASOS)
+"""
+
+import json
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+import enrutador
+
+MARCA = "⚡ Respuesta directa desde los datos (sin LLM)"
+
+
+# ---------------------------------------------------------------------------
+# Formato de cifras (convención colombiana: 4.359,00)
+# ---------------------------------------------------------------------------
+
+def _num(valor: float, decimales: int = 2) -> str:
+    texto = f"{valor:,.{decimales}f}"
+    return texto.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+# ---------------------------------------------------------------------------
+# Plantillas
+# ---------------------------------------------------------------------------
+
+def _plantilla_trm_actual(d: dict, _m) -> str:
+    direccion = "subió" if d["variacion_pct"] > 0 else "bajó"
+    return (
+        f"La TRM más reciente ({d['mes']} de {d['año']}) es de "
+        f"${_num(d['trm'])} pesos por dólar.\n\n"
+        f"Frente al mes anterior (${_num(d['trm_mes_anterior'])}) el dólar "
+        f"{direccion} {_num(abs(d['variacion_pct']))}%.\n\n"
+        f"{d.get('nota', 'Fuente: Banco de la República · datos/trm_2024.csv')}"
+    )
+
+
+def _plantilla_trm_historico(d: dict, _m) -> str:
+    import serie_trm
+
+    # La serie une todos los trm_*.csv: la fuente los cita a todos
+    return (
+        f"TRM en los {d['periodo']} ({d['desde']} a {d['hasta']}):\n\n"
+        f"- Mínimo:   ${_num(d['trm_minimo'])}\n"
+        f"- Máximo:   ${_num(d['trm_maximo'])}\n"
+        f"- Promedio: ${_num(d['trm_promedio'])}\n"
+        f"- Variación acumulada: {_num(d['variacion_acumulada_pct'])}% "
+        f"(tendencia {d['tendencia']})\n\n"
+        f"{d.get('nota') or serie_trm.fuente()}"
+    )
+
+
+def _plantilla_balanza(d: dict, _m) -> str:
+    return (
+        f"Balanza comercial de Colombia en {d['año']}: "
+        f"{d['tipo_balanza']} de USD {_num(abs(d['balanza_anual_usd']), 1)} millones.\n\n"
+        f"- Exportaciones: USD {_num(d['total_exportaciones_usd'], 1)} millones "
+        f"(mes más alto: {d['mes_mayor_exportacion']})\n"
+        f"- Importaciones: USD {_num(d['total_importaciones_usd'], 1)} millones "
+        f"(mes más alto: {d['mes_mayor_importacion']})\n\n"
+        f"{d['nota']}"
+    )
+
+
+def _args_historico(m: re.Match) -> dict:
+    return {"meses": int(m.group("meses"))}
+
+
+# ---------------------------------------------------------------------------
+# Período pedido vs período que la plantilla puede servir
+# ---------------------------------------------------------------------------
+
+_MESES = ("enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|"
+          "octubre|noviembre|diciembre")
+# Referencias temporales que ninguna plantilla sirve (la consulta va al agente)
+_PERIODO = re.compile(
+    rf"\b({_MESES})\b|\b(bi|tri|cuatri|se)mestr|\b[qt][1-4]\b|"
+    r"\bdesde\b|\bhasta\b|\bentre\b|\bayer\b|\bpasad[oa]\b|\banterior\b|"
+    r"\b\d{1,2}[/-]\d{1,2}([/-]\d{2,4})?\b|\b\d{4}[/-]\d{1,2}\b"
+)
+_AÑO = re.compile(r"\b(?:19|20)\d{2}\b")
+
+
+def _sin_periodo(texto: str, _m, _d) -> bool:
+    """trm_actual: solo el último dato; cualquier año o mes pedido es otra pregunta."""
+    return not _PERIODO.search(texto) and not _AÑO.search(texto)
+
+
+def _periodo_historico(texto: str, m, _d) -> bool:
+    """trm_historico: "últimos N meses" con N dentro de la serie, sin otras fechas."""
+    import serie_trm
+    if _PERIODO.search(texto) or _AÑO.search(texto):
+        return False
+    return 1 <= int(m.group("meses")) <= len(serie_trm.serie().meses)
+
+
+def _periodo_balanza(texto: str, _m, d: dict) -> bool:
+    """balanza_comercial: el año completo de los datos, sin meses ni semestres."""
+    return not _PERIODO.search(texto) and all(int(a) == d["año"] for a in _AÑO.findall(texto))
+
+
+# (nombre, dominio, patrón sobre texto normalizado, nombre de la tool, args,
+#  validador del período (texto, match, datos de la tool) → bool, plantilla)
+_PLANTILLAS = [
+    (
+        "trm_actual", "trm",
+        re.compile(r"(cuanto|a cuanto|como|en cuanto|cual)\s+(esta|vale|cuesta|se cotiza|quedo|es)\s+"
+                   r"(el\s+|la\s+)?(precio del\s+)?(dolar|trm)"
+                   r"|\b(trm|dolar)\s+(actual|vigente|de hoy|hoy)\b"
+                   r"|\bprecio del dolar\b"),
+        "obtener_trm_actual", None, _sin_periodo, _plantilla_trm_actual,
+    ),
+    (
+        "trm_historico", "trm",
+        re.compile(r"(trm|dolar).*\bultimos?\s+(?P<meses>\d{1,2})\s+mes"),
+        "analizar_historico_trm", _args_historico, _periodo_historico, _plantilla_trm_historico,
+    ),
+    (
+        "balanza_comercial", "datos",
+        re.compile(r"\bbalanza comercial\b|\b(deficit|superavit) comercial\b"),
+        "consultar_balanza_comercial", None, _periodo_balanza, _plantilla_balanza,
+    ),
+]
+
+# Palabras que piden análisis: eso requiere al agente
+_ANALISIS = re.compile(
+    r"por ?que|como afecta|afect|impact|relacion|compar|explica|analiza|"
+    r"proyecc|pronostic|predic|deberia|recomiend|\bvs\b|versus"
+)
+
+
+def _tool(nombre: str):
+    import tools as agent_tools
+    return next(t for t in agent_tools.TOOLS_TODOS if t.name == nombre)
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+_lock  = threading.Lock()
+_stats = {"evaluadas": 0, "aciertos": Counter(), "errores_tool": 0, "fuera_de_periodo": 0,
+          "suma_ms": 0.0}
+
+
+def intentar(pregunta: str) -> dict | None:
+    """
+    Responde la pregunta con una plantilla si es posible.
+
+    Retorna {"plantilla", "respuesta", "latencia_ms"} o None si la pregunta
+    debe ir al agente.
+    """
+    inicio = time.perf_counter()
+    with _lock:
+        _stats["evaluadas"] += 1
+
+    texto = enrutador.normalizar(pregunta)
+    if _ANALISIS.search(texto):
+        return None
+    rutas, _ = enrutador.por_palabras_clave(pregunta)
+
+    for nombre, dominio, patron, tool_nombre, args_fn, cubre, plantilla in _PLANTILLAS:
+        m = patron.search(texto)
+        if not m or rutas != [dominio]:
+            continue
+        args = args_fn(m) if args_fn else {}
+        try:
+            datos = json.loads(_tool(tool_nombre).invoke(args))
+        except Exception:
+            datos = {"error": "tool falló"}
+        if "error" in datos:
+            with _lock:
+                _stats["errores_tool"] += 1
+            return None
+        try:
+            servible = cubre(texto, m, datos)
+        except Exception:
+            servible = False
+        if not servible:
+            with _lock:
+                _stats["fuera_de_periodo"] += 1
+            return None
+
+        respuesta = f"{MARCA}\n\n{plantilla(datos, m)}"
+        ms = (time.perf_counter() - inicio) * 1000
+        with _lock:
+            _stats["aciertos"][nombre] += 1
+            _stats["suma_ms"]          += ms
+        return {"plantilla": nombre, "respuesta": respuesta, "latencia_ms": round(ms, 2)}
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Preguntas evaluadas, respondidas por plantilla y latencia media de la vía rápida."""
+    with _lock:
+        aciertos  = dict(_stats["aciertos"])
+        evaluadas = _stats["evaluadas"]
+        errores   = _stats["errores_tool"]
+        fuera     = _stats["fuera_de_periodo"]
+        suma_ms   = _stats["suma_ms"]
+    total = sum(aciertos.values())
+    return {
+        "habilitada":          config.VIA_RAPIDA_ENABLED,
+        "evaluadas":           evaluadas,
+        "respondidas":         total,
+        "tasa_via_rapida":     round(total / evaluadas, 3) if evaluadas else 0.0,
+        "por_plantilla":       aciertos,
+        "errores_tool":        errores,
+        "fuera_de_periodo":    fuera,
+        "latencia_media_ms":   round(suma_ms / total, 2) if total else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Casos de regresión — python respuestas_rapidas.py (con los CSV de 2024)
+# ---------------------------------------------------------------------------
+
+# (pregunta, plantilla esperada o None si debe ir al agente)
+CASOS = [
+    ("¿Cuánto está el dólar hoy?",                       "trm_actual"),
+    ("¿Cuál fue la balanza comercial de 2024?",          "balanza_comercial"),
+    ("TRM en los últimos 6 meses",                       "trm_historico"),
+    ("¿Cuál fue la balanza comercial de 2019?",          None),
+    ("balanza comercial en el primer semestre",          None),
+    ("balanza comercial del tercer trimestre de 2024",   None),
+    ("balanza comercial de marzo",                       None),
+    ("¿Cuánto está el dólar en marzo de 2024?",          None),
+    ("precio del dólar en 2020",                         None),
+    ("precio del dólar el 15/03/2024",                   None),
+    ("¿Cuánto estaba el dólar el mes pasado?",           None),
+    ("dólar últimos 48 meses",                           None),
+    ("TRM últimos 6 meses de 2023",                      None),
+    ("dólar últimos 3 meses desde enero",                None),
+]
+
+
+if __name__ == "__main__":
+    fallos = 0
+    for pregunta, esperada in CASOS:
+        r = intentar(pregunta)
+        obtenida = r["plantilla"] if r else None
+        ok = obtenida == esperada
+        fallos += not ok
+        print(f"  {'OK ' if ok else 'FALLA'}  {pregunta!r:55} → {obtenida}")
+    print(f"\n{len(CASOS) - fallos}/{len(CASOS)} casos correctos")
+    sys.exit(1 if fallos else 0)
@@ -0,0 +1,251 @@
+"""
+resumenes.py — Resúmenes precalculados de los datasets por versión
+==================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+consultar_balanza_comercial, analizar_sectores_exportacion y
+obtener_trm_actual recalculaban en cada llamada totales, meses con máximo,
+top-3 de sectores y rankings de crecimiento, y armaban la serie con
+df.iterrows(). El resultado solo cambia cuando cambia el CSV.
+
+Este módulo materializa esos resúmenes UNA vez por versión del dataset
+(datasets.version):
+  - al subir un CSV a /api/upload/datos (main.py)
+  - al arrancar la API, para todos los datos/*.csv
+  - perezosamente, si una tool pide un resumen que no está al día
+
+Cada resumen es el dict que la tool entrega a compactar.salida(); se guarda
+en memoria y en datos/.resumenes/<stem>.json (JSON minificado con la
+versión de origen), así un reinicio no lo recalcula.
+
+Los resúmenes se eligen por prefijo del nombre del archivo (RESUMIDORES).
+Las tools solo leen: la latencia no crece con el tamaño del dataset.
+"""
+
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+import datasets
+
+
+# ---------------------------------------------------------------------------
+# Resumidores por tipo de dataset
+# ---------------------------------------------------------------------------
+
+def _resumen_trm(df, nombre: str) -> dict:
+    ult = df.iloc[-1]
+    ant = df.iloc[-2]
+    direccion = "subió" if float(ult["variacion_pct"]) > 0 else "bajó"
+    return {
+        "mes":              str(ult["nombre_mes"]),
+        "año":              int(ult["año"]),
+        "trm":              float(ult["trm"]),
+        "variacion_pct":    round(float(ult["variacion_pct"]), 2),
+        "trm_mes_anterior": float(ant["trm"]),
+        "interpretacion":   (f"El dólar {direccion} {abs(float(ult['variacion_pct'])):.2f}% "
+                             f"en {ult['nombre_mes']} respecto a {ant['nombre_mes']}."),
+        "nota":             f"Fuente: Banco de la República · datos/{nombre}",
+    }
+
+
+def _resumen_balanza(df, nombre: str) -> dict:
+    exp, imp = df["exportaciones_usd_mill"], df["importaciones_usd_mill"]
+    total_exp   = float(exp.sum())
+    total_imp   = float(imp.sum())
+    balanza_tot = round(total_exp - total_imp, 1)
+
+    serie = df[["nombre_mes", "exportaciones_usd_mill", "importaciones_usd_mill",
+                "balanza_comercial"]].astype({"nombre_mes": str}).rename(columns={
+        "nombre_mes": "mes", "exportaciones_usd_mill": "exportaciones",
+        "importaciones_usd_mill": "importaciones", "balanza_comercial": "balanza",
+    }).to_dict("records")
+
+    return {
+        "año":                     int(df["año"].iloc[-1]),
+        "total_exportaciones_usd": round(total_exp, 1),
+        "total_importaciones_usd": round(total_imp, 1),
+        "balanza_anual_usd":       balanza_tot,
+        "tipo_balanza":            "superávit" if balanza_tot >= 0 else "déficit",
+        "mes_mayor_exportacion":   str(df["nombre_mes"].iloc[int(exp.to_numpy().argmax())]),
+        "mes_mayor_importacion":   str(df["nombre_mes"].iloc[int(imp.to_numpy().argmax())]),
+        "serie_mensual":           serie,
+        "nota":                    "Valores en millones de dólares USD · Fuente DANE/DIAN",
+    }
+
+
+def _resumen_sectores(df, nombre: str) -> dict:
+    columnas = ["sector", "valor_usd_mill", "participacion_pct", "variacion_anual_pct"]
+    df = df[columnas].astype({"sector": str}).sort_values("participacion_pct", ascending=False)
+    crecimiento = df[df["variacion_anual_pct"] > 0].sort_values(
+        "variacion_anual_pct", ascending=False).head(3)
+    año = "".join(c for c in Path(nombre).stem if c.isdigit())[-4:]
+    return {
+        "año":                       int(año) if año else None,
+        "total_exportaciones_usd":   round(float(df["valor_usd_mill"].sum()), 1),
+        "sectores_por_participacion": df.to_dict("records"),
+        "top_3_sectores":            df.head(3)[["sector", "participacion_pct",
+                                                 "valor_usd_mill"]].to_dict("records"),
+        "sectores_con_mayor_crecimiento": crecimiento[["sector", "variacion_anual_pct"]]
+                                          .to_dict("records"),
+        "nota": "Valores en millones USD · Participación sobre total exportaciones",
+    }
+
+
+# Prefijo del nombre del CSV → función (DataFrame, nombre) → resumen
+RESUMIDORES = {
+    "trm_":                    _resumen_trm,
+    "comercio_exterior_":      _resumen_balanza,
+    "exportaciones_sectores_": _resumen_sectores,
+}
+
+
+# Columnas que necesita el resumidor: un trm_*.csv diario (fecha, trm) es
+# válido para serie_trm pero no tiene el resumen mensual
+COLUMNAS_REQUERIDAS = {
+    "trm_": {"año", "nombre_mes", "trm", "variacion_pct"},
+}
+
+
+def _prefijo(nombre: str) -> str | None:
+    return next((p for p in RESUMIDORES if nombre.startswith(p)), None)
+
+
+def _resumidor(nombre: str):
+    prefijo = _prefijo(nombre)
+    return RESUMIDORES[prefijo] if prefijo else None
+
+
+# ---------------------------------------------------------------------------
+# Almacén: memoria + datos/.resumenes/
+# ---------------------------------------------------------------------------
+
+_resumenes: dict[str, tuple[str, dict]] = {}   # nombre → (versión, resumen)
+_lock  = threading.Lock()
+_stats = {"aciertos": 0, "desde_disco": 0, "materializados": 0, "perezosos": 0,
+          "suma_ms": 0.0}
+
+
+def _dir() -> Path:
+    return config.DATOS_DIR / ".resumenes"
+
+
+def _leer_disco(nombre: str, version: str) -> dict | None:
+    try:
+        guardado = json.loads((_dir() / f"{Path(nombre).stem}.json").read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return guardado["resumen"] if guardado.get("version") == version else None
+
+
+def materializar(nombre: str) -> dict | None:
+    """
+    Calcula y guarda el resumen de la versión actual de datos/<nombre>.
+    Retorna None si el dataset no tiene resumidor o no trae sus columnas.
+    """
+    nombre = Path(nombre).name
+    resumidor = _resumidor(nombre)
+    if resumidor is None:
+        return None
+
+    inicio  = time.perf_counter()
+    df      = datasets.obtener(nombre)
+    if not COLUMNAS_REQUERIDAS.get(_prefijo(nombre), set()) <= set(df.columns):
+        return None
+    version = datasets.version(nombre)
+    resumen = resumidor(df, nombre)
+    ms      = (time.perf_counter() - inicio) * 1000
+
+    _dir().mkdir(parents=True, exist_ok=True)
+    (_dir() / f"{Path(nombre).stem}.json").write_text(
+        json.dumps({"version": version, "resumen": resumen},
+                   ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    with _lock:
+        _resumenes[nombre] = (version, resumen)
+        _stats["materializados"] += 1
+        _stats["suma_ms"] += ms
+    print(f"  [RESUMENES] {nombre} v{version} en {ms:.1f} ms")
+    return resumen
+
+
+def materializar_todos() -> None:
+    """Resúmenes de todos los datos/*.csv (al arrancar); reutiliza los de disco vigentes."""
+    for nombre in datasets.nombres():
+        if _resumidor(nombre) is None:
+            continue
+        try:
+            version = datasets.version(nombre)
+            guardado = _leer_disco(nombre, version)
+            if guardado is not None:
+                with _lock:
+                    _resumenes[nombre] = (version, guardado)
+                    _stats["desde_disco"] += 1
+            else:
+                materializar(nombre)
+        except Exception as e:
+            print(f"  [RESUMENES] {nombre}: {type(e).__name__}: {e}")
+
+
+def obtener(nombre: str) -> dict:
+    """
+    Resumen vigente de datos/<nombre> (compartido: no mutarlo). Si el CSV
+    cambió desde la materialización, se recalcula aquí.
+    """
+    nombre  = Path(nombre).name
+    version = datasets.version(nombre)   # FileNotFoundError si no existe
+    with _lock:
+        actual = _resumenes.get(nombre)
+        if actual is not None and actual[0] == version:
+            _stats["aciertos"] += 1
+            return actual[1]
+
+    guardado = _leer_disco(nombre, version)
+    if guardado is not None:
+        with _lock:
+            _resumenes[nombre] = (version, guardado)
+            _stats["desde_disco"] += 1
+        return guardado
+
+    resumen = materializar(nombre)
+    if resumen is None:
+        raise KeyError(f"{nombre} no tiene resumen precalculado")
+    with _lock:
+        _stats["perezosos"] += 1
+    return resumen
+
+
+def eliminar(nombre: str) -> None:
+    """Descarta el resumen de datos/<nombre> (al eliminar el CSV)."""
+    nombre = Path(nombre).name
+    with _lock:
+        _resumenes.pop(nombre, None)
+    try:
+        (_dir() / f"{Path(nombre).stem}.json").unlink()
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Resúmenes en memoria (versión) y cómo se sirvieron."""
+    with _lock:
+        st = dict(_stats)
+        vigentes = {n: v for n, (v, _) in sorted(_resumenes.items())}
+    return {
+        "resumenes":         vigentes,
+        "aciertos":          st["aciertos"],
+        "desde_disco":       st["desde_disco"],
+        "materializados":    st["materializados"],
+        "perezosos":         st["perezosos"],
+        "materializacion_media_ms": round(st["suma_ms"] / st["materializados"], 2)
+                                    if st["materializados"] else None,
+    }
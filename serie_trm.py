@@ -0,0 +1,423 @@
+"""
+serie_trm.py — Motor de series de tiempo de la TRM
+==================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+analizar_historico_trm solo sabía responder "últimos N de 12 meses" con
+df.tail(meses) y recalculaba mínimo / máximo / promedio con pandas en cada
+llamada. Con TRM diaria desde 1991 (~9.000 datos) y rangos de fechas
+arbitrarios eso escanea la serie en cada consulta.
+
+Este módulo une todos los datos/trm_*.csv en una serie ordenada por fecha,
+guardada en arrays NumPy, y al construirla precalcula:
+
+  sumas prefijas de x y x²             promedio y desviación de cualquier rango en O(1)
+  sumas prefijas de log-retornos y r²  volatilidad de cualquier rango en O(1)
+  tablas dispersas (sparse table)      mínimo / máximo (y su fecha) en O(1)
+  árbol de segmentos                   máxima caída (drawdown) del rango en O(log n)
+  agregado mensual                     promedio y variación por mes (serie_mensual)
+
+Las fechas se ubican con np.searchsorted (O(log n)); ninguna consulta de rango
+recorre la serie. La serie se reconstruye solo cuando cambia la versión de
+algún trm_*.csv (datasets.version).
+
+Formatos aceptados:
+  - mensual: columnas año, mes, trm     (cada mes se fecha en su día 1)
+  - diaria:  columnas fecha, trm
+Si dos archivos traen la misma fecha, gana el último en orden alfabético.
+
+Uso:
+    s = serie_trm.serie()
+    i, j = s.indices("2024-03", "2024-09")
+    s.resumen(i, j)   # {"trm_minimo", "trm_maximo", "volatilidad_anual_pct", ...}
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import datasets
+
+NOMBRES_MES = ["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio",
+               "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+
+# ---------------------------------------------------------------------------
+# Estructuras de rango
+# ---------------------------------------------------------------------------
+
+def _tabla_dispersa(valores: np.ndarray, menor: bool) -> list[np.ndarray]:
+    """
+    Sparse table de índices: niveles[k][i] = índice del mínimo (o máximo) de
+    valores[i : i + 2**k]. O(n log n) al construir, O(1) al consultar.
+    """
+    niveles = [np.arange(len(valores))]
+    k = 1
+    while (1 << k) <= len(valores):
+        previo = niveles[-1]
+        a, b   = previo[:-(1 << (k - 1))], previo[(1 << (k - 1)):]
+        gana_a = valores[a] <= valores[b] if menor else valores[a] >= valores[b]
+        niveles.append(np.where(gana_a, a, b))
+        k += 1
+    return niveles
+
+
+def _consultar_dispersa(niveles: list[np.ndarray], valores: np.ndarray,
+                        i: int, j: int, menor: bool) -> int:
+    """Índice del mínimo / máximo de valores[i..j] (inclusive) con dos bloques solapados."""
+    k    = (j - i + 1).bit_length() - 1
+    a, b = int(niveles[k][i]), int(niveles[k][j - (1 << k) + 1])
+    if menor:
+        return a if valores[a] <= valores[b] else b
+    return a if valores[a] >= valores[b] else b
+
+
+class _ArbolCaidas:
+    """
+    Árbol de segmentos para la máxima caída (pico → valle posterior) de un rango.
+    Cada nodo guarda (máx, índice, mín, índice, caída, índice pico, índice valle);
+    al unir izquierda + derecha la caída es la mayor entre las de cada lado y
+    la que va del máximo izquierdo al mínimo derecho.
+    """
+
+    def __init__(self, valores: np.ndarray):
+        n = len(valores)
+        self.base = 1 << max(0, (n - 1).bit_length())
+        tam = 2 * self.base
+        self.mx     = np.full(tam, -np.inf)
+        self.mx_i   = np.full(tam, -1, dtype=np.int64)
+        self.mn     = np.full(tam, np.inf)
+        self.mn_i   = np.full(tam, -1, dtype=np.int64)
+        self.caida  = np.zeros(tam)
+        self.pico   = np.full(tam, -1, dtype=np.int64)
+        self.valle  = np.full(tam, -1, dtype=np.int64)
+
+        hojas = slice(self.base, self.base + n)
+        self.mx[hojas] = self.mn[hojas] = valores
+        self.mx_i[hojas] = self.mn_i[hojas] = np.arange(n)
+        self.pico[hojas] = self.valle[hojas] = np.arange(n)
+
+        # Construcción por niveles, vectorizada
+        inicio = self.base // 2
+        while inicio >= 1:
+            padres = np.arange(inicio, 2 * inicio)
+            izq, der = 2 * padres, 2 * padres + 1
+            self._unir_en(padres, izq, der)
+            inicio //= 2
+
+    def _unir_en(self, p, izq, der):
+        usa_izq_mx = self.mx[izq] >= self.mx[der]
+        self.mx[p]   = np.where(usa_izq_mx, self.mx[izq], self.mx[der])
+        self.mx_i[p] = np.where(usa_izq_mx, self.mx_i[izq], self.mx_i[der])
+        usa_izq_mn = self.mn[izq] <= self.mn[der]
+        self.mn[p]   = np.where(usa_izq_mn, self.mn[izq], self.mn[der])
+        self.mn_i[p] = np.where(usa_izq_mn, self.mn_i[izq], self.mn_i[der])
+
+        validos = np.isfinite(self.mx[izq]) & np.isfinite(self.mn[der])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cruce = np.where(validos, 1 - self.mn[der] / self.mx[izq], 0.0)
+        mejor = np.argmax(np.stack([self.caida[izq], self.caida[der], cruce]), axis=0)
+        self.caida[p] = np.choose(mejor, [self.caida[izq], self.caida[der], cruce])
+        self.pico[p]  = np.choose(mejor, [self.pico[izq], self.pico[der], self.mx_i[izq]])
+        self.valle[p] = np.choose(mejor, [self.valle[izq], self.valle[der], self.mn_i[der]])
+
+    def _nodo(self, k: int) -> tuple:
+        return (self.mx[k], int(self.mx_i[k]), self.mn[k], int(self.mn_i[k]),
+                self.caida[k], int(self.pico[k]), int(self.valle[k]))
+
+    @staticmethod
+    def _unir(a: tuple | None, b: tuple) -> tuple:
+        if a is None:
+            return b
+        mx, mx_i = (a[0], a[1]) if a[0] >= b[0] else (b[0], b[1])
+        mn, mn_i = (a[2], a[3]) if a[2] <= b[2] else (b[2], b[3])
+        candidatos = [(a[4], a[5], a[6]), (b[4], b[5], b[6]), (1 - b[2] / a[0], a[1], b[3])]
+        caida, pico, valle = max(candidatos, key=lambda c: c[0])
+        return (mx, mx_i, mn, mn_i, caida, pico, valle)
+
+    def consultar(self, i: int, j: int) -> tuple[float, int, int]:
+        """(caída, índice pico, índice valle) de valores[i..j]; O(log n)."""
+        izq, der = None, []
+        i, j = i + self.base, j + self.base + 1
+        while i < j:
+            if i & 1:
+                izq = self._unir(izq, self._nodo(i))
+                i += 1
+            if j & 1:
+                j -= 1
+                der.append(self._nodo(j))
+            i //= 2
+            j //= 2
+        for nodo in reversed(der):
+            izq = self._unir(izq, nodo)
+        return izq[4], izq[5], izq[6]
+
+
+# ---------------------------------------------------------------------------
+# Serie
+# ---------------------------------------------------------------------------
+
+class SerieTRM:
+    """Serie TRM ordenada por fecha con estructuras precalculadas (inmutable)."""
+
+    def __init__(self, fechas: np.ndarray, valores: np.ndarray):
+        inicio = time.perf_counter()
+        self.fechas  = fechas.astype("datetime64[D]")
+        self.valores = valores.astype(np.float64)
+        self.n       = len(self.valores)
+
+        dias = np.median(np.diff(self.fechas).astype(np.int64)) if self.n > 1 else 30
+        self.frecuencia   = "diaria" if dias <= 4 else "semanal" if dias <= 8 else "mensual"
+        self.periodos_año = {"diaria": 252, "semanal": 52, "mensual": 12}[self.frecuencia]
+
+        self._suma  = np.concatenate(([0.0], np.cumsum(self.valores)))
+        self._suma2 = np.concatenate(([0.0], np.cumsum(self.valores ** 2)))
+        retornos    = np.diff(np.log(self.valores))
+        self._ret   = np.concatenate(([0.0], np.cumsum(retornos)))
+        self._ret2  = np.concatenate(([0.0], np.cumsum(retornos ** 2)))
+        self._min   = _tabla_dispersa(self.valores, menor=True)
+        self._max   = _tabla_dispersa(self.valores, menor=False)
+        self._caidas = _ArbolCaidas(self.valores)
+
+        # Agregado mensual: promedio del mes y variación frente al mes anterior
+        meses = self.fechas.astype("datetime64[M]")
+        self.meses, primeros = np.unique(meses, return_index=True)
+        cuenta = np.diff(np.append(primeros, self.n))
+        self.promedio_mes = np.add.reduceat(self.valores, primeros) / cuenta
+        self.variacion_mes = np.concatenate(
+            ([0.0], (self.promedio_mes[1:] / self.promedio_mes[:-1] - 1) * 100))
+        self.construccion_ms = (time.perf_counter() - inicio) * 1000
+
+    # ── Ubicación de fechas ────────────────────────────────────────────────
+    @staticmethod
+    def _fecha(texto: str, fin: bool) -> np.datetime64:
+        """'AAAA', 'AAAA-MM' o 'AAAA-MM-DD'; con fin=True, el último día del período."""
+        texto = str(texto).strip()
+        unidad = {4: "Y", 7: "M"}.get(len(texto), "D")
+        f = np.datetime64(texto, unidad)
+        return (f + 1).astype("datetime64[D]") - 1 if fin else f.astype("datetime64[D]")
+
+    def indices(self, desde: str | None = None, hasta: str | None = None) -> tuple[int, int]:
+        """Índices [i, j] (inclusive) de las observaciones entre desde y hasta. O(log n)."""
+        i = 0 if not desde else int(np.searchsorted(self.fechas, self._fecha(desde, False), "left"))
+        j = self.n - 1 if not hasta else \
+            int(np.searchsorted(self.fechas, self._fecha(hasta, True), "right")) - 1
+        if i > j:
+            raise ValueError(f"no hay datos de TRM entre {desde or 'el inicio'} y {hasta or 'el final'}")
+        return i, j
+
+    def ultimos_meses(self, meses: int) -> tuple[int, int]:
+        """Índices de los últimos N meses calendario de la serie."""
+        desde = (self.meses[-1] - (meses - 1)).astype("datetime64[D]")
+        return int(np.searchsorted(self.fechas, desde, "left")), self.n - 1
+
+    # ── Agregados de rango ────────────────────────────────────────────────
+    def promedio(self, i: int, j: int) -> float:
+        return (self._suma[j + 1] - self._suma[i]) / (j - i + 1)
+
+    def desviacion(self, i: int, j: int) -> float:
+        n     = j - i + 1
+        media = self.promedio(i, j)
+        return float(np.sqrt(max(0.0, (self._suma2[j + 1] - self._suma2[i]) / n - media ** 2)))
+
+    def minimo(self, i: int, j: int) -> int:
+        return _consultar_dispersa(self._min, self.valores, i, j, menor=True)
+
+    def maximo(self, i: int, j: int) -> int:
+        return _consultar_dispersa(self._max, self.valores, i, j, menor=False)
+
+    def volatilidad(self, i: int, j: int) -> float | None:
+        """Desviación anualizada (%) de los log-retornos dentro de [i, j]."""
+        n = j - i   # retornos entre observaciones consecutivas del rango
+        if n < 2:
+            return None
+        s  = self._ret[j] - self._ret[i]
+        s2 = self._ret2[j] - self._ret2[i]
+        var = max(0.0, (s2 - s * s / n) / (n - 1))
+        return float(np.sqrt(var * self.periodos_año) * 100)
+
+    def volatilidad_movil(self, ventana: int) -> np.ndarray:
+        """Volatilidad anualizada (%) de cada ventana de N retornos; vectorizada con las sumas prefijas."""
+        if ventana < 2 or ventana >= self.n:
+            return np.array([])
+        s   = self._ret[ventana:] - self._ret[:-ventana]
+        s2  = self._ret2[ventana:] - self._ret2[:-ventana]
+        var = np.maximum(0.0, (s2 - s * s / ventana) / (ventana - 1))
+        return np.sqrt(var * self.periodos_año) * 100
+
+    def caida_maxima(self, i: int, j: int) -> tuple[float, int, int]:
+        """(caída %, índice pico, índice valle) de [i, j]. O(log n)."""
+        caida, pico, valle = self._caidas.consultar(i, j)
+        return caida * 100, pico, valle
+
+    def variacion_anual(self, j: int) -> float | None:
+        """Variación % de la observación j frente a la última de un año antes (None si no hay)."""
+        hace_un_año = (self.fechas[j].astype("datetime64[M]") - 12).astype("datetime64[D]") \
+            + (self.fechas[j] - self.fechas[j].astype("datetime64[M]").astype("datetime64[D]"))
+        k = int(np.searchsorted(self.fechas, hace_un_año, "right")) - 1
+        if k < 0:
+            return None
+        return float((self.valores[j] / self.valores[k] - 1) * 100)
+
+    def resumen(self, i: int, j: int) -> dict:
+        """Estadísticas del rango [i, j] sin recorrerlo."""
+        i_min, i_max = self.minimo(i, j), self.maximo(i, j)
+        caida, pico, valle = self.caida_maxima(i, j)
+        volatilidad = self.volatilidad(i, j)
+        anual = self.variacion_anual(j)
+        return {
+            "observaciones":          j - i + 1,
+            "trm_minimo":             round(float(self.valores[i_min]), 2),
+            "fecha_minimo":           str(self.fechas[i_min]),
+            "trm_maximo":             round(float(self.valores[i_max]), 2),
+            "fecha_maximo":           str(self.fechas[i_max]),
+            "trm_promedio":           round(float(self.promedio(i, j)), 2),
+            "desviacion":             round(self.desviacion(i, j), 2),
+            "fecha_inicio":           str(self.fechas[i]),
+            "fecha_fin":              str(self.fechas[j]),
+            "trm_inicio":             round(float(self.valores[i]), 2),
+            "trm_fin":                round(float(self.valores[j]), 2),
+            "variacion_acumulada_pct": round(float(self.valores[j] / self.valores[i] - 1) * 100, 2),
+            "volatilidad_anual_pct":  round(volatilidad, 2) if volatilidad is not None else None,
+            "caida_maxima_pct":       round(float(caida), 2),
+            "caida_desde":            str(self.fechas[pico]),
+            "caida_hasta":            str(self.fechas[valle]),
+            "variacion_anual_pct":    round(anual, 2) if anual is not None else None,
+        }
+
+    def serie_mensual(self, i: int, j: int) -> list[dict]:
+        """Promedio y variación de cada mes que toca el rango [i, j]."""
+        a = int(np.searchsorted(self.meses, self.fechas[i].astype("datetime64[M]"), "left"))
+        b = int(np.searchsorted(self.meses, self.fechas[j].astype("datetime64[M]"), "right"))
+        varios_años = self.meses[a].astype("datetime64[Y]") != self.meses[b - 1].astype("datetime64[Y]")
+        filas = []
+        for m, prom, var in zip(self.meses[a:b], self.promedio_mes[a:b], self.variacion_mes[a:b]):
+            año, mes = int(str(m)[:4]), int(str(m)[5:7])
+            nombre = NOMBRES_MES[mes - 1] + (f" {año}" if varios_años else "")
+            filas.append({"mes": nombre, "trm": round(float(prom), 2),
+                          "variacion_pct": round(float(var), 2)})
+        return filas
+
+
+# ---------------------------------------------------------------------------
+# Carga desde datos/trm_*.csv (cacheada por versión)
+# ---------------------------------------------------------------------------
+
+_lock  = threading.Lock()
+_cache: dict = {"clave": None, "serie": None}
+_stats = {"construcciones": 0, "consultas": 0}
+
+
+def archivos() -> list[str]:
+    return [n for n in datasets.nombres() if n.startswith("trm_")]
+
+
+def fuente() -> str:
+    """Línea de fuente con todos los CSV que forman la serie."""
+    return "Fuente: Banco de la República · " + ", ".join(f"datos/{n}" for n in archivos())
+
+
+def _leer(nombre: str) -> tuple[np.ndarray, np.ndarray]:
+    import pandas as pd
+
+    df = datasets.obtener(nombre)
+    if "fecha" in df.columns:
+        fechas = pd.to_datetime(df["fecha"]).to_numpy().astype("datetime64[D]")
+    else:
+        fechas = np.array([f"{int(a):04d}-{int(m):02d}-01" for a, m in zip(df["año"], df["mes"])],
+                          dtype="datetime64[D]")
+    return fechas, df["trm"].to_numpy(dtype=np.float64)
+
+
+def serie() -> SerieTRM:
+    """Serie TRM vigente; se reconstruye si cambió algún trm_*.csv."""
+    archivos_trm = archivos()
+    if not archivos_trm:
+        raise FileNotFoundError("no hay archivos datos/trm_*.csv")
+    clave = tuple((n, datasets.version(n)) for n in archivos_trm)
+    with _lock:
+        _stats["consultas"] += 1
+        if _cache["clave"] == clave:
+            return _cache["serie"]
+
+        partes  = [_leer(n) for n in archivos_trm]
+        fechas  = np.concatenate([f for f, _ in partes])
+        valores = np.concatenate([v for _, v in partes])
+        # Orden estable por fecha; ante fechas repetidas queda la del último archivo
+        orden   = np.argsort(fechas, kind="stable")
+        fechas, valores = fechas[orden], valores[orden]
+        ultimo  = np.append(fechas[1:] != fechas[:-1], True)
+        validos = ultimo & np.isfinite(valores) & (valores > 0)
+
+        s = SerieTRM(fechas[validos], valores[validos])
+        _cache.update(clave=clave, serie=s)
+        _stats["construcciones"] += 1
+        print(f"  [SERIE_TRM] {s.n} observaciones ({s.frecuencia}) "
+              f"{s.fechas[0]} → {s.fechas[-1]} en {s.construccion_ms:.1f} ms")
+        return s
+
+
+def historico(meses: int = 6, desde: str = "", hasta: str = "") -> dict:
+    """
+    Análisis de los últimos N meses o del rango desde/hasta, con la serie
+    mensual completa (analizar_historico_trm y GET /api/datos/trm/historico).
+    """
+    s = serie()
+    if desde or hasta:
+        i, j    = s.indices(desde or None, hasta or None)
+        periodo = f"período {desde or s.fechas[0]} a {hasta or s.fechas[-1]}"
+    else:
+        meses   = max(1, min(int(meses), len(s.meses)))
+        i, j    = s.ultimos_meses(meses)
+        periodo = f"últimos {meses} meses"
+        años    = {str(s.fechas[i])[:4], str(s.fechas[j])[:4]}
+        if len(años) == 1:
+            periodo += f" de {años.pop()}"
+
+    r       = s.resumen(i, j)
+    mensual = s.serie_mensual(i, j)
+    por_mes = s.frecuencia == "mensual"
+    return {
+        "periodo":                periodo,
+        "desde":                  mensual[0]["mes"] if por_mes else r["fecha_inicio"],
+        "hasta":                  mensual[-1]["mes"] if por_mes else r["fecha_fin"],
+        "trm_minimo":             r["trm_minimo"],
+        "trm_maximo":             r["trm_maximo"],
+        "trm_promedio":           r["trm_promedio"],
+        "variacion_acumulada_pct": r["variacion_acumulada_pct"],
+        "tendencia":              "alcista" if r["variacion_acumulada_pct"] > 0 else "bajista",
+        "volatilidad_anual_pct":  r["volatilidad_anual_pct"],
+        "caida_maxima_pct":       r["caida_maxima_pct"],
+        "variacion_anual_pct":    r["variacion_anual_pct"],
+        "observaciones":          r["observaciones"],
+        "serie_mensual":          mensual,
+        "nota":                   fuente(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Serie cargada (tamaño, frecuencia, rango de fechas) y reconstrucciones."""
+    with _lock:
+        s  = _cache["serie"]
+        st = dict(_stats)
+    if s is None:
+        return {"cargada": False, **st}
+    return {
+        "cargada":         True,
+        "observaciones":   s.n,
+        "frecuencia":      s.frecuencia,
+        "desde":           str(s.fechas[0]),
+        "hasta":           str(s.fechas[-1]),
+        "archivos":        [n for n, _ in _cache["clave"]],
+        "construccion_ms": round(s.construccion_ms, 2),
+        **st,
+    }
@@ -7,17 +7,40 @@ Tres grupos de herramientas especializadas:
 
   TOOLS_TRM   → Tipo de cambio dólar/peso colombiano
     obtener_trm_actual()            tasa más reciente del CSV
-    analizar_historico_trm(meses)   tendencia y estadísticas históricas
+    analizar_historico_trm(meses | desde, hasta)
+                                    tendencia y estadísticas de un rango (serie_trm.py)
 
   TOOLS_DATOS → Comercio exterior Colombia 2024
     consultar_balanza_comercial()    exportaciones vs importaciones mensuales
     analizar_sectores_exportacion()  estructura sectorial de exportaciones
+    consultar_datos_sql(sql)         SELECT de solo lectura sobre todos los datasets
+    analizar_trm_vs_comercio()       correlaciones y elasticidades TRM ↔ comercio
+    consultar_cubo_comercio(...)     comercio detallado (sector × país × capítulo) desde
+                                     el cubo preagregado; solo si hay comercio_detalle_*.csv
+
+  Generadas  → por cada CSV subido a datos/ sin tools propias (tools_dinamicas.py)
+    describir_<tabla>(), filtrar_<tabla>(...), agregar_<tabla>(...)
+    Los agentes las reciben con tools_datos() / tools_todos().
 
   TOOLS_RAG   → Documentos DANE (índice vectorial en pgvector)
     buscar_documentos_dane(query, k) búsqueda semántica en reportes DANE
     listar_reportes_dane()           catálogo de documentos disponibles
 
 Prerequisito para TOOLS_RAG: ejecutar preparar_base.py al menos una vez.
+
+Todas las tools llevan @memo.memoizar: llamadas idénticas dentro de una misma
+request se ejecutan una sola vez (ver memo.py).
+
+Los CSV se leen del registro en memoria de datasets.py (una carga por versión
+del archivo, no un pd.read_csv por llamada), pidiendo solo las columnas y filas
+que usa cada tool (con pyarrow: lectura columnar memory-mapped, columnar.py).
+TRM actual, balanza y sectores devuelven el resumen precalculado por versión
+del dataset (resumenes.py: se materializa al subir el CSV y al arrancar).
+Las estadísticas de rango de la TRM salen de las estructuras precalculadas de
+serie_trm.py (sumas prefijas, tablas dispersas) sin recorrer la serie.
+
+Las salidas pasan por compactar.salida(): JSON minificado, listas como tabla
+y series largas resumidas salvo detalle=True (ver compactar.py).
 """
 
 import sys
@@ -26,7 +49,16 @@ import json
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
 
+import compactar
 import config
+import analisis_cruzado
+import consulta_sql
+import cubo_comercio
+import memo
+import pool_procesos
+import resumenes
+import serie_trm
+import tools_dinamicas
 from langchain_core.tools import tool
 from vectorstore_factory import crear_embeddings, cargar_vectorstore
 
@@ -36,6 +68,7 @@ from vectorstore_factory import crear_embeddings, cargar_vectorstore
 # ===========================================================================
 
 @tool
+@memo.memoizar
 def obtener_trm_actual() -> str:
     """
     Retorna la tasa de cambio representativa del mercado (TRM) más reciente
@@ -48,27 +81,8 @@ def obtener_trm_actual() -> str:
          "variacion_pct": 2.45, "interpretacion": "El dólar subió 2.45% en Diciembre"}
     """
     try:
-        import pandas as pd
-        ruta = config.DATOS_DIR / "trm_2024.csv"
-        df   = pd.read_csv(ruta)
-        ult  = df.iloc[-1]
-        ant  = df.iloc[-2]
-
-        direccion = "subió" if float(ult["variacion_pct"]) > 0 else "bajó"
-        interpretacion = (
-            f"El dólar {direccion} {abs(float(ult['variacion_pct'])):.2f}% "
-            f"en {ult['nombre_mes']} respecto a {ant['nombre_mes']}."
-        )
-
-        return json.dumps({
-            "mes":              ult["nombre_mes"],
-            "año":              int(ult["año"]),
-            "trm":              float(ult["trm"]),
-            "variacion_pct":    round(float(ult["variacion_pct"]), 2),
-            "trm_mes_anterior": float(ant["trm"]),
-            "interpretacion":   interpretacion,
-            "nota":             "Fuente: Banco de la República · datos/trm_2024.csv",
-        }, ensure_ascii=False, indent=2)
+        return compactar.salida("obtener_trm_actual", resumenes.obtener("trm_2024.csv"),
+                                opcionales=("nota",))
 
     except Exception as e:
         return json.dumps({"error": f"No se pudo leer trm_2024.csv: {str(e)}"},
@@ -76,49 +90,33 @@ def obtener_trm_actual() -> str:
 
 
 @tool
-def analizar_historico_trm(meses: int = 6) -> str:
+@memo.memoizar
+@pool_procesos.en_pool
+def analizar_historico_trm(meses: int = 6, desde: str = "", hasta: str = "",
+                           detalle: bool = False) -> str:
     """
-    Analiza la tendencia histórica del TRM durante los últimos N meses de 2024.
-    Calcula mínimo, máximo, promedio y variación acumulada del período.
+    Analiza la tendencia histórica de la TRM: los últimos N meses o un rango
+    de fechas. Calcula mínimo, máximo, promedio, variación acumulada,
+    volatilidad anualizada, máxima caída del período y variación anual.
 
     Parámetros:
-        meses: número de meses a analizar (1-12, default 6)
+        meses:   número de meses a analizar hacia atrás desde el último dato
+                 (default 6; se ignora si se pasa desde/hasta)
+        desde:   inicio del rango: "AAAA", "AAAA-MM" o "AAAA-MM-DD" (opcional)
+        hasta:   fin del rango, mismo formato (opcional; por defecto el último dato)
+        detalle: True para recibir la serie mensual completa (por defecto
+                 solo los últimos meses; las estadísticas cubren todo el período)
 
     Ejemplo de uso:
-        analizar_historico_trm(meses=3)    → análisis del último trimestre
-        analizar_historico_trm(meses=12)   → análisis del año completo
+        analizar_historico_trm(meses=3)                        → último trimestre
+        analizar_historico_trm(meses=12)                       → último año
+        analizar_historico_trm(desde="2024-03", hasta="2024-06") → marzo a junio
     """
     try:
-        import pandas as pd
-        meses = max(1, min(int(meses), 12))
-        ruta  = config.DATOS_DIR / "trm_2024.csv"
-        df    = pd.read_csv(ruta).tail(meses)
-
-        trm_min    = float(df["trm"].min())
-        trm_max    = float(df["trm"].max())
-        trm_prom   = float(df["trm"].mean())
-        trm_inicio = float(df.iloc[0]["trm"])
-        trm_fin    = float(df.iloc[-1]["trm"])
-        variacion  = round((trm_fin - trm_inicio) / trm_inicio * 100, 2)
-
-        tendencia = "alcista" if variacion > 0 else "bajista"
-        serie = [
-            {"mes": row["nombre_mes"], "trm": float(row["trm"]),
-             "variacion_pct": round(float(row["variacion_pct"]), 2)}
-            for _, row in df.iterrows()
-        ]
-
-        return json.dumps({
-            "periodo":                f"últimos {meses} meses de 2024",
-            "desde":                  df.iloc[0]["nombre_mes"],
-            "hasta":                  df.iloc[-1]["nombre_mes"],
-            "trm_minimo":             trm_min,
-            "trm_maximo":             trm_max,
-            "trm_promedio":           round(trm_prom, 2),
-            "variacion_acumulada_pct": variacion,
-            "tendencia":              tendencia,
-            "serie_mensual":          serie,
-        }, ensure_ascii=False, indent=2)
+        return compactar.salida("analizar_historico_trm",
+                                serie_trm.historico(meses, desde, hasta),
+                                opcionales=("observaciones", "nota"), series=("serie_mensual",),
+                                detalle=detalle)
 
     except Exception as e:
         return json.dumps({"error": f"Error analizando TRM: {str(e)}"},
@@ -130,7 +128,8 @@ def analizar_historico_trm(meses: int = 6) -> str:
 # ===========================================================================
 
 @tool
-def consultar_balanza_comercial() -> str:
+@memo.memoizar
+def consultar_balanza_comercial(detalle: bool = False) -> str:
     """
     Retorna la balanza comercial mensual de Colombia en 2024:
     exportaciones, importaciones y saldo (exportaciones - importaciones).
@@ -138,42 +137,14 @@ def consultar_balanza_comercial() -> str:
     Un saldo negativo (déficit comercial) significa que Colombia importa
     más de lo que exporta. Un saldo positivo sería superávit.
 
-    No requiere parámetros.
+    Parámetros:
+        detalle: True para recibir los 12 meses (por defecto solo los últimos;
+                 los totales siempre cubren el año completo)
     """
     try:
-        import pandas as pd
-        ruta = config.DATOS_DIR / "comercio_exterior_2024.csv"
-        df   = pd.read_csv(ruta)
-
-        total_exp   = float(df["exportaciones_usd_mill"].sum())
-        total_imp   = float(df["importaciones_usd_mill"].sum())
-        balanza_tot = round(total_exp - total_imp, 1)
-        tipo        = "superávit" if balanza_tot >= 0 else "déficit"
-
-        mes_mayor_exp = df.loc[df["exportaciones_usd_mill"].idxmax()]
-        mes_mayor_imp = df.loc[df["importaciones_usd_mill"].idxmax()]
-
-        serie = [
-            {
-                "mes":           row["nombre_mes"],
-                "exportaciones": float(row["exportaciones_usd_mill"]),
-                "importaciones": float(row["importaciones_usd_mill"]),
-                "balanza":       float(row["balanza_comercial"]),
-            }
-            for _, row in df.iterrows()
-        ]
-
-        return json.dumps({
-            "año":                     2024,
-            "total_exportaciones_usd": round(total_exp, 1),
-            "total_importaciones_usd": round(total_imp, 1),
-            "balanza_anual_usd":       balanza_tot,
-            "tipo_balanza":            tipo,
-            "mes_mayor_exportacion":   mes_mayor_exp["nombre_mes"],
-            "mes_mayor_importacion":   mes_mayor_imp["nombre_mes"],
-            "serie_mensual":           serie,
-            "nota":                    "Valores en millones de dólares USD · Fuente DANE/DIAN",
-        }, ensure_ascii=False, indent=2)
+        return compactar.salida("consultar_balanza_comercial",
+                                resumenes.obtener("comercio_exterior_2024.csv"),
+                                series=("serie_mensual",), detalle=detalle)
 
     except Exception as e:
         return json.dumps(
@@ -182,6 +153,7 @@ def consultar_balanza_comercial() -> str:
 
 
 @tool
+@memo.memoizar
 def analizar_sectores_exportacion() -> str:
     """
     Retorna la estructura de las exportaciones colombianas por sector económico
@@ -193,35 +165,10 @@ def analizar_sectores_exportacion() -> str:
     No requiere parámetros.
     """
     try:
-        import pandas as pd
-        ruta = config.DATOS_DIR / "exportaciones_sectores_2024.csv"
-        df   = pd.read_csv(ruta).sort_values("participacion_pct", ascending=False)
-
-        total = float(df["valor_usd_mill"].sum())
-
-        top3 = df.head(3)[["sector", "participacion_pct", "valor_usd_mill"]].to_dict("records")
-        sectores_crecimiento = df[df["variacion_anual_pct"] > 0].sort_values(
-            "variacion_anual_pct", ascending=False
-        )[["sector", "variacion_anual_pct"]].head(3).to_dict("records")
-
-        sectores = [
-            {
-                "sector":              row["sector"],
-                "valor_usd_mill":      float(row["valor_usd_mill"]),
-                "participacion_pct":   float(row["participacion_pct"]),
-                "variacion_anual_pct": float(row["variacion_anual_pct"]),
-            }
-            for _, row in df.iterrows()
-        ]
-
-        return json.dumps({
-            "año":                       2024,
-            "total_exportaciones_usd":   round(total, 1),
-            "sectores_por_participacion": sectores,
-            "top_3_sectores":            top3,
-            "sectores_con_mayor_crecimiento": sectores_crecimiento,
-            "nota": "Valores en millones USD · Participación sobre total exportaciones",
-        }, ensure_ascii=False, indent=2)
+        # top_3_sectores = primeras 3 filas de la tabla ordenada: se omite en modo compacto
+        return compactar.salida("analizar_sectores_exportacion",
+                                resumenes.obtener("exportaciones_sectores_2024.csv"),
+                                opcionales=("top_3_sectores",))
 
     except Exception as e:
         return json.dumps(
@@ -229,6 +176,119 @@ def analizar_sectores_exportacion() -> str:
             ensure_ascii=False)
 
 
+@tool
+@memo.memoizar
+@pool_procesos.en_pool
+def consultar_datos_sql(sql: str) -> str:
+    """
+    Ejecuta UNA consulta SQL de solo lectura (SELECT o WITH) sobre los datasets
+    de datos/. Úsala para cálculos que las otras herramientas no traen:
+    promedios por período, rankings, filtros, el mes con mayor déficit, etc.
+
+    Tablas (nombre del CSV sin extensión):
+        trm_2024(año, mes, nombre_mes, trm, variacion_pct)
+        comercio_exterior_2024(año, mes, nombre_mes, exportaciones_usd_mill,
+                               importaciones_usd_mill, balanza_comercial)
+        exportaciones_sectores_2024(sector, valor_usd_mill, participacion_pct,
+                                    variacion_anual_pct)
+    Los CSV subidos a datos/ aparecen como tablas nuevas.
+
+    Ejemplo:
+        SELECT AVG(exportaciones_usd_mill) FROM comercio_exterior_2024 WHERE mes > 6
+
+    Parámetros:
+        sql: una sola sentencia SELECT/WITH (sin comentarios ni escritura)
+    """
+    try:
+        resultado = consulta_sql.ejecutar(sql)
+    except Exception as e:
+        error = {"error": f"{type(e).__name__}: {e}"}
+        try:
+            error["tablas_disponibles"] = consulta_sql.esquema()
+        except Exception:
+            pass
+        return json.dumps(error, ensure_ascii=False)
+
+    return compactar.salida("consultar_datos_sql", {
+        "resultado": {"cols": resultado["cols"], "filas": resultado["filas"]},
+        "total_filas": resultado["total_filas"],
+        "truncado":    resultado["truncado"],
+        "motor":       resultado["motor"],
+    }, opcionales=("motor",))
+
+
+@tool
+@memo.memoizar
+@pool_procesos.en_pool
+def analizar_trm_vs_comercio(rezago_max: int = 3, detalle: bool = False) -> str:
+    """
+    Cruza la TRM mensual con exportaciones, importaciones y balanza comercial
+    (mismo año y mes) y calcula la relación entre ellas. Úsala para preguntas
+    como "¿cómo afectó el dólar a las exportaciones?" en vez de comparar a
+    mano las salidas de las tools de TRM y de balanza.
+
+    Retorna correlaciones (niveles y variaciones mensuales), correlaciones
+    con rezago (la TRM de un mes contra el comercio de k meses después),
+    elasticidades (% de cambio del comercio por cada 1% de cambio de la TRM)
+    y variaciones anuales si hay datos del año anterior.
+
+    Parámetros:
+        rezago_max: rezago máximo en meses para las correlaciones rezagadas (default 3)
+        detalle:    True para recibir todas las filas de las tablas
+    """
+    try:
+        resultado = analisis_cruzado.trm_vs_comercio(rezago_max)
+        return compactar.salida("analizar_trm_vs_comercio", resultado,
+                                series=("correlaciones_rezagadas", "variacion_anual"),
+                                detalle=detalle)
+
+    except Exception as e:
+        return json.dumps({"error": f"Error cruzando TRM y comercio exterior: {str(e)}"},
+                          ensure_ascii=False)
+
+
+@tool
+@memo.memoizar
+@pool_procesos.en_pool
+def consultar_cubo_comercio(medida: str = "exportaciones", tiempo: str = "año",
+                            por: str = "", filtros: str = "", desde: str = "",
+                            hasta: str = "", limite: int = 0) -> str:
+    """
+    Comercio exterior detallado por sector, país socio y capítulo arancelario,
+    respondido desde un cubo preagregado (no escanea las filas originales).
+    Sirve para cortes (un país), cubos (varios sectores y países) y drill-down
+    (primero por sector, luego por país dentro de un sector).
+
+    Parámetros:
+        medida:  exportaciones | importaciones | balanza | registros
+        tiempo:  mes | trimestre | año | total (agrupación temporal)
+        por:     dimensiones de agrupación separadas por coma: sector, pais, capitulo
+        filtros: "dimensión=valor1|valor2; otra=valor", p. ej.
+                 "sector=Café|Flores; pais=Estados Unidos"
+        desde:   inicio del período: "AAAA", "AAAA-Tn" (trimestre) o "AAAA-MM"
+        hasta:   fin del período, mismo formato
+        limite:  máximo de filas, ordenadas por período y valor descendente
+                 (0 = CUBO_MAX_FILAS)
+
+    Ejemplo:
+        consultar_cubo_comercio(tiempo="trimestre", por="sector",
+                                filtros="pais=China", desde="2023")
+    """
+    try:
+        filtros_dict = {}
+        for parte in filtros.split(";"):
+            if parte.strip():
+                dim, _, valores = parte.partition("=")
+                filtros_dict[dim.strip()] = [v.strip() for v in valores.split("|") if v.strip()]
+        resultado = cubo_comercio.consultar(
+            medida, tiempo, [d.strip() for d in por.split(",") if d.strip()],
+            filtros_dict, desde, hasta, limite)
+        return compactar.salida("consultar_cubo_comercio", resultado, opcionales=("fuente",))
+
+    except Exception as e:
+        return json.dumps({"error": f"{type(e).__name__}: {e}"}, ensure_ascii=False)
+
+
 # ===========================================================================
 # GRUPO 3 — Herramientas RAG (documentos DANE en pgvector)
 # ===========================================================================
@@ -250,6 +310,7 @@ def _obtener_vectorstore():
 
 
 @tool
+@memo.memoizar
 def buscar_documentos_dane(query: str, k: int = 4) -> str:
     """
     Busca los fragmentos más relevantes en los reportes del DANE
@@ -279,12 +340,12 @@ def buscar_documentos_dane(query: str, k: int = 4) -> str:
                 "relevancia": relevancia,
             })
 
-        return json.dumps({
+        return compactar.salida("buscar_documentos_dane", {
             "query":      query,
             "k":          k,
             "fragmentos": fragmentos,
             "total":      len(fragmentos),
-        }, ensure_ascii=False, indent=2)
+        }, opcionales=("query", "k"))
 
     except Exception as e:
         return json.dumps(
@@ -293,6 +354,7 @@ def buscar_documentos_dane(query: str, k: int = 4) -> str:
 
 
 @tool
+@memo.memoizar
 def listar_reportes_dane() -> str:
     """
     Lista los reportes del DANE disponibles en el índice vectorial.
@@ -331,14 +393,14 @@ def listar_reportes_dane() -> str:
             "datos_clave": ["51,5M habitantes", "Bogotá 8,7M", "Urbanización 81,1%"],
         },
     ]
-    return json.dumps({
+    return compactar.salida("listar_reportes_dane", {
         "documentos_disponibles": catalogo,
         "total": len(catalogo),
         "instrucciones": (
             "Usa buscar_documentos_dane(query) para buscar en estos documentos. "
             "El índice debe estar creado (python preparar_base.py)."
         ),
-    }, ensure_ascii=False, indent=2)
+    }, opcionales=("instrucciones",))
 
 
 # ===========================================================================
@@ -346,6 +408,23 @@ def listar_reportes_dane() -> str:
 # ===========================================================================
 
 TOOLS_TRM   = [obtener_trm_actual, analizar_historico_trm]
-TOOLS_DATOS = [consultar_balanza_comercial, analizar_sectores_exportacion]
+TOOLS_DATOS = [consultar_balanza_comercial, analizar_sectores_exportacion, consultar_datos_sql,
+               analizar_trm_vs_comercio]
 TOOLS_RAG   = [buscar_documentos_dane, listar_reportes_dane]
 TOOLS_TODOS = TOOLS_TRM + TOOLS_DATOS + TOOLS_RAG
+
+
+def _tools_condicionales() -> list:
+    """Tools que solo se ofrecen si existen sus datos: cubo y CSV subidos."""
+    cubo = [consultar_cubo_comercio] if cubo_comercio.disponible() else []
+    return cubo + tools_dinamicas.tools()
+
+
+def tools_datos() -> list:
+    """TOOLS_DATOS más el cubo de comercio y las tools de CSV subidos (tools_dinamicas.py)."""
+    return TOOLS_DATOS + _tools_condicionales()
+
+
+def tools_todos() -> list:
+    """TOOLS_TODOS más el cubo de comercio y las tools de CSV subidos."""
+    return TOOLS_TODOS + _tools_condicionales()
@@ -0,0 +1,377 @@
+"""
+tools_dinamicas.py — Tools generadas para los CSV subidos a datos/
+==================================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+Las tools de tools.py están escritas a mano para trm_, comercio_exterior_ y
+exportaciones_sectores_. Un CSV nuevo subido con /api/upload/datos no le
+servía de nada al agente.
+
+Para cada datos/*.csv sin tools propias (ni cubo, ver cubo_comercio.py) se
+generan tres tools:
+  describir_<tabla>()                           columnas, tipos y estadísticas
+  filtrar_<tabla>(columna, operador, valor...)  filas que cumplen una condición
+  agregar_<tabla>(metrica, columna, agrupar_por) suma / promedio / ... por grupo
+
+Nombres: <tabla> sale del nombre del archivo (ASCII, minúsculas, '_'). Si dos
+CSV dan la misma tabla (ventas-2024.csv y ventas_2024.csv) o el nombre choca
+con una tool de tools.py, se agrega un hash corto del nombre del archivo; el
+que ya tenía tools conserva su nombre. Los proveedores rechazan tools con
+nombres repetidos.
+
+Inferencia de esquema: las columnas y tipos salen del esquema Arrow (modo
+columnar, sin leer datos) o de los dtypes del DataFrame. Las estadísticas
+por columna (nulos, distintos, min / max / promedio, valores frecuentes) se
+calculan en la primera llamada a describir_* y se guardan por versión del
+dataset. Los datos se leen solo al invocar una tool, proyectando las
+columnas que usa (datasets.obtener(columnas=...)).
+
+Reconstrucción incremental: sincronizar() compara los CSV y su esquema con
+el registro; solo genera tools para los datasets nuevos o con columnas
+distintas y retira las de los eliminados. Las tools sin cambios son los
+mismos objetos, así que agente_factory sigue sirviendo los agentes ya
+compilados. main.py sincroniza al arrancar y al subir / borrar archivos,
+y tools.tools_datos() en cada request (un stat por archivo).
+"""
+
+import hashlib
+import json
+import re
+import sys
+import threading
+import unicodedata
+from pathlib import Path
+
+from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field, create_model
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import compactar
+import config
+import cubo_comercio
+import datasets
+import memo
+import resumenes
+
+PREFIJOS   = ("describir_", "filtrar_", "agregar_")
+OPERADORES = ("==", "!=", ">", ">=", "<", "<=", "contiene")
+METRICAS   = ("suma", "promedio", "min", "max", "mediana", "conteo")
+
+
+def _tiene_tools_propias(nombre: str) -> bool:
+    # Los datasets con resumidor tienen tools escritas a mano en tools.py; el
+    # detalle de comercio (millones de filas) se consulta por el cubo
+    return nombre.startswith(cubo_comercio.PREFIJO) or \
+        any(nombre.startswith(p) for p in resumenes.RESUMIDORES)
+
+
+def _identificador(nombre: str) -> str:
+    """Nombre de tabla válido para un nombre de tool: ASCII, minúsculas y '_'."""
+    base = unicodedata.normalize("NFKD", Path(nombre).stem).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9_]+", "_", base.lower()).strip("_")[:40] or "dataset"
+
+
+def _reservados() -> set[str]:
+    """Nombres de las tools escritas a mano en tools.py."""
+    from langchain_core.tools import BaseTool
+    import tools as agent_tools
+    return {v.name for v in vars(agent_tools).values() if isinstance(v, BaseTool)}
+
+
+def _asignar_tablas(nombres: list[str], previas: dict[str, str]) -> dict[str, str]:
+    """
+    <tabla> única por archivo. Los archivos que ya tienen tools van primero y
+    conservan su tabla; ante un choque se agrega un hash del nombre del archivo.
+    """
+    reservados = _reservados()
+    usadas: set[str] = set()
+
+    def libre(tabla: str) -> bool:
+        return tabla not in usadas and not any(p + tabla in reservados for p in PREFIJOS)
+
+    tablas = {}
+    for nombre in sorted(nombres, key=lambda n: (n not in previas, n)):
+        tabla = previas.get(nombre) or _identificador(nombre)
+        if not libre(tabla):
+            huella = hashlib.sha1(nombre.encode()).hexdigest()[:6]
+            base   = f"{_identificador(nombre)[:32].rstrip('_')}_{huella}"
+            tabla, k = base, 2
+            while not libre(tabla):
+                tabla, k = f"{base}_{k}", k + 1
+        tablas[nombre] = tabla
+        usadas.add(tabla)
+    return tablas
+
+
+# ---------------------------------------------------------------------------
+# Esquema y estadísticas por columna
+# ---------------------------------------------------------------------------
+
+def _tipo(dtype: str) -> str:
+    if any(t in dtype for t in ("int", "float", "double", "decimal")):
+        return "numero"
+    if any(t in dtype for t in ("date", "timestamp")):
+        return "fecha"
+    return "texto"
+
+
+def esquema(nombre: str) -> dict[str, str]:
+    """{columna: numero | fecha | texto}; en modo columnar sin leer los datos."""
+    tabla = datasets.tabla_arrow(nombre)
+    if tabla is not None:
+        return {c.name: _tipo(str(c.type)) for c in tabla.schema}
+    return {str(c): _tipo(str(t)) for c, t in datasets.obtener(nombre).dtypes.items()}
+
+
+_estadisticas: dict[str, tuple[str, list[dict]]] = {}   # nombre → (versión, perfil)
+
+
+def estadisticas(nombre: str) -> list[dict]:
+    """Perfil por columna de la versión vigente (se calcula una vez por versión)."""
+    version = datasets.version(nombre)
+    with _lock:
+        guardado = _estadisticas.get(nombre)
+        if guardado is not None and guardado[0] == version:
+            _stats["estadisticas_cache"] += 1
+            return guardado[1]
+
+    df = datasets.obtener(nombre)
+    perfil = []
+    for col, tipo in esquema(nombre).items():
+        s = df[col]
+        fila = {"columna": col, "tipo": tipo, "nulos": int(s.isna().sum()),
+                "distintos": int(s.nunique()), "min": None, "max": None,
+                "promedio": None, "frecuentes": None}
+        if tipo == "numero" and s.notna().any():
+            fila.update(min=round(float(s.min()), 4), max=round(float(s.max()), 4),
+                        promedio=round(float(s.mean()), 4))
+        elif tipo == "fecha" and s.notna().any():
+            fila.update(min=str(s.min())[:10], max=str(s.max())[:10])
+        elif tipo == "texto":
+            fila["frecuentes"] = [str(v) for v in s.value_counts().head(5).index]
+        perfil.append(fila)
+
+    with _lock:
+        _estadisticas[nombre] = (version, perfil)
+        _stats["estadisticas_calculadas"] += 1
+    return perfil
+
+
+# ---------------------------------------------------------------------------
+# Operaciones (vectorizadas con pandas sobre columnas proyectadas)
+# ---------------------------------------------------------------------------
+
+def _validar_columnas(nombre: str, columnas: list[str]) -> dict[str, str]:
+    tipos = esquema(nombre)
+    faltantes = [c for c in columnas if c and c not in tipos]
+    if faltantes:
+        raise KeyError(f"columnas inexistentes {faltantes}; disponibles: {list(tipos)}")
+    return tipos
+
+
+def _lista(texto: str) -> list[str]:
+    return [c.strip() for c in (texto or "").split(",") if c.strip()]
+
+
+def _registros(df) -> list[dict]:
+    return json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+def filtrar(nombre: str, columna: str, operador: str, valor: str,
+            columnas: str = "", limite: int = 20) -> dict:
+    import pandas as pd
+
+    if operador not in OPERADORES:
+        raise ValueError(f"operador inválido '{operador}'; usa uno de {list(OPERADORES)}")
+    salida = _lista(columnas)
+    tipos  = _validar_columnas(nombre, [columna, *salida])
+    df     = datasets.obtener(nombre, columnas=list(dict.fromkeys([*salida, columna])) if salida else None)
+
+    s = df[columna]
+    if operador == "contiene":
+        mascara = s.astype(str).str.contains(str(valor), case=False, regex=False, na=False)
+    else:
+        v = valor
+        if tipos[columna] == "numero":
+            v = float(valor)
+        elif tipos[columna] == "fecha":
+            v = pd.Timestamp(valor)
+        else:
+            s = s.astype(str)
+        mascara = {"==": s == v, "!=": s != v, ">": s > v, ">=": s >= v,
+                   "<": s < v, "<=": s <= v}[operador]
+
+    coinciden = df.loc[mascara, salida or list(df.columns)]
+    limite = max(1, min(int(limite), config.TOOLS_DINAMICAS_MAX_FILAS))
+    return {"coincidencias": int(mascara.sum()), "truncado": len(coinciden) > limite,
+            "filas": _registros(coinciden.head(limite))}
+
+
+def agregar(nombre: str, metrica: str, columna: str = "", agrupar_por: str = "",
+            limite: int = 20) -> dict:
+    if metrica not in METRICAS:
+        raise ValueError(f"métrica inválida '{metrica}'; usa una de {list(METRICAS)}")
+    grupos = _lista(agrupar_por)
+    tipos  = _validar_columnas(nombre, [columna, *grupos])
+    if metrica != "conteo":
+        if not columna:
+            raise ValueError(f"la métrica '{metrica}' necesita columna")
+        if tipos[columna] != "numero":
+            raise ValueError(f"la columna '{columna}' no es numérica")
+
+    usadas = list(dict.fromkeys([*grupos, *([columna] if columna else [])]))
+    df = datasets.obtener(nombre, columnas=usadas or None)
+    funcion = {"suma": "sum", "promedio": "mean", "min": "min", "max": "max",
+               "mediana": "median", "conteo": "count"}[metrica]
+    etiqueta = f"{metrica}_{columna}" if columna else metrica
+
+    if not grupos:
+        valor = len(df) if metrica == "conteo" and not columna else getattr(df[columna], funcion)()
+        return {"resultado": round(float(valor), 4)}
+
+    if metrica == "conteo" and not columna:
+        r = df.groupby(grupos, observed=True).size()
+    else:
+        r = df.groupby(grupos, observed=True)[columna].agg(funcion)
+    r = r.rename(etiqueta).sort_values(ascending=False).round(4).reset_index()
+    limite = max(1, min(int(limite), config.TOOLS_DINAMICAS_MAX_FILAS))
+    return {"grupos": len(r), "truncado": len(r) > limite, "filas": _registros(r.head(limite))}
+
+
+# ---------------------------------------------------------------------------
+# Generación de tools
+# ---------------------------------------------------------------------------
+
+def _error(e: Exception) -> str:
+    return json.dumps({"error": f"{type(e).__name__}: {e}"}, ensure_ascii=False)
+
+
+def _crear_tool(nombre_tool: str, funcion, descripcion: str, args: type[BaseModel]):
+    funcion.__name__ = nombre_tool     # clave de memo.py y de las métricas de compactar.py
+    return StructuredTool.from_function(func=memo.memoizar(funcion), name=nombre_tool,
+                                        description=descripcion, args_schema=args)
+
+
+def _generar(nombre: str, tabla: str, tipos: dict[str, str]) -> list:
+    cols  = ", ".join(f"{c} ({t})" for c, t in tipos.items())
+
+    def describir() -> str:
+        try:
+            return compactar.salida(f"describir_{tabla}", {
+                "dataset": nombre, "filas": len(datasets.obtener(nombre, columnas=[next(iter(tipos))])),
+                "columnas": estadisticas(nombre)})
+        except Exception as e:
+            return _error(e)
+
+    def filtrar_(columna: str, operador: str = "==", valor: str = "",
+                 columnas: str = "", limite: int = 20) -> str:
+        try:
+            return compactar.salida(f"filtrar_{tabla}",
+                                    filtrar(nombre, columna, operador, valor, columnas, limite))
+        except Exception as e:
+            return _error(e)
+
+    def agregar_(metrica: str, columna: str = "", agrupar_por: str = "", limite: int = 20) -> str:
+        try:
+            return compactar.salida(f"agregar_{tabla}",
+                                    agregar(nombre, metrica, columna, agrupar_por, limite))
+        except Exception as e:
+            return _error(e)
+
+    args_filtrar = create_model(
+        f"Filtrar_{tabla}",
+        columna=(str, Field(description="columna a comparar")),
+        operador=(str, Field(default="==", description=" | ".join(OPERADORES))),
+        valor=(str, Field(default="", description="valor a comparar (texto; se convierte al tipo de la columna)")),
+        columnas=(str, Field(default="", description="columnas a devolver separadas por coma (vacío = todas)")),
+        limite=(int, Field(default=20, description="máximo de filas")),
+    )
+    args_agregar = create_model(
+        f"Agregar_{tabla}",
+        metrica=(str, Field(description=" | ".join(METRICAS))),
+        columna=(str, Field(default="", description="columna numérica a agregar (vacía solo con conteo)")),
+        agrupar_por=(str, Field(default="", description="columnas de grupo separadas por coma (vacío = total)")),
+        limite=(int, Field(default=20, description="máximo de grupos, ordenados de mayor a menor")),
+    )
+
+    return [
+        _crear_tool(f"describir_{tabla}", describir,
+                    f"Describe el dataset subido {nombre}: filas y, por columna, tipo, nulos, "
+                    f"distintos, min/max/promedio o valores frecuentes. Columnas: {cols}. "
+                    f"Úsala primero para conocer los datos.",
+                    create_model(f"Describir_{tabla}")),
+        _crear_tool(f"filtrar_{tabla}", filtrar_,
+                    f"Filas del dataset {nombre} donde <columna> <operador> <valor>. Columnas: {cols}.",
+                    args_filtrar),
+        _crear_tool(f"agregar_{tabla}", agregar_,
+                    f"Agrega el dataset {nombre}: suma, promedio, min, max, mediana o conteo de una "
+                    f"columna, en total o agrupado por columnas. Columnas: {cols}.",
+                    args_agregar),
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Registro incremental
+# ---------------------------------------------------------------------------
+
+_lock      = threading.Lock()
+_sync_lock = threading.Lock()
+_registro: dict[str, tuple[tuple, list]] = {}   # nombre → ((tabla, esquema), tools)
+_stats     = {"sincronizaciones": 0, "generadas": 0, "retiradas": 0,
+              "estadisticas_calculadas": 0, "estadisticas_cache": 0}
+
+
+def sincronizar() -> None:
+    """Genera / retira tools según los CSV actuales de datos/ (solo los cambios)."""
+    if not config.TOOLS_DINAMICAS_ENABLED:
+        return
+    with _sync_lock:
+        actuales = [n for n in datasets.nombres() if not _tiene_tools_propias(n)]
+        with _lock:
+            previas = {n: firma[0] for n, (firma, _) in _registro.items() if n in actuales}
+        tablas = _asignar_tablas(actuales, previas)
+        for nombre in actuales:
+            try:
+                tipos = esquema(nombre)
+            except Exception as e:
+                print(f"  [TOOLS_DINAMICAS] {nombre}: {type(e).__name__}: {e}")
+                continue
+            firma = (tablas[nombre], tuple(tipos.items()))
+            with _lock:
+                previo = _registro.get(nombre)
+            if previo is not None and previo[0] == firma:
+                continue
+            tools = _generar(nombre, tablas[nombre], tipos)
+            with _lock:
+                _registro[nombre] = (firma, tools)
+                _stats["generadas"] += len(tools)
+            print(f"  [TOOLS_DINAMICAS] {nombre}: {', '.join(t.name for t in tools)}")
+
+        with _lock:
+            for nombre in set(_registro) - set(actuales):
+                _stats["retiradas"] += len(_registro.pop(nombre)[1])
+                _estadisticas.pop(nombre, None)
+            _stats["sincronizaciones"] += 1
+
+
+def tools() -> list:
+    """Tools generadas vigentes (sincroniza antes)."""
+    sincronizar()
+    with _lock:
+        return [t for _, (_, ts) in sorted(_registro.items()) for t in ts]
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+def estado() -> dict:
+    """Datasets con tools generadas y contadores de generación / estadísticas."""
+    with _lock:
+        return {
+            "enabled":  config.TOOLS_DINAMICAS_ENABLED,
+            "datasets": {n: [t.name for t in ts] for n, (_, ts) in sorted(_registro.items())},
+            **_stats,
+        }
@@ -0,0 +1,248 @@
+"""
+trazas.py — Desglose de tiempos por nodo, llamada LLM y tool
+============================================================
+Proyecto agente_IA_TRM · USB Medellín
+
+pipeline.nodo_ejecutar_agente mide un único latencia_ms para todo el agente:
+no dice si el tiempo se fue en el supervisor, en el loop ReAct de un
+especialista, en una búsqueda en pgvector o en el sintetizador.
+
+Este módulo registra un span por:
+  - nodo de los grafos  → trazas.nodo("supervisor", fn) al registrar el nodo
+  - llamada al LLM      → CallbackTraza (on_chat_model_start / on_llm_end)
+  - llamada a una tool  → CallbackTraza (on_tool_start / on_tool_end)
+con duración, tamaño de entrada/salida y tokens. Cada span LLM/tool lleva el
+nodo en el que ocurrió.
+
+El callback no se pasa a mano: se registra con register_configure_hook de
+LangChain sobre un contextvar, así todo LLM o tool que corra dentro de
+solicitud() lo recibe (incluidos hilos del fan-out, que copian el contexto).
+Fuera de una solicitud el contextvar está vacío y el costo es nulo.
+
+Resultado por consulta (traza.desglose()):
+  {"total_ms", "por_nodo", "llm", "por_tool", "spans", "spans_omitidos"}
+Se devuelve en ConsultaResponse.desglose, se guarda con la consulta y alimenta
+los p50/p95 por nodo y por tool de GET /metricas.
+"""
+
+import contextvars
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+if hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+
+import config
+
+
+def _tamano(valor) -> int:
+    contenido = getattr(valor, "content", valor)
+    tool_calls = getattr(valor, "tool_calls", None)   # turnos ReAct sin texto
+    return len(str(contenido).encode("utf-8")) + (len(str(tool_calls)) if tool_calls else 0)
+
+
+# ---------------------------------------------------------------------------
+# Traza de una solicitud
+# ---------------------------------------------------------------------------
+
+class Traza:
+    """Spans de una solicitud. Thread-safe: los nodos del fan-out escriben a la vez."""
+
+    def __init__(self):
+        self.inicio    = time.perf_counter()
+        self.spans:    list[dict] = []
+        self.omitidos  = 0
+        self.por_nodo: dict[str, dict] = {}
+        self.por_tool: dict[str, dict] = {}
+        self.llm       = {"llamadas": 0, "ms": 0.0, "tokens": 0,
+                          "bytes_entrada": 0, "bytes_salida": 0, "errores": 0}
+        self._lock     = threading.Lock()
+
+    def _ms_desde_inicio(self, t: float) -> float:
+        return round((t - self.inicio) * 1000, 1)
+
+    def agregar(self, tipo: str, nombre: str, t0: float, t1: float, **extra) -> None:
+        ms   = (t1 - t0) * 1000
+        span = {"tipo": tipo, "nombre": nombre, "inicio_ms": self._ms_desde_inicio(t0),
+                "ms": round(ms, 1), **extra}
+        with self._lock:
+            if len(self.spans) < config.TRAZAS_MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.omitidos += 1
+
+            if tipo == "nodo":
+                agg = self.por_nodo.setdefault(nombre, {"llamadas": 0, "ms": 0.0})
+            elif tipo == "tool":
+                agg = self.por_tool.setdefault(nombre, {"llamadas": 0, "ms": 0.0, "bytes_salida": 0})
+                agg["bytes_salida"] += extra.get("bytes_salida", 0)
+            else:
+                agg = self.llm
+                agg["tokens"]        += extra.get("tokens") or 0
+                agg["bytes_entrada"] += extra.get("bytes_entrada", 0)
+                agg["bytes_salida"]  += extra.get("bytes_salida", 0)
+                agg["errores"]       += 1 if extra.get("error") else 0
+            agg["llamadas"] += 1
+            agg["ms"]       += ms
+        _registrar_ventana(f"{tipo}:{nombre}", ms)
+
+    def desglose(self) -> dict:
+        def _redondear(d: dict) -> dict:
+            return {**d, "ms": round(d["ms"], 1)}
+
+        with self._lock:
+            return {
+                "total_ms":       self._ms_desde_inicio(time.perf_counter()),
+                "por_nodo":       {n: _redondear(a) for n, a in self.por_nodo.items()},
+                "llm":            _redondear(self.llm),
+                "por_tool":       {n: _redondear(a) for n, a in self.por_tool.items()},
+                "spans":          sorted(self.spans, key=lambda s: s["inicio_ms"]),
+                "spans_omitidos": self.omitidos,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Callback de LangChain — spans de LLM y tools
+# ---------------------------------------------------------------------------
+
+class CallbackTraza(BaseCallbackHandler):
+    """Mide cada llamada al LLM y a una tool de la solicitud."""
+
+    def __init__(self, traza: Traza):
+        self.traza    = traza
+        self._abiertos: dict = {}
+
+    def _abrir(self, run_id, nombre: str, bytes_entrada: int) -> None:
+        self._abiertos[run_id] = (nombre, _nodo_actual.get(), bytes_entrada, time.perf_counter())
+
+    def _cerrar(self, tipo: str, run_id, **extra) -> None:
+        abierto = self._abiertos.pop(run_id, None)
+        if abierto is None:
+            return
+        nombre, nodo, bytes_entrada, t0 = abierto
+        self.traza.agregar(tipo, nombre, t0, time.perf_counter(),
+                           nodo=nodo, bytes_entrada=bytes_entrada, **extra)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        modelo = (kwargs.get("invocation_params") or {}).get("model") \
+            or (kwargs.get("metadata") or {}).get("ls_model_name") or "llm"
+        self._abrir(run_id, str(modelo), sum(_tamano(m) for lote in messages for m in lote))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        import limitador
+        salida = sum(_tamano(getattr(g, "message", g.text)) for lote in response.generations for g in lote)
+        self._cerrar("llm", run_id, bytes_salida=salida, tokens=limitador.tokens_reales(response))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._cerrar("llm", run_id, bytes_salida=0, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        nombre = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._abrir(run_id, nombre, _tamano(input_str))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._cerrar("tool", run_id, bytes_salida=_tamano(output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._cerrar("tool", run_id, bytes_salida=0, error=type(error).__name__)
+
+
+_callback_actual: contextvars.ContextVar[CallbackTraza | None] = contextvars.ContextVar(
+    "trazas_callback", default=None
+)
+_nodo_actual: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "trazas_nodo", default=None
+)
+register_configure_hook(_callback_actual, inheritable=True)
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+def actual() -> Traza | None:
+    cb = _callback_actual.get()
+    return cb.traza if cb is not None else None
+
+
+@contextmanager
+def solicitud():
+    """
+    Traza de la solicitud actual (None si TRAZAS_ENABLED=false). Si ya hay
+    una activa se reutiliza en vez de abrir otra.
+    """
+    existente = actual()
+    if existente is not None or not config.TRAZAS_ENABLED:
+        yield existente
+        return
+    traza = Traza()
+    token = _callback_actual.set(CallbackTraza(traza))
+    try:
+        yield traza
+    finally:
+        _callback_actual.reset(token)
+
+
+def nodo(nombre: str, fn):
+    """Envuelve el nodo de un grafo: registra su span y lo marca como nodo actual."""
+    @wraps(fn)
+    def envoltura(*args, **kwargs):
+        traza = actual()
+        if traza is None:
+            return fn(*args, **kwargs)
+        token = _nodo_actual.set(nombre)
+        t0    = time.perf_counter()
+        error = None
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            _nodo_actual.reset(token)
+            extra = {"error": error} if error else {}
+            traza.agregar("nodo", nombre, t0, time.perf_counter(), **extra)
+
+    return envoltura
+
+
+# ---------------------------------------------------------------------------
+# Métricas — expuestas en GET /metricas
+# ---------------------------------------------------------------------------
+
+_lock     = threading.Lock()
+_ventanas: dict[str, deque] = {}
+
+
+def _registrar_ventana(clave: str, ms: float) -> None:
+    with _lock:
+        if clave not in _ventanas:
+            _ventanas[clave] = deque(maxlen=config.TRAZAS_VENTANA)
+        _ventanas[clave].append(ms)
+
+
+def estado() -> dict:
+    """p50/p95 por nodo, por tool y por modelo LLM sobre las últimas TRAZAS_VENTANA muestras."""
+    with _lock:
+        ventanas = {k: sorted(v) for k, v in _ventanas.items()}
+
+    def pct(lst, p):
+        return round(lst[max(0, int(len(lst) * p / 100) - 1)], 1)
+
+    resultado = {"habilitadas": config.TRAZAS_ENABLED, "nodos": {}, "tools": {}, "llm": {}}
+    grupos = {"nodo": "nodos", "tool": "tools", "llm": "llm"}
+    for clave, muestras in sorted(ventanas.items()):
+        tipo, nombre = clave.split(":", 1)
+        resultado[grupos[tipo]][nombre] = {
+            "muestras": len(muestras),
+            "p50_ms":   pct(muestras, 50),
+            "p95_ms":   pct(muestras, 95),
+        }
+    return resultado